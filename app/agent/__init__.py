@@ -1,5 +1,6 @@
 """Agent-related helpers for publishing releases."""
 
+from .digests import DigestLookup, lookup_exact_duplicate
 from .publish import apply_artifact_hash
 
-__all__ = ["apply_artifact_hash"]
+__all__ = ["DigestLookup", "apply_artifact_hash", "lookup_exact_duplicate"]
@@ -0,0 +1,121 @@
+"""Exact-duplicate detection for publishes by artifact digest.
+
+Digests come from ``hash_cache`` only after revalidation: a local file must still match its
+recorded size, mtime and inode, and a remote URL must answer a conditional ``HEAD`` with
+``304`` (or the same validators). A re-uploaded ``latest.zip`` is therefore hashed again
+rather than matched by URL. The digest is then matched against the indexed
+``(project_id, artifact_sha256)`` pair on ``releases``.
+"""
+
+from __future__ import annotations
+
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterable, Optional, Sequence, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from .. import models
+from ..evidence import cached_artifact_sha256, compute_artifact_sha256
+from ..utils.env import env_float
+
+
+@dataclass
+class DigestLookup:
+    digest: Optional[str]
+    duplicate: Optional[models.Release] = None
+    cached: bool = False
+
+
+def artifact_digest(
+    artifact_url: str,
+    *,
+    hasher: Callable[[str], Optional[str]] = compute_artifact_sha256,
+    lookup: Callable[[str], Optional[str]] = cached_artifact_sha256,
+    compute: bool = True,
+) -> Tuple[Optional[str], bool]:
+    """Return ``(digest, from_cache)``, hashing the artifact only if no validated digest exists.
+
+    With ``compute=False`` only revalidated cache entries are used (background hashing mode).
+    """
+    digest = lookup(artifact_url)
+    if digest:
+        return digest, True
+    if not compute:
+        return None, False
+    return hasher(artifact_url), False
+
+
+def artifact_digests(
+    urls: Sequence[str],
+    *,
+    workers: Optional[int] = None,
+    hasher: Callable[[str], Optional[str]] = compute_artifact_sha256,
+    lookup: Callable[[str], Optional[str]] = cached_artifact_sha256,
+    compute: bool = True,
+) -> Dict[str, Tuple[Optional[str], bool]]:
+    """``artifact_digest`` for each distinct URL, on ``AGENT_HASH_WORKERS`` threads."""
+    unique = list(dict.fromkeys(urls))
+    workers = max(int(workers or env_float("AGENT_HASH_WORKERS", 8)), 1)
+
+    def run(url: str) -> Tuple[Optional[str], bool]:
+        return artifact_digest(url, hasher=hasher, lookup=lookup, compute=compute)
+
+    if workers == 1 or len(unique) <= 1:
+        return {url: run(url) for url in unique}
+    # Hashing and revalidation are I/O bound (HTTP requests, file reads), so threads overlap well.
+    with ThreadPoolExecutor(max_workers=min(workers, len(unique))) as pool:
+        return dict(zip(unique, pool.map(run, unique)))
+
+
+def find_releases_by_digests(
+    db: Session, pairs: Iterable[Tuple[int, str]]
+) -> Dict[Tuple[int, str], models.Release]:
+    """Earliest release per ``(project_id, digest)`` pair, in one query."""
+    pairs = {(int(project_id), digest) for project_id, digest in pairs if digest}
+    if not pairs:
+        return {}
+    rows = db.scalars(
+        select(models.Release)
+        .where(
+            models.Release.project_id.in_({project_id for project_id, _ in pairs}),
+            models.Release.artifact_sha256.in_({digest for _, digest in pairs}),
+        )
+        .order_by(models.Release.id.asc())
+    ).all()
+    found: Dict[Tuple[int, str], models.Release] = {}
+    for release in rows:
+        key = (int(release.project_id), release.artifact_sha256)
+        if key in pairs:
+            found.setdefault(key, release)
+    return found
+
+
+def find_release_by_digest(db: Session, project_id: int, digest: str) -> Optional[models.Release]:
+    return db.scalars(
+        select(models.Release)
+        .where(models.Release.project_id == int(project_id), models.Release.artifact_sha256 == digest)
+        .order_by(models.Release.id.asc())
+        .limit(1)
+    ).first()
+
+
+def lookup_exact_duplicate(
+    db: Session, project_id: int, artifact_url: str, *, compute: bool = True
+) -> DigestLookup:
+    """Digest the artifact (cached) and find an earlier release in the project with it."""
+    digest, cached = artifact_digest(artifact_url, compute=compute)
+    if not digest:
+        return DigestLookup(digest=None, cached=cached)
+    return DigestLookup(digest=digest, duplicate=find_release_by_digest(db, project_id, digest), cached=cached)
+
+
+__all__ = [
+    "DigestLookup",
+    "artifact_digest",
+    "artifact_digests",
+    "find_release_by_digest",
+    "find_releases_by_digests",
+    "lookup_exact_duplicate",
+]
@@ -4,18 +4,23 @@ from typing import Optional
 
 from .. import models
 from ..evidence import compute_artifact_sha256
+from ..merkle import apply_artifact_merkle, hash_artifact_with_merkle, merkle_enabled
 
 
 def apply_artifact_hash(release: models.Release, artifact_url: Optional[str] = None) -> Optional[str]:
-    """Populate ``release.artifact_sha256`` if computable from the given URL."""
+    """Populate ``release.artifact_sha256`` (and the Merkle root when enabled) from the given URL."""
 
     target_url = artifact_url or release.artifact_url
     if not target_url:
         return None
 
-    digest = compute_artifact_sha256(target_url)
+    if merkle_enabled():
+        digest, tree = hash_artifact_with_merkle(target_url)
+    else:
+        digest, tree = compute_artifact_sha256(target_url), None
     if digest:
         release.artifact_sha256 = digest
+        apply_artifact_merkle(release, tree)
     return digest
 
 
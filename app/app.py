@@ -23,6 +23,12 @@ from .routes_auth import router as auth_router
 from .routes_api_keys import router as api_keys_router
 from .routes_webhooks import router as webhooks_router
 from .middleware import RequestContextMiddleware
+from .db import try_get_session
+from .hit_dedupe import flush_pending_hits, start_flush_timer, stop_flush_timer
+from .similarity import save_release_index, start_index_save_timer, stop_index_save_timer
+from .hashing import requeue_pending_jobs, shutdown_hash_pipeline
+from .hash_cache import close_hash_cache
+from .storage.pin_queue import requeue_pending_pins, shutdown_pin_queue, start_pin_retry_timer
 # Disable rate limit middleware by default in container
 RateLimitMiddleware = None  # type: ignore
 from .errors import install_exception_handlers
@@ -73,6 +79,59 @@ app.include_router(uploads_router)
 app.include_router(api_keys_router)
 app.include_router(webhooks_router)
 
+def flush_duplicate_hits() -> None:
+    stop_flush_timer()
+    try:
+        flush_pending_hits()
+    except Exception as exc:
+        logger.warning("Failed to flush duplicate hit counts on shutdown: %s", exc)
+
+
+def persist_similarity_index() -> None:
+    stop_index_save_timer()
+    save_release_index(force=True)
+
+
+def resume_hash_jobs() -> None:
+    db = try_get_session()
+    if db is None:
+        return
+    try:
+        resumed = requeue_pending_jobs(db)
+        if resumed:
+            logger.info("Resumed %s pending artifact hash jobs", resumed)
+    except Exception as exc:
+        logger.warning("Failed to resume artifact hash jobs: %s", exc)
+    finally:
+        db.close()
+
+
+def resume_ipfs_pins() -> None:
+    db = try_get_session()
+    if db is None:
+        return
+    try:
+        resumed = requeue_pending_pins(db)
+        if resumed:
+            logger.info("Resumed %s queued IPFS pins", resumed)
+    except Exception as exc:
+        logger.warning("Failed to resume IPFS pins: %s", exc)
+    finally:
+        db.close()
+
+
+app.add_event_handler("startup", start_flush_timer)
+app.add_event_handler("startup", start_index_save_timer)
+app.add_event_handler("startup", resume_hash_jobs)
+app.add_event_handler("startup", resume_ipfs_pins)
+app.add_event_handler("startup", start_pin_retry_timer)
+app.add_event_handler("shutdown", flush_duplicate_hits)
+app.add_event_handler("shutdown", persist_similarity_index)
+app.add_event_handler("shutdown", shutdown_hash_pipeline)
+app.add_event_handler("shutdown", shutdown_pin_queue)
+app.add_event_handler("shutdown", close_hash_cache)
+
+
 if is_auth_enabled():
     ensure_magic(app)
     app.include_router(auth_router)
@@ -14,7 +14,7 @@ from .. import models
 from ..db import try_get_session
 from ..evidence import persist_evidence_ipfs_cid
 from ..routes_evidence import get_release_evidence_uris
-from ..storage.ipfs import pin_json
+from ..storage.pin_queue import enqueue_pin_json
 from .metadata import build_nft_metadata
 
 
@@ -259,8 +259,8 @@ class ChainClient:
                 license_code=metadata.get("license_code") or None,
             )
 
-            # Pin JSON to IPFS if configured
-            cid = pin_json(metadata_obj, filename=f"release-{release_id}-metadata.json")
+            # Queue the IPFS pin if configured; the CID is computed locally
+            cid = enqueue_pin_json(metadata_obj, filename=f"release-{release_id}-metadata.json")
             if not cid:
                 return evidence_uri
 
@@ -553,8 +553,8 @@ class StarknetClient:
                 license_code=metadata.get("license_code") or None,
             )
 
-            # Pin JSON to IPFS if configured
-            cid = pin_json(metadata_obj, filename=f"release-{release_id}-metadata.json")
+            # Queue the IPFS pin if configured; the CID is computed locally
+            cid = enqueue_pin_json(metadata_obj, filename=f"release-{release_id}-metadata.json")
             if not cid:
                 return metadata.get("evidence_uri")
 
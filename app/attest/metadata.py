@@ -8,7 +8,7 @@ from .. import models
 from ..db import try_get_session
 from ..evidence import persist_evidence_ipfs_cid
 from ..routes_evidence import get_release_evidence_uris
-from ..storage.ipfs import pin_json
+from ..storage.pin_queue import enqueue_pin_json
 
 
 def _app_base_url() -> str:
@@ -116,8 +116,8 @@ def ensure_metadata_uri(
             license_code=metadata.get("license_code") or None,
         )
 
-        # Pin JSON to IPFS if configured
-        cid = pin_json(metadata_obj, filename=f"release-{release_id}-metadata.json")
+        # Queue the IPFS pin if configured; the CID is computed locally
+        cid = enqueue_pin_json(metadata_obj, filename=f"release-{release_id}-metadata.json")
         if not cid:
             return evidence_uri
 
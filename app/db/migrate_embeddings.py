@@ -0,0 +1,89 @@
+"""Rewrite releases.embedding into the binary codec format."""
+
+from __future__ import annotations
+
+import logging
+from typing import Dict, Optional
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection, Engine
+
+from ..embeddings.codec import decode_embedding, encode_embedding, is_encoded
+
+
+logger = logging.getLogger("routeforge.migrate.embeddings")
+
+_BATCH = 500
+
+
+def _column_type(conn: Connection, column: str) -> Optional[str]:
+    value = conn.execute(
+        text(
+            """
+            SELECT DATA_TYPE FROM INFORMATION_SCHEMA.COLUMNS
+            WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'releases' AND COLUMN_NAME = :column
+            """
+        ),
+        {"column": column},
+    ).scalar()
+    return str(value).lower() if value is not None else None
+
+
+def _rewrite(conn: Connection, source_sql: str, target: str, summary: Dict[str, int]) -> None:
+    last_id = 0
+    while True:
+        rows = conn.execute(
+            text(
+                f"""
+                SELECT id, {source_sql} AS embedding FROM releases
+                WHERE id > :last_id AND embedding IS NOT NULL
+                ORDER BY id LIMIT :limit
+                """
+            ),
+            {"last_id": last_id, "limit": _BATCH},
+        ).all()
+        if not rows:
+            return
+        updates = []
+        for row in rows:
+            raw = row.embedding
+            if target == "embedding" and is_encoded(raw):
+                summary["skipped"] += 1
+                continue
+            vector = decode_embedding(raw)
+            if vector is None:
+                logger.warning("Release %s has an unreadable embedding; leaving it as is", row.id)
+                summary["skipped"] += 1
+                continue
+            updates.append({"id": int(row.id), "payload": encode_embedding(vector)})
+        if updates:
+            conn.execute(text(f"UPDATE releases SET {target} = :payload WHERE id = :id"), updates)
+            summary["rewritten"] += len(updates)
+        conn.commit()
+        last_id = int(rows[-1].id)
+
+
+def migrate(engine: Engine) -> Dict[str, int]:
+    """Convert legacy JSON/VECTOR embeddings in id order, one transaction per batch.
+
+    A TiDB ``VECTOR`` column is copied into a new LONGBLOB column and swapped in, since
+    it cannot hold the binary format. Already-encoded rows are skipped, so re-runs are cheap.
+    """
+    summary = {"rewritten": 0, "skipped": 0}
+    with engine.connect() as conn:
+        vector_column = conn.dialect.name == "mysql" and _column_type(conn, "embedding") == "vector"
+        if vector_column:
+            if _column_type(conn, "embedding_bin") is None:
+                conn.exec_driver_sql("ALTER TABLE releases ADD COLUMN embedding_bin LONGBLOB NULL")
+            _rewrite(conn, "VEC_AS_TEXT(embedding)", "embedding_bin", summary)
+            conn.exec_driver_sql("ALTER TABLE releases DROP COLUMN embedding")
+            conn.exec_driver_sql("ALTER TABLE releases RENAME COLUMN embedding_bin TO embedding")
+            conn.commit()
+            logger.info("releases.embedding converted from VECTOR to LONGBLOB")
+        else:
+            _rewrite(conn, "embedding", "embedding", summary)
+    logger.info("Embedding rewrite summary=%s", summary)
+    return summary
+
+
+__all__ = ["migrate"]
@@ -0,0 +1,119 @@
+"""Move route_hits.ua/ref strings into the user_agents/referrers lookup tables."""
+
+from __future__ import annotations
+
+import logging
+from typing import Dict
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection, Engine
+
+
+logger = logging.getLogger("routeforge.migrate.hit_dictionaries")
+
+_BATCH = 20000
+
+# (legacy column, id column, dictionary table, max value length)
+_DICTIONARIES = (
+    ("ua", "ua_id", "user_agents", 512),
+    ("ref", "ref_id", "referrers", 2048),
+)
+
+
+def _column_exists(conn: Connection, table: str, column: str) -> bool:
+    return bool(
+        conn.execute(
+            text(
+                """
+                SELECT COUNT(1) FROM INFORMATION_SCHEMA.COLUMNS
+                WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :table AND COLUMN_NAME = :column
+                """
+            ),
+            {"table": table, "column": column},
+        ).scalar()
+    )
+
+
+def _ensure_schema(conn: Connection) -> None:
+    for _legacy, id_column, table, width in _DICTIONARIES:
+        conn.exec_driver_sql(
+            f"""
+            CREATE TABLE IF NOT EXISTS {table} (
+              id INT PRIMARY KEY AUTO_INCREMENT,
+              value_hash CHAR(64) NOT NULL,
+              value VARCHAR({width}) NOT NULL,
+              UNIQUE KEY uq_{table}_value_hash (value_hash)
+            )
+            """
+        )
+        if not _column_exists(conn, "route_hits", id_column):
+            conn.exec_driver_sql(f"ALTER TABLE route_hits ADD COLUMN {id_column} INT NULL")
+            logger.info("Added route_hits.%s", id_column)
+
+
+def _backfill_column(conn: Connection, legacy: str, id_column: str, table: str, width: int) -> int:
+    """Intern one legacy column in id-range chunks; returns rows updated."""
+    bounds = conn.execute(text("SELECT MIN(id), MAX(id) FROM route_hits")).one()
+    if bounds[0] is None:
+        return 0
+    low, high = int(bounds[0]), int(bounds[1])
+    updated = 0
+    start = low
+    while start <= high:
+        end = start + _BATCH
+        params = {"start": start, "end": end}
+        conn.execute(
+            text(
+                f"""
+                INSERT IGNORE INTO {table} (value_hash, value)
+                SELECT DISTINCT SHA2(LEFT({legacy}, {width}), 256), LEFT({legacy}, {width})
+                FROM route_hits
+                WHERE id >= :start AND id < :end
+                  AND {legacy} IS NOT NULL AND TRIM({legacy}) <> '' AND {id_column} IS NULL
+                """
+            ),
+            params,
+        )
+        result = conn.execute(
+            text(
+                f"""
+                UPDATE route_hits h
+                JOIN {table} d ON d.value_hash = SHA2(LEFT(h.{legacy}, {width}), 256)
+                SET h.{id_column} = d.id
+                WHERE h.id >= :start AND h.id < :end
+                  AND h.{legacy} IS NOT NULL AND TRIM(h.{legacy}) <> '' AND h.{id_column} IS NULL
+                """
+            ),
+            params,
+        )
+        conn.commit()
+        updated += int(result.rowcount or 0)
+        start = end
+    return updated
+
+
+def migrate(engine: Engine, *, drop_legacy: bool = False) -> Dict[str, int]:
+    """Create lookup tables, backfill id columns and optionally drop ``ua``/``ref``.
+
+    Safe to re-run: only rows whose id column is still NULL are touched.
+    """
+    summary: Dict[str, int] = {}
+    if engine.dialect.name != "mysql":
+        logger.info("Skipping hit dictionary migration on dialect %s", engine.dialect.name)
+        return summary
+
+    with engine.connect() as conn:
+        _ensure_schema(conn)
+        conn.commit()
+        for legacy, id_column, table, width in _DICTIONARIES:
+            if not _column_exists(conn, "route_hits", legacy):
+                continue
+            summary[id_column] = _backfill_column(conn, legacy, id_column, table, width)
+            logger.info("Backfilled route_hits.%s for %s rows", id_column, summary[id_column])
+            if drop_legacy:
+                conn.exec_driver_sql(f"ALTER TABLE route_hits DROP COLUMN {legacy}")
+                logger.info("Dropped legacy column route_hits.%s", legacy)
+    return summary
+
+
+__all__ = ["migrate"]
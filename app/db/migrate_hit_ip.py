@@ -0,0 +1,73 @@
+"""Convert route_hits.ip from text to packed VARBINARY(16)."""
+
+from __future__ import annotations
+
+import logging
+from typing import Dict, Optional
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection, Engine
+
+
+logger = logging.getLogger("routeforge.migrate.hit_ip")
+
+_BATCH = 20000
+
+
+def _column_type(conn: Connection, column: str) -> Optional[str]:
+    value = conn.execute(
+        text(
+            """
+            SELECT DATA_TYPE FROM INFORMATION_SCHEMA.COLUMNS
+            WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'route_hits' AND COLUMN_NAME = :column
+            """
+        ),
+        {"column": column},
+    ).scalar()
+    return str(value).lower() if value is not None else None
+
+
+def migrate(engine: Engine) -> Dict[str, int]:
+    """Backfill a binary copy of ``ip`` in id-range chunks, then swap it in.
+
+    Re-runnable: a finished table (``ip`` already varbinary) is left untouched, and an
+    interrupted backfill resumes from rows whose binary column is still NULL.
+    Existing addresses are packed as-is; IP_ANONYMIZE only applies to new hits.
+    """
+    summary = {"converted": 0}
+    if engine.dialect.name != "mysql":
+        logger.info("Skipping hit IP migration on dialect %s", engine.dialect.name)
+        return summary
+
+    with engine.connect() as conn:
+        if _column_type(conn, "ip") in (None, "varbinary"):
+            return summary
+        if _column_type(conn, "ip_bin") is None:
+            conn.exec_driver_sql("ALTER TABLE route_hits ADD COLUMN ip_bin VARBINARY(16) NULL")
+
+        bounds = conn.execute(text("SELECT MIN(id), MAX(id) FROM route_hits")).one()
+        if bounds[0] is not None:
+            start, high = int(bounds[0]), int(bounds[1])
+            while start <= high:
+                result = conn.execute(
+                    text(
+                        """
+                        UPDATE route_hits
+                        SET ip_bin = INET6_ATON(TRIM(SUBSTRING_INDEX(ip, ',', 1)))
+                        WHERE id >= :start AND id < :end AND ip IS NOT NULL AND ip_bin IS NULL
+                        """
+                    ),
+                    {"start": start, "end": start + _BATCH},
+                )
+                conn.commit()
+                summary["converted"] += int(result.rowcount or 0)
+                start += _BATCH
+
+        conn.exec_driver_sql("ALTER TABLE route_hits DROP COLUMN ip")
+        conn.exec_driver_sql("ALTER TABLE route_hits RENAME COLUMN ip_bin TO ip")
+        conn.commit()
+    logger.info("route_hits.ip converted to VARBINARY(16) (%s rows packed)", summary["converted"])
+    return summary
+
+
+__all__ = ["migrate"]
@@ -0,0 +1,287 @@
+"""Monthly partitioning, raw-hit retention and hourly downsampling for route_hits."""
+
+from __future__ import annotations
+
+import logging
+import os
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import delete, select, text
+from sqlalchemy.engine import Connection, Engine
+
+from ..models import RouteHit, RouteHitHourly
+
+
+logger = logging.getLogger("routeforge.retention")
+
+_DELETE_BATCH = 5000
+_MAXVALUE_PARTITION = "pmax"
+
+
+def raw_retention_days() -> int:
+    """Days of raw hits to keep (``HIT_RETENTION_DAYS``); 0 disables pruning."""
+    try:
+        days = int(os.getenv("HIT_RETENTION_DAYS", "0") or "0")
+    except ValueError:
+        days = 0
+    return max(days, 0)
+
+
+def _month_start(value: datetime) -> datetime:
+    return value.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def _add_months(value: datetime, months: int) -> datetime:
+    index = value.year * 12 + (value.month - 1) + months
+    return value.replace(year=index // 12, month=index % 12 + 1, day=1)
+
+
+def _hour_bucket(value: datetime) -> datetime:
+    return value.replace(minute=0, second=0, microsecond=0)
+
+
+def partition_name(month: datetime) -> str:
+    return f"p{month.year:04d}{month.month:02d}"
+
+
+def _partition_clause(month: datetime) -> str:
+    upper = _add_months(month, 1).strftime("%Y-%m-%d %H:%M:%S")
+    return f"PARTITION {partition_name(month)} VALUES LESS THAN (UNIX_TIMESTAMP('{upper}'))"
+
+
+def list_partitions(conn: Connection) -> List[Tuple[str, Optional[int]]]:
+    """Return ``(name, upper_bound_epoch)`` for each route_hits partition (None for MAXVALUE)."""
+    rows = conn.execute(
+        text(
+            """
+            SELECT PARTITION_NAME, PARTITION_DESCRIPTION
+            FROM INFORMATION_SCHEMA.PARTITIONS
+            WHERE TABLE_SCHEMA = DATABASE()
+              AND TABLE_NAME = 'route_hits'
+              AND PARTITION_NAME IS NOT NULL
+            ORDER BY PARTITION_ORDINAL_POSITION
+            """
+        )
+    ).all()
+    partitions: List[Tuple[str, Optional[int]]] = []
+    for name, description in rows:
+        bound = None if str(description).upper() == "MAXVALUE" else int(description)
+        partitions.append((str(name), bound))
+    return partitions
+
+
+def is_partitioned(conn: Connection) -> bool:
+    if conn.dialect.name != "mysql":
+        return False
+    return bool(list_partitions(conn))
+
+
+def _drop_hit_foreign_keys(conn: Connection) -> None:
+    # InnoDB does not allow foreign keys on partitioned tables.
+    names = conn.execute(
+        text(
+            """
+            SELECT CONSTRAINT_NAME FROM INFORMATION_SCHEMA.TABLE_CONSTRAINTS
+            WHERE TABLE_SCHEMA = DATABASE()
+              AND TABLE_NAME = 'route_hits'
+              AND CONSTRAINT_TYPE = 'FOREIGN KEY'
+            """
+        )
+    ).scalars().all()
+    for name in names:
+        logger.info("Dropping foreign key %s on route_hits before partitioning", name)
+        conn.exec_driver_sql(f"ALTER TABLE route_hits DROP FOREIGN KEY {name}")
+
+
+def partition_route_hits(conn: Connection, *, months_ahead: int = 3) -> bool:
+    """Convert route_hits to RANGE partitions by month. Returns False if already partitioned."""
+    if is_partitioned(conn):
+        return False
+
+    oldest = conn.execute(text("SELECT MIN(ts) FROM route_hits")).scalar()
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    first = _month_start(oldest if oldest is not None else now)
+    last = _add_months(_month_start(now), months_ahead)
+
+    clauses = []
+    month = first
+    while month <= last:
+        clauses.append(_partition_clause(month))
+        month = _add_months(month, 1)
+    clauses.append(f"PARTITION {_MAXVALUE_PARTITION} VALUES LESS THAN MAXVALUE")
+
+    _drop_hit_foreign_keys(conn)
+    # Every unique key on a partitioned table must contain the partitioning column.
+    conn.exec_driver_sql(
+        "ALTER TABLE route_hits MODIFY COLUMN ts TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP"
+    )
+    conn.exec_driver_sql("ALTER TABLE route_hits DROP PRIMARY KEY, ADD PRIMARY KEY (id, ts)")
+    conn.exec_driver_sql(
+        "ALTER TABLE route_hits PARTITION BY RANGE (UNIX_TIMESTAMP(ts)) (\n  "
+        + ",\n  ".join(clauses)
+        + "\n)"
+    )
+    logger.info("route_hits partitioned into %s monthly partitions", len(clauses) - 1)
+    return True
+
+
+def ensure_future_partitions(conn: Connection, *, months_ahead: int = 3) -> int:
+    """Split upcoming months out of the MAXVALUE partition. Returns partitions added."""
+    partitions = list_partitions(conn) if conn.dialect.name == "mysql" else []
+    if not partitions:
+        return 0
+
+    existing = {name for name, _ in partitions}
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    wanted = []
+    month = _month_start(now)
+    for _ in range(months_ahead + 1):
+        if partition_name(month) not in existing:
+            wanted.append(month)
+        month = _add_months(month, 1)
+
+    bounded = [bound for _, bound in partitions if bound is not None]
+    highest = max(bounded) if bounded else None
+    if highest is not None:
+        wanted = [m for m in wanted if _add_months(m, 1).replace(tzinfo=timezone.utc).timestamp() > highest]
+    if not wanted:
+        return 0
+
+    clauses = [_partition_clause(m) for m in wanted]
+    if _MAXVALUE_PARTITION in existing:
+        conn.exec_driver_sql(
+            f"ALTER TABLE route_hits REORGANIZE PARTITION {_MAXVALUE_PARTITION} INTO (\n  "
+            + ",\n  ".join(clauses + [f"PARTITION {_MAXVALUE_PARTITION} VALUES LESS THAN MAXVALUE"])
+            + "\n)"
+        )
+    else:
+        conn.exec_driver_sql("ALTER TABLE route_hits ADD PARTITION (\n  " + ",\n  ".join(clauses) + "\n)")
+    logger.info("Added route_hits partitions: %s", ", ".join(partition_name(m) for m in wanted))
+    return len(wanted)
+
+
+def _upsert_hourly(conn: Connection, counts: Dict[Tuple[int, datetime], int], *, additive: bool) -> None:
+    if not counts:
+        return
+    rows = [{"route_id": rid, "bucket_ts": bucket, "hits": hits} for (rid, bucket), hits in counts.items()]
+    table = RouteHitHourly.__table__
+    if conn.dialect.name == "mysql":
+        from sqlalchemy.dialects.mysql import insert as dialect_insert
+
+        stmt = dialect_insert(table)
+        new_hits = table.c.hits + stmt.inserted.hits if additive else stmt.inserted.hits
+        conn.execute(stmt.on_duplicate_key_update(hits=new_hits), rows)
+    else:
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+
+        stmt = dialect_insert(table)
+        new_hits = table.c.hits + stmt.excluded.hits if additive else stmt.excluded.hits
+        conn.execute(
+            stmt.on_conflict_do_update(index_elements=[table.c.route_id, table.c.bucket_ts], set_={"hits": new_hits}),
+            rows,
+        )
+
+
+def _count_by_hour(rows: Iterable) -> Dict[Tuple[int, datetime], int]:
+    counts: Counter = Counter()
+    for row in rows:
+        if row.ts is None:
+            continue
+        counts[(int(row.route_id), _hour_bucket(row.ts))] += 1 + int(row.dup_count or 0)
+    return dict(counts)
+
+
+def _drop_expired_partitions(conn: Connection, cutoff: datetime) -> Dict[str, int]:
+    summary = {"partitions_dropped": 0, "rows_downsampled": 0}
+    cutoff_epoch = cutoff.timestamp()
+    for name, bound in list_partitions(conn):
+        if bound is None or bound > cutoff_epoch:
+            continue
+        # A monthly partition holds whole hours, so overwriting its buckets is idempotent
+        # if the job is interrupted between the aggregate and the DROP.
+        rows = conn.execute(
+            text(
+                f"""
+                SELECT route_id, DATE_FORMAT(ts, '%Y-%m-%d %H:00:00') AS bucket, SUM(1 + dup_count) AS hits
+                FROM route_hits PARTITION ({name})
+                GROUP BY route_id, bucket
+                """
+            )
+        ).all()
+        counts = {
+            (int(r.route_id), datetime.strptime(r.bucket, "%Y-%m-%d %H:%M:%S")): int(r.hits) for r in rows
+        }
+        _upsert_hourly(conn, counts, additive=False)
+        conn.commit()
+        conn.exec_driver_sql(f"ALTER TABLE route_hits DROP PARTITION {name}")
+        summary["partitions_dropped"] += 1
+        summary["rows_downsampled"] += sum(counts.values())
+        logger.info("Dropped partition %s after downsampling %s hits", name, sum(counts.values()))
+    return summary
+
+
+def _prune_rows(conn: Connection, cutoff: datetime) -> int:
+    """Downsample and delete expired rows in id chunks, one transaction per chunk."""
+    total = 0
+    while True:
+        rows = conn.execute(
+            select(RouteHit.id, RouteHit.route_id, RouteHit.ts, RouteHit.dup_count)
+            .where(RouteHit.ts < cutoff)
+            .order_by(RouteHit.id.asc())
+            .limit(_DELETE_BATCH)
+        ).all()
+        if not rows:
+            return total
+        _upsert_hourly(conn, _count_by_hour(rows), additive=True)
+        conn.execute(delete(RouteHit).where(RouteHit.id.in_([int(r.id) for r in rows])))
+        conn.commit()
+        total += len(rows)
+        if len(rows) < _DELETE_BATCH:
+            return total
+
+
+def apply_retention(
+    engine: Engine,
+    *,
+    retention_days: Optional[int] = None,
+    now: Optional[datetime] = None,
+) -> Dict[str, int]:
+    """Downsample raw hits older than the retention window into hourly buckets, then drop them.
+
+    Whole monthly partitions are dropped when route_hits is partitioned; any remaining
+    expired rows (or all of them on an unpartitioned table) are deleted in chunks.
+    """
+    days = raw_retention_days() if retention_days is None else int(retention_days)
+    summary = {"partitions_dropped": 0, "rows_downsampled": 0}
+    if days <= 0:
+        logger.info("Hit retention disabled (HIT_RETENTION_DAYS=0)")
+        return summary
+
+    current = now or datetime.now(timezone.utc)
+    if current.tzinfo is None:
+        current = current.replace(tzinfo=timezone.utc)
+    cutoff = _hour_bucket(current.astimezone(timezone.utc) - timedelta(days=days))
+    # Hit timestamps are stored as naive UTC.
+    cutoff_naive = cutoff.replace(tzinfo=None)
+
+    with engine.connect() as conn:
+        if is_partitioned(conn):
+            summary.update(_drop_expired_partitions(conn, cutoff))
+            ensure_future_partitions(conn)
+        summary["rows_downsampled"] += _prune_rows(conn, cutoff_naive)
+
+    logger.info("Retention applied cutoff=%s summary=%s", cutoff_naive.isoformat(), summary)
+    return summary
+
+
+__all__ = [
+    "raw_retention_days",
+    "partition_name",
+    "list_partitions",
+    "is_partitioned",
+    "partition_route_hits",
+    "ensure_future_partitions",
+    "apply_retention",
+]
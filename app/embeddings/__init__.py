@@ -0,0 +1,16 @@
+"""Embedding storage helpers."""
+
+from .codec import decode_embedding, encode_embedding, is_encoded, storage_dtype
+from .providers import EmbeddingProvider, HashEmbeddingProvider, embed_batch, embed_text, get_provider
+
+__all__ = [
+    "decode_embedding",
+    "encode_embedding",
+    "is_encoded",
+    "storage_dtype",
+    "EmbeddingProvider",
+    "HashEmbeddingProvider",
+    "embed_batch",
+    "embed_text",
+    "get_provider",
+]
@@ -0,0 +1,169 @@
+"""Backfill missing or stale release embeddings in keyset chunks."""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass
+from typing import Callable, List, Optional
+
+from sqlalchemy import bindparam, or_, select, update
+from sqlalchemy.orm import Session
+
+from .. import models
+from ..similarity.releases import rebuild_release_index
+from .codec import encode_embedding
+from .providers import LocalModelProvider, embed_batch, get_provider
+
+
+logger = logging.getLogger("routeforge.embeddings.backfill")
+
+
+@dataclass
+class BackfillStats:
+    updated: int = 0
+    batches: int = 0
+    last_id: int = 0
+    elapsed: float = 0.0
+
+    @property
+    def rate(self) -> float:
+        return self.updated / self.elapsed if self.elapsed > 0 else 0.0
+
+
+def _embed_payloads(texts: List[str]) -> List[bytes]:
+    # Top-level so it can run in worker processes; each worker builds its own provider.
+    return [encode_embedding(vector) for vector in embed_batch(texts)]
+
+
+def _compute_payloads(pool: Optional[ProcessPoolExecutor], texts: List[str], workers: int) -> List[bytes]:
+    if pool is None or len(texts) < 2:
+        return _embed_payloads(texts)
+    size = -(-len(texts) // workers)
+    chunks = [texts[i : i + size] for i in range(0, len(texts), size)]
+    payloads: List[bytes] = []
+    for part in pool.map(_embed_payloads, chunks):
+        payloads.extend(part)
+    return payloads
+
+
+def load_checkpoint(path: Optional[str], model_id: str) -> int:
+    """Return the last processed release id, or 0 if absent or written for another model."""
+    if not path or not os.path.exists(path):
+        return 0
+    try:
+        with open(path, "r", encoding="utf-8") as fh:
+            data = json.load(fh)
+    except (OSError, ValueError):
+        return 0
+    if data.get("model_id") != model_id:
+        return 0
+    return int(data.get("last_id") or 0)
+
+
+def save_checkpoint(path: str, model_id: str, stats: BackfillStats) -> None:
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as fh:
+        json.dump({"model_id": model_id, **asdict(stats)}, fh)
+    os.replace(tmp_path, path)
+
+
+def backfill_embeddings(
+    session_factory: Callable[[], Session],
+    *,
+    batch_size: int = 256,
+    workers: int = 1,
+    checkpoint_path: Optional[str] = None,
+    limit: Optional[int] = None,
+    reindex: bool = True,
+) -> BackfillStats:
+    """Embed releases whose embedding is missing or from another model.
+
+    Rows are read by ascending id, embedded across ``workers`` processes and written back
+    with one executemany UPDATE per batch. Progress is checkpointed after every batch so
+    an interrupted run resumes where it stopped; the checkpoint is removed on completion.
+    """
+    provider = get_provider()
+    model_id = provider.model_id
+    stats = BackfillStats(last_id=load_checkpoint(checkpoint_path, model_id))
+    if stats.last_id:
+        logger.info("Resuming embedding backfill after release id=%s", stats.last_id)
+
+    release = models.Release
+    stale = or_(
+        release.embedding.is_(None),
+        release.embedding_model.is_(None),
+        release.embedding_model != model_id,
+    )
+    table = release.__table__
+    write = (
+        update(table)
+        .where(table.c.id == bindparam("release_id"))
+        .values(embedding=bindparam("payload"), embedding_model=bindparam("model"))
+    )
+
+    # The local model provider already shards work over its own process pool.
+    workers = max(int(workers), 1)
+    pool = None
+    if workers > 1 and not isinstance(provider, LocalModelProvider):
+        pool = ProcessPoolExecutor(max_workers=workers)
+    started = time.perf_counter()
+    completed = False
+    try:
+        with session_factory() as db:
+            while True:
+                remaining = None if limit is None else max(int(limit) - stats.updated, 0)
+                if remaining == 0:
+                    break
+                rows = db.execute(
+                    select(release.id, release.notes, release.artifact_url)
+                    .where(release.id > stats.last_id, stale)
+                    .order_by(release.id.asc())
+                    .limit(min(batch_size, remaining) if remaining is not None else batch_size)
+                ).all()
+                if not rows:
+                    completed = True
+                    break
+                texts = [r.notes or r.artifact_url for r in rows]
+                payloads = _compute_payloads(pool, texts, workers)
+                db.execute(
+                    write,
+                    [
+                        {"release_id": int(r.id), "payload": payload, "model": model_id}
+                        for r, payload in zip(rows, payloads)
+                    ],
+                )
+                db.commit()
+
+                stats.updated += len(rows)
+                stats.batches += 1
+                stats.last_id = int(rows[-1].id)
+                stats.elapsed = time.perf_counter() - started
+                if checkpoint_path:
+                    save_checkpoint(checkpoint_path, model_id, stats)
+                logger.info(
+                    "Embedded %s releases through id=%s (%.1f releases/s)",
+                    stats.updated,
+                    stats.last_id,
+                    stats.rate,
+                )
+
+            if reindex:
+                rebuild_release_index(db)
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    stats.elapsed = time.perf_counter() - started
+    if completed and checkpoint_path and os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+    return stats
+
+
+__all__ = ["BackfillStats", "backfill_embeddings", "load_checkpoint", "save_checkpoint"]
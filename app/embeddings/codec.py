@@ -0,0 +1,73 @@
+"""Binary embedding encoding for ``releases.embedding``.
+
+Layout: a 4-byte header ``b"RF" + dtype code + version`` followed by the vector as
+little-endian float32 (``f``) or float16 (``e``). A 768-dim float32 vector is 3076
+bytes instead of ~12KB of JSON, and decodes with ``numpy.frombuffer`` without parsing.
+Rows written before this format (JSON arrays, or TiDB VECTOR text) still decode.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+from typing import Optional, Sequence, Union
+
+import numpy as np
+
+
+MAGIC = b"RF"
+VERSION = 1
+HEADER_SIZE = 4
+_DTYPES = {
+    "float32": (b"f", np.dtype("<f4")),
+    "float16": (b"e", np.dtype("<f2")),
+}
+_CODES = {code: dtype for code, dtype in _DTYPES.values()}
+
+RawEmbedding = Union[bytes, bytearray, memoryview, str]
+
+
+def storage_dtype() -> str:
+    """``EMBEDDING_STORAGE_DTYPE``: ``float32`` (default) or ``float16`` (half the size)."""
+    value = (os.getenv("EMBEDDING_STORAGE_DTYPE") or "float32").strip().lower()
+    return value if value in _DTYPES else "float32"
+
+
+def encode_embedding(vector: Union[Sequence[float], np.ndarray], dtype: Optional[str] = None) -> bytes:
+    code, np_dtype = _DTYPES[dtype or storage_dtype()]
+    array = np.asarray(vector, dtype=np_dtype).reshape(-1)
+    return MAGIC + code + bytes([VERSION]) + array.tobytes()
+
+
+def is_encoded(raw: Optional[RawEmbedding]) -> bool:
+    if not isinstance(raw, (bytes, bytearray, memoryview)):
+        return False
+    head = bytes(raw[:HEADER_SIZE])
+    return len(head) == HEADER_SIZE and head[:2] == MAGIC and head[2:3] in _CODES
+
+
+def decode_embedding(raw: Optional[RawEmbedding]) -> Optional[np.ndarray]:
+    """Return a float32 vector, or None if ``raw`` is empty or unreadable.
+
+    float32 payloads come back as a read-only view over ``raw``; copy before mutating.
+    """
+    if raw is None:
+        return None
+    if is_encoded(raw):
+        buffer = raw if isinstance(raw, (bytes, memoryview)) else bytes(raw)
+        dtype = _CODES[bytes(buffer[2:3])]
+        if (len(buffer) - HEADER_SIZE) % dtype.itemsize:
+            return None
+        vector = np.frombuffer(buffer, dtype=dtype, offset=HEADER_SIZE)
+        return vector if dtype == np.float32 else vector.astype(np.float32)
+    # Legacy JSON array bytes / TiDB VECTOR text.
+    try:
+        text_value = bytes(raw).decode("utf-8") if not isinstance(raw, str) else raw
+        values = json.loads(text_value)
+    except (UnicodeDecodeError, ValueError):
+        return None
+    vector = np.asarray(values, dtype=np.float32)
+    return vector if vector.ndim == 1 and vector.size else None
+
+
+__all__ = ["HEADER_SIZE", "storage_dtype", "encode_embedding", "decode_embedding", "is_encoded"]
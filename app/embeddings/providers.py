@@ -0,0 +1,198 @@
+"""Embedding providers: a deterministic hash stub and an optional local CPU model.
+
+Providers embed batches of texts into float32 matrices. ``EMBEDDING_PROVIDER`` picks one:
+
+- ``hash`` (default): sha256-chained stub, 768 dims, bit-compatible with the original
+  per-byte implementation but converted a whole digest chain at a time with NumPy.
+- ``local``: a sentence-transformers model (``EMBEDDING_MODEL``) run in a process pool
+  of ``EMBEDDING_WORKERS`` processes so inference never holds the request thread's GIL.
+  Requires the ``sentence-transformers`` package; falls back to ``hash`` if missing.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import importlib.util
+import logging
+import os
+import threading
+from abc import ABC, abstractmethod
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, List, Optional, Sequence
+
+import numpy as np
+
+from ..utils.env import env_int
+
+logger = logging.getLogger("routeforge.embeddings")
+
+HASH_DIM = 768
+_DIGEST_SIZE = 32
+_HASH_ROUNDS = -(-HASH_DIM // _DIGEST_SIZE)
+
+
+class EmbeddingProvider(ABC):
+    """Interface: ``embed_batch`` returns an ``(n, dim)`` float32 matrix."""
+
+    name = "base"
+
+    @property
+    @abstractmethod
+    def dim(self) -> int:
+        """Width of the vectors ``embed_batch`` returns."""
+
+    @property
+    def model_id(self) -> str:
+        """Stable identifier stored with embeddings to detect stale vectors."""
+        return f"{self.name}-{self.dim}"
+
+    @abstractmethod
+    def embed_batch(self, texts: Sequence[str]) -> np.ndarray:
+        """Embed ``texts`` into an ``(len(texts), dim)`` float32 matrix."""
+
+    def embed(self, text_value: str) -> np.ndarray:
+        return self.embed_batch([text_value])[0]
+
+    def close(self) -> None:
+        pass
+
+
+class HashEmbeddingProvider(EmbeddingProvider):
+    """Deterministic stub: chained sha256 digests, each byte scaled to [0, 1]."""
+
+    name = "hash"
+
+    @property
+    def dim(self) -> int:
+        return HASH_DIM
+
+    @staticmethod
+    def _digest_chain(text_value: str) -> bytes:
+        chunks: List[bytes] = []
+        current = text_value.encode("utf-8")
+        for _ in range(_HASH_ROUNDS):
+            current = hashlib.sha256(current).digest()
+            chunks.append(current)
+        return b"".join(chunks)
+
+    def embed_batch(self, texts: Sequence[str]) -> np.ndarray:
+        if not texts:
+            return np.empty((0, HASH_DIM), dtype=np.float32)
+        raw = b"".join(self._digest_chain(t or "") for t in texts)
+        matrix = np.frombuffer(raw, dtype=np.uint8).reshape(len(texts), _HASH_ROUNDS * _DIGEST_SIZE)
+        return matrix[:, :HASH_DIM].astype(np.float32) / np.float32(255.0)
+
+
+# Per-worker-process model, loaded once by the pool initializer.
+_worker_model: Any = None
+
+
+def _init_worker(model_name: str) -> None:
+    global _worker_model
+    from sentence_transformers import SentenceTransformer
+
+    _worker_model = SentenceTransformer(model_name, device="cpu")
+
+
+def _encode_in_worker(texts: List[str]) -> np.ndarray:
+    vectors = _worker_model.encode(texts, batch_size=len(texts), convert_to_numpy=True, show_progress_bar=False)
+    return np.asarray(vectors, dtype=np.float32)
+
+
+class LocalModelProvider(EmbeddingProvider):
+    """sentence-transformers model on CPU, sharded across a process pool."""
+
+    name = "local"
+
+    def __init__(
+        self,
+        model_name: str,
+        *,
+        workers: int = 1,
+        batch_size: int = 64,
+        timeout: Optional[float] = 60.0,
+    ) -> None:
+        if importlib.util.find_spec("sentence_transformers") is None:
+            raise RuntimeError("EMBEDDING_PROVIDER=local requires the sentence-transformers package")
+        self.model_name = model_name
+        self.batch_size = max(int(batch_size), 1)
+        self.timeout = timeout
+        self._pool = ProcessPoolExecutor(
+            max_workers=max(int(workers), 1), initializer=_init_worker, initargs=(model_name,)
+        )
+        self._dim: Optional[int] = None
+
+    @property
+    def dim(self) -> int:
+        if self._dim is None:
+            self._dim = int(self.embed_batch(["dimension probe"]).shape[1])
+        return self._dim
+
+    @property
+    def model_id(self) -> str:
+        return f"{self.name}:{self.model_name}"
+
+    def embed_batch(self, texts: Sequence[str]) -> np.ndarray:
+        items = [t or "" for t in texts]
+        if not items:
+            return np.empty((0, self._dim or 0), dtype=np.float32)
+        chunks = [items[i : i + self.batch_size] for i in range(0, len(items), self.batch_size)]
+        futures = [self._pool.submit(_encode_in_worker, chunk) for chunk in chunks]
+        matrix = np.vstack([f.result(timeout=self.timeout) for f in futures])
+        self._dim = int(matrix.shape[1])
+        return matrix
+
+    def close(self) -> None:
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+
+_provider: Optional[EmbeddingProvider] = None
+_provider_key: Optional[tuple] = None
+_provider_lock = threading.Lock()
+
+
+def _build_provider(kind: str, model_name: str) -> EmbeddingProvider:
+    if kind == "local":
+        try:
+            return LocalModelProvider(
+                model_name,
+                workers=env_int("EMBEDDING_WORKERS", 1),
+                batch_size=env_int("EMBEDDING_BATCH_SIZE", 64),
+                timeout=float(env_int("EMBEDDING_TIMEOUT_SEC", 60)),
+            )
+        except Exception as exc:
+            logger.warning("Local embedding provider unavailable (%s); using hash stub", exc)
+    return HashEmbeddingProvider()
+
+
+def get_provider() -> EmbeddingProvider:
+    """Process-wide provider for the current ``EMBEDDING_PROVIDER``/``EMBEDDING_MODEL``."""
+    global _provider, _provider_key
+    kind = (os.getenv("EMBEDDING_PROVIDER") or "hash").strip().lower()
+    model_name = os.getenv("EMBEDDING_MODEL", "sentence-transformers/all-mpnet-base-v2")
+    key = (kind, model_name if kind == "local" else None)
+    with _provider_lock:
+        if _provider is None or _provider_key != key:
+            if _provider is not None:
+                _provider.close()
+            _provider = _build_provider(kind, model_name)
+            _provider_key = key
+        return _provider
+
+
+def embed_batch(texts: Sequence[str]) -> np.ndarray:
+    return get_provider().embed_batch(texts)
+
+
+def embed_text(text_value: str) -> np.ndarray:
+    return get_provider().embed(text_value)
+
+
+__all__ = [
+    "EmbeddingProvider",
+    "HashEmbeddingProvider",
+    "LocalModelProvider",
+    "get_provider",
+    "embed_batch",
+    "embed_text",
+]
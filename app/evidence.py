@@ -3,24 +3,34 @@ import hashlib
 import io
 import json
 import logging
+import mmap
 import os
 import zipfile
 from datetime import datetime, timedelta, timezone
 from pathlib import Path
-from typing import Dict, Iterable, List, Optional
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
 from urllib.parse import urlparse
 
 import httpx
 from sqlalchemy import select
 from sqlalchemy.orm import Session
 
-from . import models
+from . import hash_cache, merkle, models
 from .licenses import get_license_info, render_license_md
+from .utils.env import env_float
+from .utils.ipaddr import decode_ip
 
 logger = logging.getLogger("routeforge.evidence")
 
 _STREAM_CHUNK_SIZE = 1024 * 1024  # 1 MiB
+_MMAP_SLICE_SIZE = 8 * 1024 * 1024  # bounds each GIL-free update on mapped files
 _EVIDENCE_WINDOW_DAYS = 90
+_HITS_YIELD_PER = 1000
+_ZIP_FLUSH_SIZE = 64 * 1024
+# Canonical archives: fixed member timestamps and a pinned deflate level, so identical
+# evidence yields identical bytes (and therefore identical cache keys and IPFS CIDs).
+_ZIP_EPOCH = (1980, 1, 1, 0, 0, 0)
+_ZIP_COMPRESSLEVEL = 6
 _ENV_ROOT_KEYS = (
     "ARTIFACT_UPLOAD_ROOT",
     "UPLOAD_ROOT",
@@ -32,8 +42,14 @@ _DEFAULT_LOCAL_ROOTS = (
 )
 
 
-def compute_artifact_sha256(artifact_url: str, timeout: float = 30.0) -> Optional[str]:
-    """Return the SHA-256 digest for the artifact URL or local file if accessible."""
+def compute_artifact_sha256(
+    artifact_url: str, timeout: float = 30.0, client: Optional[httpx.Client] = None
+) -> Optional[str]:
+    """Return the SHA-256 digest for the artifact URL or local file if accessible.
+
+    ``client`` lets background hashing reuse pooled connections for remote artifacts.
+    Unchanged files and ``304 Not Modified`` responses are served from ``hash_cache``.
+    """
     if not artifact_url:
         return None
 
@@ -45,7 +61,7 @@ def compute_artifact_sha256(artifact_url: str, timeout: float = 30.0) -> Optiona
 
     parsed = urlparse(artifact_url)
     if parsed.scheme in {"http", "https"}:
-        digest = _hash_remote(artifact_url, timeout=timeout)
+        digest = _hash_remote(artifact_url, timeout=timeout, client=client)
         if digest:
             logger.debug("Hashed artifact from remote URL %s", artifact_url)
         return digest
@@ -59,6 +75,61 @@ def compute_artifact_sha256(artifact_url: str, timeout: float = 30.0) -> Optiona
     return None
 
 
+def cached_artifact_sha256(
+    artifact_url: str, timeout: Optional[float] = None, client: Optional[httpx.Client] = None
+) -> Optional[str]:
+    """Return a ``hash_cache`` digest only if it is still valid, without reading the artifact.
+
+    Local files must match the cached size, mtime and inode. For remote URLs, a conditional
+    ``HEAD`` must answer ``304`` or repeat the cached ``ETag``/``Last-Modified``. This runs on
+    the publish path, so the ``HEAD`` is capped at ``ARTIFACT_REVALIDATE_TIMEOUT_SEC``
+    (default 1s); a slow origin just means "no cached digest" and the artifact is hashed.
+    """
+    if not artifact_url:
+        return None
+
+    for candidate in _iter_candidate_paths(artifact_url):
+        try:
+            stat = candidate.stat()
+        except OSError:
+            continue
+        if candidate.is_file():
+            # An existing local file is authoritative: a stale cache entry means "rehash".
+            return hash_cache.lookup_file(candidate, stat)
+
+    if urlparse(artifact_url).scheme not in {"http", "https"}:
+        return None
+    cached = hash_cache.lookup_remote(artifact_url)
+    if cached is None:
+        return None
+    timeout = env_float("ARTIFACT_REVALIDATE_TIMEOUT_SEC", 1.0) if timeout is None else timeout
+    request_timeout = httpx.Timeout(timeout, connect=min(timeout, 0.5))
+    try:
+        if client is not None:
+            response = client.head(artifact_url, headers=cached.conditional_headers(), timeout=request_timeout)
+        else:
+            response = httpx.head(
+                artifact_url, headers=cached.conditional_headers(), timeout=request_timeout, follow_redirects=True
+            )
+    except httpx.HTTPError as exc:  # pragma: no cover - network variance
+        logger.debug("Could not revalidate cached digest for %s: %s", artifact_url, exc)
+        return None
+    if response.status_code == 304:
+        return cached.digest
+    if response.status_code != 200:
+        return None
+    etag = response.headers.get("etag")
+    last_modified = response.headers.get("last-modified")
+    length = response.headers.get("content-length")
+    if cached.etag:
+        valid = etag == cached.etag and not etag.startswith("W/")
+    else:
+        valid = bool(cached.last_modified) and last_modified == cached.last_modified
+    if valid and cached.content_length is not None and length and length.isdigit():
+        valid = int(length) == cached.content_length
+    return cached.digest if valid else None
+
+
 def _local_roots() -> Iterable[Path]:
     for key in _ENV_ROOT_KEYS:
         raw = os.getenv(key)
@@ -120,43 +191,116 @@ def _iter_candidate_paths(artifact_url: str) -> Iterable[Path]:
 
 
 def _hash_file(path: Path) -> Optional[str]:
-    if not path.exists() or not path.is_file():
+    try:
+        stat = path.stat()
+    except OSError:
         return None
-    digest = hashlib.sha256()
+    if not path.is_file():
+        return None
+    cached = hash_cache.lookup_file(path, stat)
+    if cached:
+        return cached
     try:
         with path.open("rb") as handle:
-            for chunk in iter(lambda: handle.read(_STREAM_CHUNK_SIZE), b""):
-                if not chunk:
-                    break
-                digest.update(chunk)
+            digest = _sha256_mmap(handle, stat.st_size) if stat.st_size else None
+            if digest is None:
+                digest = _sha256_readinto(handle)
     except OSError as exc:  # pragma: no cover - filesystem variance
         logger.warning("Failed to hash local artifact %s: %s", path, exc)
         return None
-    return digest.hexdigest()
+    hexdigest = digest.hexdigest()
+    hash_cache.store_file(path, stat, hexdigest)
+    return hexdigest
+
+
+def _sha256_mmap(handle, size: int):
+    """Hash a mapped file without copying; slices above 2 KiB are hashed with the GIL released."""
+    try:
+        mapped = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        return None  # e.g. special files or filesystems without mmap support
+    digest = hashlib.sha256()
+    with mapped:
+        view = memoryview(mapped)
+        try:
+            for offset in range(0, size, _MMAP_SLICE_SIZE):
+                digest.update(view[offset : offset + _MMAP_SLICE_SIZE])
+        finally:
+            view.release()
+    return digest
 
 
-def _hash_remote(url: str, *, timeout: float) -> Optional[str]:
+def _sha256_readinto(handle):
+    """Fallback: read into one preallocated buffer instead of a fresh bytes object per chunk."""
     digest = hashlib.sha256()
+    buffer = bytearray(_STREAM_CHUNK_SIZE)
+    view = memoryview(buffer)
+    handle.seek(0)
+    while True:
+        count = handle.readinto(buffer)
+        if not count:
+            break
+        digest.update(view[:count])
+    return digest
+
+
+def _hash_remote(
+    url: str,
+    *,
+    timeout: float,
+    client: Optional[httpx.Client] = None,
+    sink: Optional[Callable[[bytes], None]] = None,
+) -> Optional[str]:
+    """Stream and hash ``url``. ``sink`` also receives every chunk (so no conditional GET)."""
+    cached = hash_cache.lookup_remote(url) if sink is None else None
+    headers = cached.conditional_headers() if cached is not None else {}
+    digest = hashlib.sha256()
+    request_timeout = httpx.Timeout(timeout, connect=10.0, read=timeout)
     try:
-        with httpx.stream(
-            "GET",
-            url,
-            timeout=httpx.Timeout(timeout, connect=10.0, read=timeout),
-            follow_redirects=True,
-        ) as response:
+        stream = (
+            client.stream("GET", url, headers=headers, timeout=request_timeout)
+            if client is not None
+            else httpx.stream("GET", url, headers=headers, timeout=request_timeout, follow_redirects=True)
+        )
+        with stream as response:
+            if response.status_code == 304 and cached is not None:
+                logger.debug("Artifact %s not modified; reusing cached digest", url)
+                return cached.digest
             response.raise_for_status()
             for chunk in response.iter_bytes(_STREAM_CHUNK_SIZE):
                 if not chunk:
                     continue
                 digest.update(chunk)
+                if sink is not None:
+                    sink(chunk)
+            validators = response.headers
     except httpx.HTTPError as exc:  # pragma: no cover - network variance
         logger.warning("Failed to hash remote artifact %s: %s", url, exc)
         return None
-    return digest.hexdigest()
+    hexdigest = digest.hexdigest()
+    length = validators.get("content-length")
+    hash_cache.store_remote(
+        url,
+        hexdigest,
+        etag=validators.get("etag"),
+        last_modified=validators.get("last-modified"),
+        content_length=int(length) if length and length.isdigit() else None,
+    )
+    return hexdigest
 
 
 def build_evidence_zip(release_id: int, db: Session) -> bytes:
-    """Assemble an evidence bundle for the given release."""
+    """Assemble an evidence bundle for the given release in memory."""
+    return b"".join(stream_evidence_zip(release_id, db))
+
+
+def stream_evidence_zip(release_id: int, db: Session) -> Iterator[bytes]:
+    """Return an iterator of ZIP bytes for the release's evidence bundle.
+
+    Lookups run eagerly, so a missing release raises ``ValueError`` before anything is
+    sent. ``hits.csv`` is rendered row by row from a server-side cursor, and archive bytes
+    are emitted in ``_ZIP_FLUSH_SIZE`` pieces, so memory use does not grow with hit count.
+    """
     release = db.get(models.Release, release_id)
     if release is None:
         raise ValueError("release_not_found")
@@ -168,7 +312,7 @@ def build_evidence_zip(release_id: int, db: Session) -> bytes:
             .where(
                 models.Route.release_id == release_id,
             )
-            .order_by(models.Route.created_at.asc())
+            .order_by(models.Route.created_at.asc(), models.Route.id.asc())
         ).scalars().all()
     )
 
@@ -180,30 +324,32 @@ def build_evidence_zip(release_id: int, db: Session) -> bytes:
                 models.Audit.entity_type.in_(["release", "route"]),
                 models.Audit.entity_id.in_(audit_entity_ids),
             )
-            .order_by(models.Audit.ts.asc())
+            .order_by(models.Audit.ts.asc(), models.Audit.id.asc())
         ).scalars().all()
     )
 
-    now = datetime.now(timezone.utc)
-    since = now - timedelta(days=_EVIDENCE_WINDOW_DAYS)
-    hits_rows = db.execute(
+    since = evidence_window_start()
+    hits_query = (
         select(
             models.RouteHit.ts,
             models.RouteHit.ip,
-            models.RouteHit.ua,
-            models.RouteHit.ref,
+            models.RouteHit.dup_count,
+            models.UserAgent.value.label("ua"),
+            models.Referrer.value.label("ref"),
             models.Route.id.label("route_id"),
             models.Route.slug.label("route_slug"),
         )
+        .select_from(models.RouteHit)
         .join(models.Route, models.RouteHit.route_id == models.Route.id)
+        .outerjoin(models.UserAgent, models.UserAgent.id == models.RouteHit.ua_id)
+        .outerjoin(models.Referrer, models.Referrer.id == models.RouteHit.ref_id)
         .where(
             models.Route.release_id == release_id,
             models.RouteHit.ts >= since,
         )
-        .order_by(models.RouteHit.ts.desc())
-    ).all()
-
-    evidence_buffer = io.BytesIO()
+        .order_by(models.RouteHit.ts.desc(), models.RouteHit.id.desc())
+        .execution_options(yield_per=_HITS_YIELD_PER)
+    )
 
     license_info = get_license_info(release.license_code)
 
@@ -214,6 +360,7 @@ def build_evidence_zip(release_id: int, db: Session) -> bytes:
         "notes": release.notes,
         "artifact_url": release.artifact_url,
         "artifact_sha256": release.artifact_sha256,
+        "artifact_merkle_root": release.artifact_merkle_root,
         "license_code": release.license_code,
         "license_custom_text": release.license_custom_text,
         "license_url": license_info.url if license_info else None,
@@ -252,31 +399,104 @@ def build_evidence_zip(release_id: int, db: Session) -> bytes:
             }
         )
 
-    hits_csv = _render_hits_csv(hits_rows)
+    members: List[Tuple[str, str]] = [
+        ("release.json", _canonical_json(release_payload)),
+        ("routes.json", _canonical_json(routes_payload)),
+        ("audit.json", _canonical_json(audit_payload)),
+    ]
+    trailing: List[Tuple[str, str]] = []
+    merkle_payload = merkle.release_merkle_payload(release)
+    if merkle_payload is not None:
+        trailing.append(("merkle.json", _canonical_json(merkle_payload)))
+    license_markdown = render_license_md(release)
+    if license_markdown:
+        trailing.append(("LICENSE.md", license_markdown))
+    else:
+        license_path = Path("LICENSE.md")
+        if license_path.exists():
+            trailing.append(("LICENSE.md", license_path.read_text(encoding="utf-8")))
 
-    with zipfile.ZipFile(evidence_buffer, mode="w", compression=zipfile.ZIP_DEFLATED) as archive:
-        archive.writestr("release.json", json.dumps(release_payload, indent=2))
-        archive.writestr("routes.json", json.dumps(routes_payload, indent=2))
-        archive.writestr("audit.json", json.dumps(audit_payload, indent=2))
-        archive.writestr("hits.csv", hits_csv)
+    return _iter_evidence_zip(members, db.execute(hits_query), trailing)
 
-        license_markdown = render_license_md(release)
-        if license_markdown:
-            archive.writestr("LICENSE.md", license_markdown)
-        else:
-            license_path = Path("LICENSE.md")
-            if license_path.exists():
-                archive.write(license_path, arcname="LICENSE.md")
 
-    return evidence_buffer.getvalue()
+def evidence_window_start() -> datetime:
+    """Start of the hit window, truncated to UTC midnight so same-day builds agree."""
+    today = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+    return today - timedelta(days=_EVIDENCE_WINDOW_DAYS)
+
+
+def _canonical_json(payload: object) -> str:
+    return json.dumps(payload, indent=2, sort_keys=True, ensure_ascii=False) + "\n"
+
+
+def _zip_info(name: str) -> zipfile.ZipInfo:
+    """Member header with everything that could vary between builds pinned."""
+    info = zipfile.ZipInfo(name, date_time=_ZIP_EPOCH)
+    info.compress_type = zipfile.ZIP_DEFLATED
+    info._compresslevel = _ZIP_COMPRESSLEVEL  # ZipInfo has no public setter before 3.13
+    info.create_system = 3
+    info.external_attr = 0o644 << 16
+    return info
+
+
+def _iter_evidence_zip(
+    members: List[Tuple[str, str]], hits_rows: Iterable, trailing: List[Tuple[str, str]]
+) -> Iterator[bytes]:
+    sink = _ZipSink()
+    with zipfile.ZipFile(sink, mode="w") as archive:
+        for name, content in members:
+            archive.writestr(_zip_info(name), content)
+            yield sink.drain()
+        # Size unknown up front: streamed with a data descriptor, zip64 in case it is huge.
+        with archive.open(_zip_info("hits.csv"), mode="w", force_zip64=True) as handle:
+            for line in _iter_hits_csv(hits_rows):
+                handle.write(line.encode("utf-8"))
+                if sink.pending >= _ZIP_FLUSH_SIZE:
+                    yield sink.drain()
+        for name, content in trailing:
+            archive.writestr(_zip_info(name), content)
+    yield sink.drain()
+
+
+class _ZipSink(io.RawIOBase):
+    """Non-seekable ``ZipFile`` target; ``drain`` hands off the bytes written so far."""
+
+    def __init__(self) -> None:
+        self._chunks: List[bytes] = []
+        self._position = 0
+        self.pending = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return False
+
+    def write(self, data) -> int:
+        chunk = bytes(data)
+        self._chunks.append(chunk)
+        self._position += len(chunk)
+        self.pending += len(chunk)
+        return len(chunk)
+
+    def tell(self) -> int:
+        return self._position
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        self.pending = 0
+        return data
 
 
-def _render_hits_csv(rows: List) -> str:
-    header = ["ts", "route_id", "route_slug", "ip", "ua", "ref"]
+def _iter_hits_csv(rows: Iterable) -> Iterator[str]:
     buffer = io.StringIO()
     writer = csv.writer(buffer)
-    writer.writerow(header)
+    writer.writerow(["ts", "route_id", "route_slug", "ip", "ua", "ref", "dup_count"])
+    yield buffer.getvalue()
     for row in rows:
+        buffer.seek(0)
+        buffer.truncate(0)
         ts = row.ts
         if ts is None:
             ts_value = ""
@@ -289,12 +509,13 @@ def _render_hits_csv(rows: List) -> str:
                 ts_value,
                 row.route_id,
                 row.route_slug,
-                row.ip or "",
+                decode_ip(row.ip) or "",
                 row.ua or "",
                 row.ref or "",
+                int(row.dup_count or 0),
             ]
         )
-    return buffer.getvalue()
+        yield buffer.getvalue()
 
 
 def extract_ipfs_cid(evidence_uri: Optional[str]) -> Optional[str]:
@@ -332,7 +553,9 @@ def persist_evidence_ipfs_cid(db: Session, release: models.Release, evidence_uri
 
 __all__ = [
     "compute_artifact_sha256",
+    "cached_artifact_sha256",
     "build_evidence_zip",
+    "stream_evidence_zip",
     "extract_ipfs_cid",
     "persist_evidence_ipfs_cid",
 ]
@@ -0,0 +1,383 @@
+"""On-disk, content-addressed cache of evidence bundles.
+
+Bundles are stored as ``blobs/<sha256>.zip`` under ``EVIDENCE_CACHE_DIR`` (default
+``tmp/evidence``). A small ``releases/<id>.json`` index points each release at its current
+blob and at the watermark it was built from. The watermark covers the latest audit, hit and
+route ids, the release/project fields and license, and the day the 90-day hit window
+starts. Checking it costs one aggregate query instead of rebuilding the archive.
+
+Stale bundles are served straight away. When one is older than ``EVIDENCE_CACHE_REFRESH_SEC``
+(default 60) it is also rebuilt on the in-process worker. Only a release with no bundle yet
+is built inline. Responses carry the blob digest as ``ETag`` and honour ``If-None-Match`` and
+single ``Range`` requests.
+
+Publishing a release, changing its license or finishing its artifact hash queues a
+precompute (``EVIDENCE_PRECOMPUTE``, default on), so downloads and attestation normally find
+the bundle ready. With ``EVIDENCE_PIN_ON_PUBLISH=1`` the precomputed bundle is also pinned
+to IPFS and its CID stored on the release. Identical bytes are never pinned twice.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import re
+import tempfile
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterator, Optional, Set, Tuple
+
+from fastapi import Request
+from fastapi.responses import Response, StreamingResponse
+from sqlalchemy import and_, func, or_, select
+from sqlalchemy.orm import Session
+
+from . import models
+from .db import try_get_session
+from .storage.pin_queue import enqueue_pin
+from .evidence import evidence_window_start, stream_evidence_zip
+from .worker.queue import queue
+
+
+logger = logging.getLogger("routeforge.evidence.cache")
+
+_READ_CHUNK_SIZE = 64 * 1024
+_RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+# (release_id, pin) pairs with a build queued or running.
+_pending: Set[Tuple[int, bool]] = set()
+_lock = threading.Lock()
+
+
+@dataclass
+class CachedBundle:
+    release_id: int
+    path: Path
+    sha256: str
+    size: int
+    fresh: bool
+
+    @property
+    def etag(self) -> str:
+        return f'"{self.sha256}"'
+
+
+def cache_dir() -> Path:
+    return Path(os.getenv("EVIDENCE_CACHE_DIR", "tmp/evidence"))
+
+
+def _refresh_seconds() -> float:
+    try:
+        return float(os.getenv("EVIDENCE_CACHE_REFRESH_SEC", "60") or 60)
+    except ValueError:
+        return 60.0
+
+
+def evidence_watermark(db: Session, release: models.Release) -> str:
+    """Digest of everything the bundle depends on; changes whenever the bundle would."""
+    release_id = int(release.id)
+    own_routes = models.Route.release_id == release_id
+    route_ids = select(models.Route.id).where(own_routes)
+    stats = db.execute(
+        select(
+            select(func.count(models.Route.id)).where(own_routes).scalar_subquery().label("routes"),
+            select(func.max(models.Route.id)).where(own_routes).scalar_subquery().label("route_max"),
+            select(func.max(models.RouteHit.id))
+            .where(models.RouteHit.route_id.in_(route_ids))
+            .scalar_subquery()
+            .label("hit_max"),
+            # De-duplicated clicks only bump counts on existing rows; each flush also bumps
+            # the route's dup_hits, so summing over the release's few routes catches them.
+            select(func.coalesce(func.sum(models.Route.dup_hits), 0))
+            .where(own_routes)
+            .scalar_subquery()
+            .label("dup_total"),
+            select(func.max(models.Audit.id))
+            .where(
+                or_(
+                    and_(models.Audit.entity_type == "release", models.Audit.entity_id == release_id),
+                    and_(models.Audit.entity_type == "route", models.Audit.entity_id.in_(route_ids)),
+                )
+            )
+            .scalar_subquery()
+            .label("audit_max"),
+        )
+    ).one()
+    project = release.project
+    parts = [
+        release_id,
+        stats.routes,
+        stats.route_max,
+        stats.hit_max,
+        stats.dup_total,
+        stats.audit_max,
+        release.version,
+        release.notes,
+        release.artifact_url,
+        release.artifact_sha256,
+        release.artifact_merkle_root,
+        release.license_code,
+        release.license_custom_text,
+        project.name if project else None,
+        project.owner if project else None,
+        project.description if project else None,
+        evidence_window_start().isoformat(),
+    ]
+    return hashlib.sha256(json.dumps(parts, default=str).encode("utf-8")).hexdigest()
+
+
+def _index_path(release_id: int) -> Path:
+    return cache_dir() / "releases" / f"{int(release_id)}.json"
+
+
+def _blob_path(sha256: str) -> Path:
+    return cache_dir() / "blobs" / f"{sha256}.zip"
+
+
+def _read_index(release_id: int) -> Optional[Dict[str, object]]:
+    try:
+        entry = json.loads(_index_path(release_id).read_text())
+    except (OSError, ValueError):
+        return None
+    if not isinstance(entry, dict) or not _blob_path(str(entry.get("sha256"))).is_file():
+        return None
+    return entry
+
+
+def _write_atomic(path: Path, data: bytes) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=".tmp-")
+    with os.fdopen(fd, "wb") as handle:
+        handle.write(data)
+    os.replace(tmp, path)
+
+
+def build_evidence_bundle(db: Session, release_id: int) -> CachedBundle:
+    """Render the bundle to a blob, repoint the release index, and drop the previous blob."""
+    release = db.get(models.Release, release_id)
+    if release is None:
+        raise ValueError("release_not_found")
+    watermark = evidence_watermark(db, release)
+    chunks = stream_evidence_zip(release_id, db)
+
+    blobs = cache_dir() / "blobs"
+    blobs.mkdir(parents=True, exist_ok=True)
+    digest = hashlib.sha256()
+    size = 0
+    fd, tmp = tempfile.mkstemp(dir=blobs, prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "wb") as handle:
+            for chunk in chunks:
+                digest.update(chunk)
+                handle.write(chunk)
+                size += len(chunk)
+        sha256 = digest.hexdigest()
+        os.replace(tmp, _blob_path(sha256))
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+
+    previous = _read_index(release_id)
+    entry: Dict[str, object] = {"watermark": watermark, "sha256": sha256, "size": size, "built_at": time.time()}
+    if previous is not None and previous.get("sha256") == sha256 and previous.get("cid"):
+        entry["cid"] = previous["cid"]  # same bytes, same pin
+    _write_atomic(_index_path(release_id), json.dumps(entry).encode("utf-8"))
+    if previous is not None and previous.get("sha256") != sha256:
+        # Open readers keep their handle; unlinking only frees the name.
+        try:
+            _blob_path(str(previous["sha256"])).unlink()
+        except OSError:
+            pass
+    logger.info("Built evidence bundle release=%s sha256=%s size=%s", release_id, sha256, size)
+    return CachedBundle(release_id=int(release_id), path=_blob_path(sha256), sha256=sha256, size=size, fresh=True)
+
+
+def _bundle_from_entry(release_id: int, entry: Dict[str, object], fresh: bool) -> CachedBundle:
+    sha256 = str(entry["sha256"])
+    return CachedBundle(
+        release_id=int(release_id),
+        path=_blob_path(sha256),
+        sha256=sha256,
+        size=int(entry.get("size") or 0),
+        fresh=fresh,
+    )
+
+
+def _flag(name: str, default: str) -> bool:
+    return (os.getenv(name) or default).strip().lower() in {"1", "true", "yes", "on"}
+
+
+def precompute_enabled() -> bool:
+    """``EVIDENCE_PRECOMPUTE`` (default on): build bundles when a release is published or changed."""
+    return _flag("EVIDENCE_PRECOMPUTE", "1")
+
+
+def pin_on_publish() -> bool:
+    """``EVIDENCE_PIN_ON_PUBLISH`` (default off): also pin precomputed bundles to IPFS."""
+    return _flag("EVIDENCE_PIN_ON_PUBLISH", "0")
+
+
+def _pin_bundle(db: Session, release: models.Release, bundle: CachedBundle) -> Optional[str]:
+    """Pin the bundle unless these exact bytes are already pinned, and record the CID."""
+    entry = _read_index(bundle.release_id)
+    cid = entry.get("cid") if entry is not None and entry.get("sha256") == bundle.sha256 else None
+    if not cid:
+        cid = enqueue_pin(f"release-{bundle.release_id}-evidence.zip", bundle.path.read_bytes())
+        if not cid:
+            return None
+        if entry is not None and entry.get("sha256") == bundle.sha256:
+            entry["cid"] = cid
+            _write_atomic(_index_path(bundle.release_id), json.dumps(entry).encode("utf-8"))
+    if release.evidence_ipfs_cid != cid:
+        release.evidence_ipfs_cid = str(cid)
+        db.commit()
+        logger.info("Queued evidence pin for release %s as %s", bundle.release_id, cid)
+    return str(cid)
+
+
+def precompute_evidence_bundle(db: Session, release_id: int, *, pin: bool = False) -> CachedBundle:
+    """Make sure the release has a fresh bundle on disk, optionally pinning it."""
+    release = db.get(models.Release, release_id)
+    if release is None:
+        raise ValueError("release_not_found")
+    entry = _read_index(release_id)
+    if entry is not None and entry.get("watermark") == evidence_watermark(db, release):
+        bundle = _bundle_from_entry(release_id, entry, True)
+    else:
+        bundle = build_evidence_bundle(db, release_id)
+    if pin:
+        _pin_bundle(db, release, bundle)
+    return bundle
+
+
+def _precompute_task(args: Tuple[int, bool]) -> None:
+    release_id, pin = args
+    db = try_get_session()
+    try:
+        if db is not None:
+            precompute_evidence_bundle(db, release_id, pin=pin)
+    except Exception as exc:
+        logger.warning("Background evidence build failed for release %s: %s", release_id, exc)
+    finally:
+        if db is not None:
+            db.close()
+        with _lock:
+            _pending.discard(args)
+
+
+def _schedule(release_id: int, pin: bool, kind: str) -> bool:
+    key = (int(release_id), bool(pin))
+    with _lock:
+        if key in _pending:
+            return False
+        _pending.add(key)
+    submitted = queue.submit(f"{kind}:{release_id}:{time.time()}", kind, _precompute_task, key)
+    if not submitted:
+        with _lock:
+            _pending.discard(key)
+    return submitted
+
+
+def schedule_evidence_rebuild(release_id: int) -> bool:
+    """Queue a background rebuild unless one is already pending for the release."""
+    return _schedule(release_id, False, "evidence_bundle")
+
+
+def schedule_evidence_precompute(release_id: int) -> bool:
+    """Queue an ahead-of-time build (and pin, if enabled) after a publish or release change."""
+    if not precompute_enabled():
+        return False
+    return _schedule(release_id, pin_on_publish(), "evidence_precompute")
+
+
+def get_evidence_bundle(db: Session, release_id: int) -> CachedBundle:
+    """Return the cached bundle for ``release_id``, building it only if none exists yet."""
+    release = db.get(models.Release, release_id)
+    if release is None:
+        raise ValueError("release_not_found")
+    entry = _read_index(release_id)
+    if entry is None:
+        return build_evidence_bundle(db, release_id)
+
+    fresh = entry.get("watermark") == evidence_watermark(db, release)
+    if not fresh and time.time() - float(entry.get("built_at") or 0) >= _refresh_seconds():
+        schedule_evidence_rebuild(release_id)
+    return _bundle_from_entry(release_id, entry, fresh)
+
+
+def _iter_file(handle, start: int, length: int) -> Iterator[bytes]:
+    try:
+        handle.seek(start)
+        remaining = length
+        while remaining > 0:
+            chunk = handle.read(min(_READ_CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+    finally:
+        handle.close()
+
+
+def evidence_response(
+    request: Request, bundle: CachedBundle, filename: str, *, cache_control: str = "private, no-cache"
+) -> Response:
+    """Serve a cached bundle with ETag revalidation and single-range support."""
+    headers = {
+        "ETag": bundle.etag,
+        "Accept-Ranges": "bytes",
+        "Cache-Control": cache_control,
+        "Content-Disposition": f'attachment; filename="{filename}"',
+    }
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and bundle.etag in {tag.strip() for tag in if_none_match.split(",")}:
+        return Response(status_code=304, headers=headers)
+
+    # Open before responding so a concurrent rebuild that unlinks the blob cannot break the read.
+    handle = bundle.path.open("rb")
+    size = os.fstat(handle.fileno()).st_size
+    start, end = 0, size - 1
+    status_code = 200
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if range_header and (not if_range or if_range.strip() == bundle.etag):
+        match = _RANGE_RE.match(range_header.strip())
+        if match and (match.group(1) or match.group(2)):
+            if match.group(1):
+                start = int(match.group(1))
+                end = min(int(match.group(2)), size - 1) if match.group(2) else size - 1
+            else:
+                start = max(size - int(match.group(2)), 0)
+            if start > end or start >= size:
+                handle.close()
+                headers["Content-Range"] = f"bytes */{size}"
+                return Response(status_code=416, headers=headers)
+            status_code = 206
+            headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    length = max(end - start + 1, 0)
+    headers["Content-Length"] = str(length)
+    return StreamingResponse(
+        _iter_file(handle, start, length), status_code=status_code, media_type="application/zip", headers=headers
+    )
+
+
+__all__ = [
+    "CachedBundle",
+    "cache_dir",
+    "evidence_watermark",
+    "build_evidence_bundle",
+    "schedule_evidence_rebuild",
+    "precompute_enabled",
+    "pin_on_publish",
+    "precompute_evidence_bundle",
+    "schedule_evidence_precompute",
+    "get_evidence_bundle",
+    "evidence_response",
+]
@@ -0,0 +1,360 @@
+"""Bulk export jobs: write partitioned hit files off the request path."""
+
+from __future__ import annotations
+
+import csv
+import io
+import json
+import logging
+import os
+import shutil
+import time
+import uuid
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from . import models
+from .db import now_utc, try_get_session
+from .storage.s3 import presign_get, upload_file
+from .utils.env import env_int
+from .utils.ipaddr import decode_ip
+from .worker.queue import queue
+
+logger = logging.getLogger("routeforge.exports")
+
+EXPORT_FORMATS = ("csv", "jsonl")
+_CONTENT_TYPES = {"csv": "text/csv", "jsonl": "application/x-ndjson"}
+_FIELDS = ("ts", "route_id", "route_slug", "ip", "ua", "ref", "dup_count")
+_BATCH_SIZE = 5000
+
+
+def _export_root() -> Path:
+    return Path(os.getenv("EXPORT_ROOT", "tmp/exports"))
+
+
+def _storage_backend() -> str:
+    backend = (os.getenv("EXPORT_STORAGE") or "local").strip().lower()
+    return backend if backend in {"local", "s3"} else "local"
+
+
+def _partition_rows() -> int:
+    return max(env_int("EXPORT_PARTITION_ROWS", 100000), 1)
+
+
+def _retention_days() -> int:
+    return env_int("EXPORT_RETENTION_DAYS", 7)
+
+
+def expire_local_exports(now: Optional[float] = None) -> int:
+    """Delete job directories under ``EXPORT_ROOT`` untouched for ``EXPORT_RETENTION_DAYS``.
+
+    Only 32-character hex directories (job ids) are considered; ``0`` or a negative
+    value disables the sweep. Returns the number of directories removed.
+    """
+    days = _retention_days()
+    root = _export_root()
+    if days <= 0 or not root.is_dir():
+        return 0
+    cutoff = (time.time() if now is None else now) - days * 86400
+    removed = 0
+    for entry in root.iterdir():
+        name = entry.name
+        if len(name) != 32 or any(ch not in "0123456789abcdef" for ch in name):
+            continue
+        try:
+            if not entry.is_dir() or entry.stat().st_mtime >= cutoff:
+                continue
+            shutil.rmtree(entry)
+            removed += 1
+        except OSError as exc:  # pragma: no cover - best effort cleanup
+            logger.warning("Could not remove expired export %s: %s", entry, exc)
+    if removed:
+        logger.info("Expired %s local export(s) older than %s days", removed, days)
+    return removed
+
+
+def _iso(value: Optional[datetime]) -> Optional[str]:
+    if value is None:
+        return None
+    return value.isoformat() if hasattr(value, "isoformat") else str(value)
+
+
+def _parse_iso(value: Optional[str]) -> Optional[datetime]:
+    if not value:
+        return None
+    return datetime.fromisoformat(value)
+
+
+class _PartitionWriter:
+    """Write rows for one route into numbered files, rotating every ``max_rows``."""
+
+    def __init__(self, directory: Path, stem: str, fmt: str, max_rows: int) -> None:
+        self.directory = directory
+        self.stem = stem
+        self.fmt = fmt
+        self.max_rows = max_rows
+        self.files: List[Dict[str, Any]] = []
+        self._handle: Optional[io.TextIOWrapper] = None
+        self._writer: Optional[Any] = None
+        self._rows = 0
+
+    def _open(self) -> None:
+        name = f"{self.stem}-part-{len(self.files) + 1:04d}.{self.fmt}"
+        path = self.directory / name
+        self._handle = path.open("w", encoding="utf-8", newline="")
+        self._rows = 0
+        if self.fmt == "csv":
+            self._writer = csv.writer(self._handle)
+            self._writer.writerow(_FIELDS)
+        self.files.append({"name": name, "path": str(path), "rows": 0})
+
+    def _close(self) -> None:
+        if self._handle is None:
+            return
+        self._handle.close()
+        current = self.files[-1]
+        current["rows"] = self._rows
+        current["bytes"] = os.path.getsize(current["path"])
+        self._handle = None
+        self._writer = None
+
+    def write(self, row: Dict[str, Any]) -> None:
+        if self._handle is None or self._rows >= self.max_rows:
+            self._close()
+            self._open()
+        assert self._handle is not None
+        if self.fmt == "csv":
+            self._writer.writerow(["" if row[field] is None else row[field] for field in _FIELDS])
+        else:
+            self._handle.write(json.dumps(row, separators=(",", ":")))
+            self._handle.write("\n")
+        self._rows += 1
+
+    def finish(self) -> List[Dict[str, Any]]:
+        self._close()
+        return self.files
+
+
+def create_export_job(
+    db: Session,
+    *,
+    user_id: int,
+    route_ids: Sequence[int],
+    fmt: str,
+    project_id: Optional[int] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+) -> models.ExportJob:
+    """Persist a queued export job. ``route_ids`` must already be ownership-checked."""
+    job = models.ExportJob(
+        id=uuid.uuid4().hex,
+        user_id=int(user_id),
+        status="queued",
+        format=fmt,
+        params={
+            "project_id": project_id,
+            "route_ids": sorted(int(r) for r in route_ids),
+            "since": _iso(since),
+            "until": _iso(until),
+        },
+        files=[],
+        rows_exported=0,
+    )
+    db.add(job)
+    db.commit()
+    expire_local_exports()
+    return job
+
+
+def submit_export_job(job_id: str) -> bool:
+    """Hand the job to the in-process worker; returns False when the queue is full."""
+    return queue.submit(f"export:{job_id}", "bulk_export", run_export_job, job_id)
+
+
+def _iter_route_hits(db: Session, route_id: int, since: Optional[datetime], until: Optional[datetime]):
+    """Yield hits for a route in id order using short keyset queries."""
+    last_id = 0
+    while True:
+        query = (
+            select(
+                models.RouteHit.id,
+                models.RouteHit.ts,
+                models.RouteHit.ip,
+                models.UserAgent.value.label("ua"),
+                models.Referrer.value.label("ref"),
+                models.RouteHit.dup_count,
+            )
+            .select_from(models.RouteHit)
+            .outerjoin(models.UserAgent, models.UserAgent.id == models.RouteHit.ua_id)
+            .outerjoin(models.Referrer, models.Referrer.id == models.RouteHit.ref_id)
+            .where(models.RouteHit.route_id == route_id, models.RouteHit.id > last_id)
+            .order_by(models.RouteHit.id.asc())
+            .limit(_BATCH_SIZE)
+        )
+        if since is not None:
+            query = query.where(models.RouteHit.ts >= since)
+        if until is not None:
+            query = query.where(models.RouteHit.ts < until)
+        rows = db.execute(query).all()
+        if not rows:
+            return
+        yield from rows
+        last_id = int(rows[-1].id)
+        if len(rows) < _BATCH_SIZE:
+            return
+
+
+def _publish_files(job_id: str, files: List[Dict[str, Any]], fmt: str) -> List[Dict[str, Any]]:
+    published: List[Dict[str, Any]] = []
+    backend = _storage_backend()
+    for entry in files:
+        item = {
+            "name": entry["name"],
+            "route_id": entry["route_id"],
+            "rows": entry["rows"],
+            "bytes": entry.get("bytes", 0),
+            "storage": backend,
+        }
+        if backend == "s3":
+            key = f"exports/{job_id}/{entry['name']}"
+            upload_file(key, entry["path"], _CONTENT_TYPES[fmt])
+            try:
+                os.remove(entry["path"])
+            except OSError:  # pragma: no cover - best effort cleanup
+                pass
+            item["key"] = key
+        published.append(item)
+    return published
+
+
+def run_export_job(job_id: str, db: Optional[Session] = None) -> None:
+    """Worker entry point: stream hits per route into partitioned files."""
+    owns_session = db is None
+    if db is None:
+        db = try_get_session()
+        if db is None:
+            logger.warning("Export job %s skipped: database unavailable", job_id)
+            return
+
+    try:
+        job = db.get(models.ExportJob, job_id)
+        if job is None:
+            return
+        job.status = "running"
+        job.started_at = now_utc()
+        db.commit()
+
+        params = dict(job.params or {})
+        fmt = job.format if job.format in EXPORT_FORMATS else "csv"
+        since = _parse_iso(params.get("since"))
+        until = _parse_iso(params.get("until"))
+        directory = _export_root() / job_id
+        directory.mkdir(parents=True, exist_ok=True)
+
+        routes = db.execute(
+            select(models.Route.id, models.Route.slug)
+            .where(
+                models.Route.id.in_(params.get("route_ids") or []),
+                models.Route.user_id == job.user_id,
+            )
+            .order_by(models.Route.id.asc())
+        ).all()
+
+        files: List[Dict[str, Any]] = []
+        total = 0
+        for route in routes:
+            writer = _PartitionWriter(directory, f"route-{route.slug}", fmt, _partition_rows())
+            for hit in _iter_route_hits(db, int(route.id), since, until):
+                writer.write(
+                    {
+                        "ts": _iso(hit.ts),
+                        "route_id": int(route.id),
+                        "route_slug": route.slug,
+                        "ip": decode_ip(hit.ip),
+                        "ua": hit.ua,
+                        "ref": hit.ref,
+                        "dup_count": int(hit.dup_count or 0),
+                    }
+                )
+                total += 1
+            for entry in writer.finish():
+                entry["route_id"] = int(route.id)
+                files.append(entry)
+            # Release the snapshot between routes so long exports do not hold one transaction open.
+            db.commit()
+
+        job.files = _publish_files(job_id, files, fmt)
+        job.rows_exported = total
+        job.status = "done"
+        job.finished_at = now_utc()
+        db.commit()
+        logger.info("Export job %s finished rows=%s files=%s", job_id, total, len(files))
+    except Exception as exc:
+        logger.exception("Export job %s failed: %s", job_id, exc)
+        db.rollback()
+        job = db.get(models.ExportJob, job_id)
+        if job is not None:
+            job.status = "error"
+            job.error = str(exc)[:255]
+            job.finished_at = now_utc()
+            db.commit()
+    finally:
+        if owns_session:
+            db.close()
+
+
+def export_file_path(job: models.ExportJob, name: str) -> Optional[Path]:
+    """Return the local path of a finished partition, or None if unknown."""
+    for entry in job.files or []:
+        if entry.get("name") == name and entry.get("storage") == "local":
+            path = _export_root() / job.id / name
+            return path if path.is_file() else None
+    return None
+
+
+def serialize_export_job(job: models.ExportJob) -> Dict[str, Any]:
+    """Return the public job payload including download links once finished."""
+    app_base = os.getenv("APP_BASE_URL", "http://localhost:8000").rstrip("/")
+    files: List[Dict[str, Any]] = []
+    if job.status == "done":
+        for entry in job.files or []:
+            if entry.get("storage") == "s3" and entry.get("key"):
+                url = presign_get(entry["key"])
+            else:
+                url = f"{app_base}/api/exports/{job.id}/files/{entry['name']}"
+            files.append(
+                {
+                    "name": entry["name"],
+                    "route_id": entry.get("route_id"),
+                    "rows": entry.get("rows", 0),
+                    "bytes": entry.get("bytes", 0),
+                    "url": url,
+                }
+            )
+    return {
+        "id": job.id,
+        "status": job.status,
+        "format": job.format,
+        "params": job.params or {},
+        "rows_exported": int(job.rows_exported or 0),
+        "files": files,
+        "error": job.error,
+        "created_at": _iso(job.created_at),
+        "started_at": _iso(job.started_at),
+        "finished_at": _iso(job.finished_at),
+    }
+
+
+__all__ = [
+    "EXPORT_FORMATS",
+    "create_export_job",
+    "expire_local_exports",
+    "submit_export_job",
+    "run_export_job",
+    "export_file_path",
+    "serialize_export_job",
+]
@@ -0,0 +1,204 @@
+"""Persistent SHA-256 cache for artifact contents.
+
+Local files are keyed by resolved path and validated by ``(size, mtime_ns, inode)``, so an
+unchanged file is re-hashed for the price of a ``stat``. Remote artifacts are keyed by URL
+and remember the ``ETag`` / ``Last-Modified`` / ``Content-Length`` of the response that was
+hashed; callers revalidate with a conditional GET and reuse the digest on ``304``.
+
+Entries live in a small sqlite3 file at ``HASH_CACHE_PATH`` (default
+``tmp/hash_cache.sqlite3``); set it to an empty string to disable the cache.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Optional
+
+
+logger = logging.getLogger("routeforge.hash_cache")
+
+_DEFAULT_PATH = "tmp/hash_cache.sqlite3"
+
+_conn: Optional[sqlite3.Connection] = None
+_conn_path: Optional[str] = None
+_lock = threading.Lock()
+
+
+@dataclass(frozen=True)
+class RemoteEntry:
+    digest: str
+    etag: Optional[str]
+    last_modified: Optional[str]
+    content_length: Optional[int]
+
+    def conditional_headers(self) -> Dict[str, str]:
+        headers: Dict[str, str] = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+
+def cache_path() -> Optional[str]:
+    raw = os.getenv("HASH_CACHE_PATH", _DEFAULT_PATH)
+    return raw.strip() or None
+
+
+def _connect() -> Optional[sqlite3.Connection]:
+    """Return the shared connection for the current ``HASH_CACHE_PATH``. Call with ``_lock`` held."""
+    global _conn, _conn_path
+    path = cache_path()
+    if path is None:
+        return None
+    if _conn is not None and _conn_path == path:
+        return _conn
+    if _conn is not None:
+        _conn.close()
+        _conn = None
+    try:
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS file_digests (
+              path TEXT PRIMARY KEY,
+              size INTEGER NOT NULL,
+              mtime_ns INTEGER NOT NULL,
+              inode INTEGER NOT NULL,
+              sha256 TEXT NOT NULL,
+              checked_at REAL NOT NULL
+            )
+            """
+        )
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS url_digests (
+              url TEXT PRIMARY KEY,
+              etag TEXT NULL,
+              last_modified TEXT NULL,
+              content_length INTEGER NULL,
+              sha256 TEXT NOT NULL,
+              checked_at REAL NOT NULL
+            )
+            """
+        )
+    except sqlite3.Error as exc:
+        logger.warning("Hash cache unavailable at %s: %s", path, exc)
+        return None
+    _conn, _conn_path = conn, path
+    return conn
+
+
+def lookup_file(path: Path, stat: os.stat_result) -> Optional[str]:
+    """Cached digest for ``path`` if its size, mtime and inode still match."""
+    with _lock:
+        conn = _connect()
+        if conn is None:
+            return None
+        try:
+            row = conn.execute(
+                "SELECT sha256 FROM file_digests WHERE path = ? AND size = ? AND mtime_ns = ? AND inode = ?",
+                (str(path), stat.st_size, stat.st_mtime_ns, stat.st_ino),
+            ).fetchone()
+        except sqlite3.Error as exc:
+            logger.warning("Hash cache lookup failed for %s: %s", path, exc)
+            return None
+    return row[0] if row else None
+
+
+def store_file(path: Path, stat: os.stat_result, digest: str) -> None:
+    with _lock:
+        conn = _connect()
+        if conn is None:
+            return
+        try:
+            conn.execute(
+                "INSERT OR REPLACE INTO file_digests (path, size, mtime_ns, inode, sha256, checked_at)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (str(path), stat.st_size, stat.st_mtime_ns, stat.st_ino, digest, time.time()),
+            )
+        except sqlite3.Error as exc:
+            logger.warning("Hash cache write failed for %s: %s", path, exc)
+
+
+def lookup_remote(url: str) -> Optional[RemoteEntry]:
+    with _lock:
+        conn = _connect()
+        if conn is None:
+            return None
+        try:
+            row = conn.execute(
+                "SELECT sha256, etag, last_modified, content_length FROM url_digests WHERE url = ?",
+                (url,),
+            ).fetchone()
+        except sqlite3.Error as exc:
+            logger.warning("Hash cache lookup failed for %s: %s", url, exc)
+            return None
+    if row is None:
+        return None
+    return RemoteEntry(digest=row[0], etag=row[1], last_modified=row[2], content_length=row[3])
+
+
+def store_remote(
+    url: str,
+    digest: str,
+    *,
+    etag: Optional[str],
+    last_modified: Optional[str],
+    content_length: Optional[int],
+) -> None:
+    """Remember a remote digest; skipped when the response carried no validator to revalidate with."""
+    if not etag and not last_modified:
+        forget_remote(url)
+        return
+    with _lock:
+        conn = _connect()
+        if conn is None:
+            return
+        try:
+            conn.execute(
+                "INSERT OR REPLACE INTO url_digests (url, etag, last_modified, content_length, sha256, checked_at)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (url, etag, last_modified, content_length, digest, time.time()),
+            )
+        except sqlite3.Error as exc:
+            logger.warning("Hash cache write failed for %s: %s", url, exc)
+
+
+def forget_remote(url: str) -> None:
+    with _lock:
+        conn = _connect()
+        if conn is None:
+            return
+        try:
+            conn.execute("DELETE FROM url_digests WHERE url = ?", (url,))
+        except sqlite3.Error:
+            pass
+
+
+def close_hash_cache() -> None:
+    global _conn, _conn_path
+    with _lock:
+        if _conn is not None:
+            _conn.close()
+        _conn, _conn_path = None, None
+
+
+__all__ = [
+    "RemoteEntry",
+    "cache_path",
+    "lookup_file",
+    "store_file",
+    "lookup_remote",
+    "store_remote",
+    "forget_remote",
+    "close_hash_cache",
+]
@@ -0,0 +1,267 @@
+"""Background artifact hashing.
+
+Publishing leaves ``artifact_sha256`` NULL (or the caller's value) and records a
+``HashJob``; pending state lives only on the job. After the publish commits, the job is
+handed to a pool of ``HASH_WORKERS`` threads (default 4), which claim it atomically.
+Remote artifacts are streamed through one shared ``httpx.Client``, whose connection pool
+is capped at the worker count. With ``ARTIFACT_MERKLE=1`` the same download also yields a
+chunked Merkle root (app/merkle.py). A finished job writes the digest onto the release,
+precomputes its evidence and emits an ``artifact_hashed`` webhook event.
+
+``ARTIFACT_HASH_MODE=sync`` keeps the old behaviour of hashing inside the request.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from typing import Any, Dict, Optional
+
+import httpx
+from sqlalchemy import or_, select, update
+from sqlalchemy.orm import Session
+
+from . import models
+from .agent.digests import find_release_by_digest
+from .db import now_utc, try_get_session
+from .evidence import compute_artifact_sha256
+from .evidence_cache import schedule_evidence_precompute
+from .hooks.dispatcher import enqueue_event
+from .merkle import apply_artifact_merkle, hash_artifact_with_merkle, merkle_enabled
+from .utils.env import env_int
+
+
+logger = logging.getLogger("routeforge.hashing")
+
+# Written into releases.artifact_sha256 by earlier versions; treated like NULL.
+_LEGACY_PENDING = "pending"
+
+_pool: Optional[ThreadPoolExecutor] = None
+_client: Optional[httpx.Client] = None
+_lock = threading.Lock()
+
+
+def hash_mode() -> str:
+    """``ARTIFACT_HASH_MODE``: ``async`` (default) or ``sync``."""
+    mode = (os.getenv("ARTIFACT_HASH_MODE") or "async").strip().lower()
+    return mode if mode in {"async", "sync"} else "async"
+
+
+def _workers() -> int:
+    return max(env_int("HASH_WORKERS", 4), 1)
+
+
+def _get_pool() -> ThreadPoolExecutor:
+    global _pool
+    with _lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=_workers(), thread_name_prefix="artifact-hash")
+        return _pool
+
+
+def _get_client() -> httpx.Client:
+    global _client
+    with _lock:
+        if _client is None:
+            workers = _workers()
+            _client = httpx.Client(
+                follow_redirects=True,
+                limits=httpx.Limits(max_connections=workers, max_keepalive_connections=workers),
+            )
+        return _client
+
+
+def create_hash_job(db: Session, release: models.Release) -> models.HashJob:
+    """Add a hash job for ``release`` to the session (the caller commits)."""
+    job = models.HashJob(
+        id=uuid.uuid4().hex,
+        user_id=int(release.user_id),
+        release_id=int(release.id),
+        artifact_url=release.artifact_url,
+        status="queued",
+    )
+    db.add(job)
+    return job
+
+
+def submit_hash_job(job_id: str) -> None:
+    """Queue a committed job on the hashing pool."""
+    _get_pool().submit(run_hash_job, job_id)
+
+
+def run_hash_job(job_id: str, db: Optional[Session] = None) -> Optional[str]:
+    """Worker entry point: hash the artifact and record the outcome. Returns the digest."""
+    owns_session = db is None
+    if db is None:
+        db = try_get_session()
+        if db is None:
+            logger.warning("Hash job %s skipped: database unavailable", job_id)
+            return None
+
+    try:
+        # Claim atomically: several workers may resubmit the same job after a restart.
+        claimed = db.execute(
+            update(models.HashJob)
+            .where(models.HashJob.id == job_id, _claimable())
+            .values(status="running", started_at=now_utc())
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        db.commit()
+        if claimed != 1:
+            logger.debug("Hash job %s already claimed or finished", job_id)
+            return None
+        job = db.get(models.HashJob, job_id)
+        if job is None:
+            return None
+        db.refresh(job)
+
+        timeout = float(env_int("HASH_TIMEOUT_SEC", 300))
+        tree = None
+        if merkle_enabled():
+            # One download feeds both digests, over the same pooled client.
+            digest, tree = hash_artifact_with_merkle(job.artifact_url, timeout=timeout, client=_get_client())
+        else:
+            digest = compute_artifact_sha256(job.artifact_url, timeout=timeout, client=_get_client())
+        release = db.get(models.Release, job.release_id)
+        job.finished_at = now_utc()
+        if digest is None:
+            job.status = "error"
+            job.error = "artifact_unreachable"
+            _clear_legacy_pending(release)
+            db.commit()
+            _notify(job, release, None)
+            schedule_evidence_precompute(int(job.release_id))
+            return None
+
+        job.status = "done"
+        job.artifact_sha256 = digest
+        duplicate = None
+        if release is not None:
+            duplicate = find_release_by_digest(db, int(release.project_id), digest)
+            # A digest the caller supplied at publish time is kept.
+            if release.artifact_sha256 in (None, _LEGACY_PENDING):
+                release.artifact_sha256 = digest
+            apply_artifact_merkle(release, tree)
+        db.commit()
+        _notify(job, release, duplicate if duplicate is not None and duplicate.id != job.release_id else None)
+        schedule_evidence_precompute(int(job.release_id))
+        logger.info("Hash job %s finished release=%s", job_id, job.release_id)
+        return digest
+    except Exception as exc:
+        logger.exception("Hash job %s failed: %s", job_id, exc)
+        db.rollback()
+        job = db.get(models.HashJob, job_id)
+        if job is not None:
+            job.status = "error"
+            job.error = str(exc)[:255]
+            job.finished_at = now_utc()
+            _clear_legacy_pending(db.get(models.Release, job.release_id))
+            db.commit()
+        return None
+    finally:
+        if owns_session:
+            db.close()
+
+
+def _clear_legacy_pending(release: Optional[models.Release]) -> None:
+    if release is not None and release.artifact_sha256 == _LEGACY_PENDING:
+        release.artifact_sha256 = None
+
+
+def hash_job_pending(db: Session, release_id: int) -> bool:
+    """True while the release has a queued or running hash job."""
+    return (
+        db.scalar(
+            select(models.HashJob.id)
+            .where(models.HashJob.release_id == int(release_id), models.HashJob.status.in_(("queued", "running")))
+            .limit(1)
+        )
+        is not None
+    )
+
+
+def _notify(job: models.HashJob, release: Optional[models.Release], duplicate: Optional[models.Release]) -> None:
+    payload: Dict[str, Any] = {
+        "job_id": job.id,
+        "release_id": int(job.release_id),
+        "project_id": int(release.project_id) if release is not None else None,
+        "status": job.status,
+        "artifact_sha256": job.artifact_sha256,
+    }
+    if duplicate is not None:
+        # The publish did not wait for the digest, so report the match after the fact.
+        payload["duplicate_of"] = int(duplicate.id)
+    try:
+        enqueue_event(int(job.user_id), "artifact_hashed", payload)
+    except Exception:
+        pass
+
+
+def _stale_after_seconds() -> int:
+    """``HASH_JOB_STALE_SEC``: a running job older than this is presumed orphaned."""
+    return max(env_int("HASH_JOB_STALE_SEC", max(env_int("HASH_TIMEOUT_SEC", 300) * 3, 900)), 60)
+
+
+def _claimable():
+    stale_before = now_utc() - timedelta(seconds=_stale_after_seconds())
+    return or_(
+        models.HashJob.status == "queued",
+        (models.HashJob.status == "running") & (models.HashJob.started_at < stale_before),
+    )
+
+
+def requeue_pending_jobs(db: Session, *, limit: int = 500) -> int:
+    """Resubmit queued jobs, and running ones that went stale, at startup.
+
+    Running jobs may belong to a live peer, so they are only resubmitted once older than
+    ``HASH_JOB_STALE_SEC``; the atomic claim in ``run_hash_job`` stops duplicates either way.
+    """
+    ids = db.scalars(
+        select(models.HashJob.id)
+        .where(_claimable())
+        .order_by(models.HashJob.created_at.asc())
+        .limit(limit)
+    ).all()
+    for job_id in ids:
+        submit_hash_job(job_id)
+    return len(ids)
+
+
+def shutdown_hash_pipeline() -> None:
+    global _pool, _client
+    with _lock:
+        pool, client = _pool, _client
+        _pool, _client = None, None
+    if pool is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
+    if client is not None:
+        client.close()
+
+
+def serialize_hash_job(job: models.HashJob) -> Dict[str, Any]:
+    return {
+        "id": job.id,
+        "release_id": job.release_id,
+        "status": job.status,
+        "artifact_sha256": job.artifact_sha256,
+        "error": job.error,
+        "created_at": job.created_at.isoformat() if job.created_at else None,
+        "started_at": job.started_at.isoformat() if job.started_at else None,
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None,
+    }
+
+
+__all__ = [
+    "hash_mode",
+    "create_hash_job",
+    "hash_job_pending",
+    "submit_hash_job",
+    "run_hash_job",
+    "requeue_pending_jobs",
+    "shutdown_hash_pipeline",
+    "serialize_hash_job",
+]
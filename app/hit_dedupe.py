@@ -0,0 +1,212 @@
+"""In-memory click de-duplication window for the redirect path.
+
+Identical ``(route, ip, user agent)`` hits inside ``HIT_DEDUPE_WINDOW_SEC`` seconds are
+folded into the first stored row: instead of inserting, the redirect bumps a pending
+counter that is flushed into ``route_hits.dup_count`` in batches. Clicks are therefore
+``COUNT(*) + SUM(dup_count)``. Each flush also adds to the route's ``dup_hits`` counter,
+which the evidence cache uses as its change marker. State is per process. Redirects flush once
+``HIT_DEDUPE_FLUSH_SIZE`` counts are pending, and a background timer flushes every
+``HIT_DEDUPE_FLUSH_SEC`` seconds, so at most that much is lost if the process dies.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import logging
+import threading
+import time
+from typing import Callable, Dict, Optional, Tuple
+
+from sqlalchemy import bindparam, select, update
+from sqlalchemy.orm import Session
+
+from . import models
+from .db import try_get_session
+from .utils.env import env_float
+
+
+logger = logging.getLogger("routeforge.hit_dedupe")
+
+
+def dedupe_window_seconds() -> float:
+    """Window length from ``HIT_DEDUPE_WINDOW_SEC``; 0 (default) disables de-duplication."""
+    return max(env_float("HIT_DEDUPE_WINDOW_SEC", 0.0), 0.0)
+
+
+def hit_key(route_id: int, ip: Optional[bytes], ua: Optional[str]) -> bytes:
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(str(int(route_id)).encode("ascii"))
+    digest.update(b"\x00")
+    digest.update(ip or b"")
+    digest.update(b"\x00")
+    digest.update((ua or "").encode("utf-8", "replace"))
+    return digest.digest()
+
+
+class HitDeduper:
+    """Time-bucketed set of recent hit keys plus pending duplicate counts.
+
+    Keys live in buckets of ``window`` seconds; only the current and previous bucket are
+    kept, so memory is bounded by two windows of distinct visitors.
+    """
+
+    def __init__(self, window: float, *, clock: Callable[[], float] = time.monotonic) -> None:
+        self.window = float(window)
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._buckets: Dict[int, Dict[bytes, Tuple[int, float]]] = {}
+        self._pending: Dict[int, int] = {}
+        self._last_flush = clock()
+
+    def _bucket(self, now: float) -> int:
+        return int(now // self.window)
+
+    def check(self, key: bytes) -> Optional[int]:
+        """Return the hit id this key duplicates (recording the duplicate), or None."""
+        if self.window <= 0:
+            return None
+        now = self._clock()
+        current = self._bucket(now)
+        with self._lock:
+            for index in (current, current - 1):
+                entry = self._buckets.get(index, {}).get(key)
+                if entry is not None and now - entry[1] < self.window:
+                    hit_id = entry[0]
+                    self._pending[hit_id] = self._pending.get(hit_id, 0) + 1
+                    return hit_id
+        return None
+
+    def remember(self, key: bytes, hit_id: int) -> None:
+        """Record a freshly stored hit as the target for later duplicates."""
+        if self.window <= 0:
+            return
+        now = self._clock()
+        current = self._bucket(now)
+        with self._lock:
+            for index in [i for i in self._buckets if i < current - 1]:
+                del self._buckets[index]
+            self._buckets.setdefault(current, {})[key] = (int(hit_id), now)
+
+    def pending_total(self) -> int:
+        with self._lock:
+            return sum(self._pending.values())
+
+    def should_flush(self) -> bool:
+        max_pending = int(env_float("HIT_DEDUPE_FLUSH_SIZE", 100))
+        max_age = env_float("HIT_DEDUPE_FLUSH_SEC", 5.0)
+        with self._lock:
+            if not self._pending:
+                return False
+            return sum(self._pending.values()) >= max_pending or self._clock() - self._last_flush >= max_age
+
+    def flush(self, db: Session) -> int:
+        """Apply pending duplicate counts with one executemany UPDATE; returns rows updated."""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._last_flush = self._clock()
+        if not pending:
+            return 0
+        table = models.RouteHit.__table__
+        routes = models.Route.__table__
+        stmt = (
+            update(table)
+            .where(table.c.id == bindparam("hit_id"))
+            .values(dup_count=table.c.dup_count + bindparam("extra"))
+        )
+        route_stmt = (
+            update(routes)
+            .where(routes.c.id == select(table.c.route_id).where(table.c.id == bindparam("hit_id")).scalar_subquery())
+            .values(dup_hits=routes.c.dup_hits + bindparam("extra"))
+        )
+        params = [{"hit_id": hit_id, "extra": extra} for hit_id, extra in pending.items()]
+        try:
+            db.execute(stmt, params)
+            db.execute(route_stmt, params)
+            db.commit()
+        except Exception:
+            db.rollback()
+            # Put the counts back so the next flush retries them.
+            with self._lock:
+                for hit_id, extra in pending.items():
+                    self._pending[hit_id] = self._pending.get(hit_id, 0) + extra
+            raise
+        return len(pending)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._buckets.clear()
+            self._pending.clear()
+
+
+_deduper: Optional[HitDeduper] = None
+_deduper_lock = threading.Lock()
+
+
+def get_deduper() -> HitDeduper:
+    """Process-wide deduper; rebuilt if ``HIT_DEDUPE_WINDOW_SEC`` changes."""
+    global _deduper
+    window = dedupe_window_seconds()
+    with _deduper_lock:
+        if _deduper is None or _deduper.window != window:
+            _deduper = HitDeduper(window)
+        return _deduper
+
+
+def flush_pending_hits(db: Optional[Session] = None) -> int:
+    """Flush pending duplicate counts if any; opens (and closes) a session when none is given."""
+    deduper = get_deduper()
+    if not deduper.pending_total():
+        return 0
+    session = db if db is not None else try_get_session()
+    if session is None:
+        return 0
+    try:
+        return deduper.flush(session)
+    finally:
+        if db is None:
+            session.close()
+
+
+_timer_stop: Optional[threading.Event] = None
+
+
+def _flush_loop(stop: threading.Event, interval: float) -> None:
+    while not stop.wait(interval):
+        try:
+            if get_deduper().should_flush():
+                flush_pending_hits()
+        except Exception as exc:
+            logger.warning("Failed to flush duplicate hit counts: %s", exc)
+
+
+def start_flush_timer() -> None:
+    """Flush on ``HIT_DEDUPE_FLUSH_SEC`` even when no redirects arrive (call at startup)."""
+    global _timer_stop
+    if dedupe_window_seconds() <= 0:
+        return
+    with _deduper_lock:
+        if _timer_stop is not None:
+            return
+        _timer_stop = threading.Event()
+        stop = _timer_stop
+    interval = max(env_float("HIT_DEDUPE_FLUSH_SEC", 5.0), 0.5)
+    threading.Thread(target=_flush_loop, args=(stop, interval), name="hit-dedupe-flush", daemon=True).start()
+
+
+def stop_flush_timer() -> None:
+    global _timer_stop
+    with _deduper_lock:
+        stop, _timer_stop = _timer_stop, None
+    if stop is not None:
+        stop.set()
+
+
+__all__ = [
+    "HitDeduper",
+    "dedupe_window_seconds",
+    "hit_key",
+    "get_deduper",
+    "flush_pending_hits",
+    "start_flush_timer",
+    "stop_flush_timer",
+]
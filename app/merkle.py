@@ -0,0 +1,299 @@
+"""Chunked Merkle digest for large artifacts.
+
+The artifact is split into fixed ``MERKLE_CHUNK_SIZE`` chunks (default 4 MiB). Each chunk is
+hashed on a thread pool of ``MERKLE_WORKERS`` threads; hashlib releases the GIL, so this
+scales with cores. Local files are read through ``mmap``, and remote ones through concurrent
+HTTP range requests. Background hashing instead builds the leaves from the same download
+that computes ``artifact_sha256`` (``hash_artifact_with_merkle``), so a remote artifact is
+fetched once. Leaves and nodes are domain-separated as in RFC 6962:
+
+    leaf = sha256(0x00 || chunk)
+    node = sha256(0x01 || left || right)
+
+An odd node at the end of a level is promoted unchanged. The root and the packed leaves are
+stored on the release, so a single chunk can later be re-verified against the root without
+re-reading the rest of the artifact. Set ``ARTIFACT_MERKLE=1`` to compute it alongside
+``artifact_sha256``.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import logging
+import mmap
+import os
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+from urllib.parse import urlparse
+
+import httpx
+
+from . import evidence, models
+from .utils.env import env_int
+
+
+logger = logging.getLogger("routeforge.merkle")
+
+ALGORITHM = "sha256-merkle-rfc6962"
+_LEAF = b"\x00"
+_NODE = b"\x01"
+_DIGEST_SIZE = 32
+
+
+@dataclass
+class MerkleTree:
+    root: str
+    chunk_size: int
+    size: int
+    leaves: List[bytes]
+
+    def to_dict(self) -> Dict[str, object]:
+        return {
+            "algorithm": ALGORITHM,
+            "root": self.root,
+            "chunk_size": self.chunk_size,
+            "size": self.size,
+            "leaves": [leaf.hex() for leaf in self.leaves],
+        }
+
+
+def merkle_enabled() -> bool:
+    return (os.getenv("ARTIFACT_MERKLE") or "0").strip().lower() in {"1", "true", "yes", "on"}
+
+
+def chunk_size_default() -> int:
+    return max(env_int("MERKLE_CHUNK_SIZE", 4 * 1024 * 1024), 64 * 1024)
+
+
+def _workers(workers: Optional[int]) -> int:
+    return max(int(workers or env_int("MERKLE_WORKERS", os.cpu_count() or 4)), 1)
+
+
+def _leaf_digest(chunk) -> bytes:
+    digest = hashlib.sha256(_LEAF)
+    digest.update(chunk)
+    return digest.digest()
+
+
+def _node_digest(left: bytes, right: bytes) -> bytes:
+    return hashlib.sha256(_NODE + left + right).digest()
+
+
+def merkle_root(leaves: Sequence[bytes]) -> bytes:
+    if not leaves:
+        return _leaf_digest(b"")
+    level = list(leaves)
+    while len(level) > 1:
+        paired = [_node_digest(level[i], level[i + 1]) for i in range(0, len(level) - 1, 2)]
+        if len(level) % 2:
+            paired.append(level[-1])
+        level = paired
+    return level[0]
+
+
+def merkle_proof(leaves: Sequence[bytes], index: int) -> List[Tuple[str, bytes]]:
+    """Sibling path for leaf ``index`` as ``("L"|"R", digest)`` pairs, bottom-up."""
+    if not 0 <= index < len(leaves):
+        raise IndexError(index)
+    proof: List[Tuple[str, bytes]] = []
+    level = list(leaves)
+    while len(level) > 1:
+        sibling = index ^ 1
+        if sibling < len(level):
+            proof.append(("L" if sibling < index else "R", level[sibling]))
+        paired = [_node_digest(level[i], level[i + 1]) for i in range(0, len(level) - 1, 2)]
+        if len(level) % 2:
+            paired.append(level[-1])
+        level = paired
+        index //= 2
+    return proof
+
+
+def verify_chunk(chunk, proof: Sequence[Tuple[str, bytes]], root_hex: str) -> bool:
+    """Check one chunk against the stored root using its ``merkle_proof``."""
+    node = _leaf_digest(chunk)
+    for side, sibling in proof:
+        node = _node_digest(sibling, node) if side == "L" else _node_digest(node, sibling)
+    return node.hex() == root_hex
+
+
+def pack_leaves(leaves: Sequence[bytes]) -> bytes:
+    return b"".join(leaves)
+
+
+def unpack_leaves(raw: Optional[bytes]) -> List[bytes]:
+    if not raw:
+        return []
+    return [bytes(raw[i : i + _DIGEST_SIZE]) for i in range(0, len(raw), _DIGEST_SIZE)]
+
+
+def _tree(leaves: List[bytes], chunk_size: int, size: int) -> MerkleTree:
+    return MerkleTree(root=merkle_root(leaves).hex(), chunk_size=chunk_size, size=size, leaves=leaves)
+
+
+def merkle_file(path: Path, *, chunk_size: Optional[int] = None, workers: Optional[int] = None) -> Optional[MerkleTree]:
+    chunk_size = chunk_size or chunk_size_default()
+    try:
+        size = path.stat().st_size
+        if size == 0:
+            return _tree([_leaf_digest(b"")], chunk_size, 0)
+        with path.open("rb") as handle, mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            view = memoryview(mapped)
+            try:
+                offsets = range(0, size, chunk_size)
+                with ThreadPoolExecutor(max_workers=min(_workers(workers), len(offsets))) as pool:
+                    leaves = list(pool.map(lambda start: _leaf_digest(view[start : start + chunk_size]), offsets))
+            finally:
+                view.release()
+    except (OSError, ValueError) as exc:
+        logger.warning("Failed to build Merkle tree for %s: %s", path, exc)
+        return None
+    return _tree(leaves, chunk_size, size)
+
+
+class MerkleBuilder:
+    """Leaves for a byte stream fed in order, hashed as each chunk fills."""
+
+    def __init__(self, chunk_size: Optional[int] = None) -> None:
+        self.chunk_size = chunk_size or chunk_size_default()
+        self.size = 0
+        self._leaves: List[bytes] = []
+        self._buffer = bytearray()
+
+    def update(self, data: bytes) -> None:
+        self.size += len(data)
+        self._buffer += data
+        while len(self._buffer) >= self.chunk_size:
+            self._leaves.append(_leaf_digest(memoryview(self._buffer)[: self.chunk_size]))
+            del self._buffer[: self.chunk_size]
+
+    def finish(self) -> MerkleTree:
+        leaves = list(self._leaves)
+        if self._buffer or not leaves:
+            leaves.append(_leaf_digest(bytes(self._buffer)))
+        return _tree(leaves, self.chunk_size, self.size)
+
+
+def merkle_remote(
+    url: str,
+    *,
+    chunk_size: Optional[int] = None,
+    workers: Optional[int] = None,
+    timeout: float = 30.0,
+    client: Optional[httpx.Client] = None,
+) -> Optional[MerkleTree]:
+    """Hash a remote artifact with concurrent range requests; None if ranges are unsupported."""
+    chunk_size = chunk_size or chunk_size_default()
+    own_client = client is None
+    http = client or httpx.Client(follow_redirects=True)
+    request_timeout = httpx.Timeout(timeout, connect=10.0, read=timeout)
+    try:
+        head = http.head(url, timeout=request_timeout)
+        head.raise_for_status()
+        length = head.headers.get("content-length")
+        if head.headers.get("accept-ranges", "").lower() != "bytes" or not (length and length.isdigit()):
+            return None
+        size = int(length)
+        if size == 0:
+            return _tree([_leaf_digest(b"")], chunk_size, 0)
+
+        def fetch(start: int) -> bytes:
+            end = min(start + chunk_size, size) - 1
+            response = http.get(url, headers={"Range": f"bytes={start}-{end}"}, timeout=request_timeout)
+            if response.status_code != 206 or len(response.content) != end - start + 1:
+                raise ValueError(f"range {start}-{end} not honoured")
+            return _leaf_digest(response.content)
+
+        offsets = range(0, size, chunk_size)
+        with ThreadPoolExecutor(max_workers=min(_workers(workers), len(offsets))) as pool:
+            leaves = list(pool.map(fetch, offsets))
+    except (httpx.HTTPError, ValueError) as exc:
+        logger.warning("Failed to build Merkle tree for %s: %s", url, exc)
+        return None
+    finally:
+        if own_client:
+            http.close()
+    return _tree(leaves, chunk_size, size)
+
+
+def compute_artifact_merkle(
+    artifact_url: str,
+    *,
+    chunk_size: Optional[int] = None,
+    workers: Optional[int] = None,
+    timeout: float = 30.0,
+    client: Optional[httpx.Client] = None,
+) -> Optional[MerkleTree]:
+    """Merkle tree for the artifact, resolved the same way as ``compute_artifact_sha256``."""
+    if not artifact_url:
+        return None
+    for candidate in evidence._iter_candidate_paths(artifact_url):
+        if candidate.is_file():
+            return merkle_file(candidate, chunk_size=chunk_size, workers=workers)
+    if urlparse(artifact_url).scheme in {"http", "https"}:
+        return merkle_remote(artifact_url, chunk_size=chunk_size, workers=workers, timeout=timeout, client=client)
+    return None
+
+
+def hash_artifact_with_merkle(
+    artifact_url: str,
+    *,
+    chunk_size: Optional[int] = None,
+    timeout: float = 30.0,
+    client: Optional[httpx.Client] = None,
+) -> Tuple[Optional[str], Optional[MerkleTree]]:
+    """``(artifact_sha256, tree)`` with a single download for remote artifacts."""
+    if not artifact_url:
+        return None, None
+    for candidate in evidence._iter_candidate_paths(artifact_url):
+        if candidate.is_file():
+            digest = evidence.compute_artifact_sha256(artifact_url, timeout=timeout)
+            return digest, merkle_file(candidate, chunk_size=chunk_size) if digest else None
+    if urlparse(artifact_url).scheme in {"http", "https"}:
+        builder = MerkleBuilder(chunk_size)
+        digest = evidence._hash_remote(artifact_url, timeout=timeout, client=client, sink=builder.update)
+        return digest, builder.finish() if digest else None
+    return evidence.compute_artifact_sha256(artifact_url, timeout=timeout), None
+
+
+def apply_artifact_merkle(release: models.Release, tree: Optional[MerkleTree]) -> None:
+    if tree is None:
+        return
+    release.artifact_merkle_root = tree.root
+    release.artifact_merkle_chunk_size = tree.chunk_size
+    release.artifact_merkle_leaves = pack_leaves(tree.leaves)
+
+
+def release_merkle_payload(release: models.Release) -> Optional[Dict[str, object]]:
+    """``merkle.json`` contents for the evidence bundle, or None when no tree is stored."""
+    root = getattr(release, "artifact_merkle_root", None)
+    if not root:
+        return None
+    leaves = unpack_leaves(getattr(release, "artifact_merkle_leaves", None))
+    return {
+        "algorithm": ALGORITHM,
+        "root": root,
+        "chunk_size": release.artifact_merkle_chunk_size,
+        "leaves": [leaf.hex() for leaf in leaves],
+    }
+
+
+__all__ = [
+    "ALGORITHM",
+    "MerkleTree",
+    "MerkleBuilder",
+    "merkle_enabled",
+    "merkle_root",
+    "merkle_proof",
+    "verify_chunk",
+    "pack_leaves",
+    "unpack_leaves",
+    "merkle_file",
+    "merkle_remote",
+    "compute_artifact_merkle",
+    "hash_artifact_with_merkle",
+    "apply_artifact_merkle",
+    "release_merkle_payload",
+]
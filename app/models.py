@@ -1,4 +1,5 @@
 from sqlalchemy import (
+    BigInteger,
     Column,
     DateTime,
     ForeignKey,
@@ -10,6 +11,8 @@ from sqlalchemy import (
     Index,
     LargeBinary,
     JSON,
+    SmallInteger,
+    VARBINARY,
 )
 from sqlalchemy.orm import declarative_base, relationship
 
@@ -47,6 +50,9 @@ class Project(Base):
 
 class Release(Base):
     __tablename__ = "releases"
+    __table_args__ = (
+        Index("ix_releases_project_artifact_sha256", "project_id", "artifact_sha256"),
+    )
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
@@ -61,16 +67,37 @@ class Release(Base):
     # NFT tracking
     token_id = Column(Integer, nullable=True)
     metadata_ipfs_cid = Column(String(128), nullable=True)
-    # Optional embedding column. In TiDB/MySQL with VECTOR type available, the actual
-    # column is created via migration as VECTOR(768). We map it as LargeBinary here to
-    # avoid dialect/type issues when reading. The app writes/read via raw SQL when needed.
+    # Optional embedding in the binary codec format (app/embeddings/codec.py): a 4-byte
+    # header plus little-endian float32/float16. Older deployments created VECTOR(768);
+    # scripts/migrate.py converts those to LONGBLOB.
     embedding = Column(LargeBinary, nullable=True)
+    # Provider model_id that produced ``embedding``; NULL rows predate tracking (hash stub).
+    embedding_model = Column(String(128), nullable=True)
+    # 64 x uint32 MinHash signature of notes + artifact filename (app/similarity/minhash.py).
+    minhash = Column(VARBINARY(256), nullable=True)
+    # Optional chunked Merkle digest (app/merkle.py); leaves are packed 32-byte digests.
+    artifact_merkle_root = Column(String(64), nullable=True)
+    artifact_merkle_chunk_size = Column(Integer, nullable=True)
+    artifact_merkle_leaves = Column(LargeBinary, nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
 
     project = relationship("Project", back_populates="releases")
     user = relationship("User", back_populates="releases")
 
 
+class ReleaseLSHBand(Base):
+    """One LSH band bucket per (release, band); candidates share a (band, bucket) pair."""
+
+    __tablename__ = "release_lsh_bands"
+    __table_args__ = (
+        Index("ix_release_lsh_bands_release_id", "release_id"),
+    )
+
+    band = Column(SmallInteger, primary_key=True)
+    bucket = Column(BigInteger, primary_key=True, autoincrement=False)
+    release_id = Column(Integer, ForeignKey("releases.id", ondelete="CASCADE"), primary_key=True)
+
+
 class Route(Base):
     __tablename__ = "routes"
     __table_args__ = (
@@ -85,6 +112,9 @@ class Route(Base):
     target_url = Column(String(2048), nullable=False)
     release_id = Column(Integer, ForeignKey("releases.id", ondelete="SET NULL"), nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    # Duplicate clicks flushed into this route's hits (see app/hit_dedupe.py); a cheap change
+    # marker for the evidence cache watermark.
+    dup_hits = Column(BigInteger, nullable=False, default=0, server_default="0")
 
     project = relationship("Project", back_populates="routes")
     release = relationship("Release")
@@ -94,15 +124,58 @@ class Route(Base):
 
 class RouteHit(Base):
     __tablename__ = "route_hits"
+    __table_args__ = (
+        Index("ix_route_hits_route_ts", "route_id", "ts"),
+    )
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     route_id = Column(Integer, ForeignKey("routes.id", ondelete="CASCADE"), nullable=False, index=True)
     ts = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
-    ip = Column(String(64), nullable=True)
-    ua = Column(String(512), nullable=True)
-    ref = Column(String(2048), nullable=True)
+    # Packed address (4/16 bytes) or anonymized digest; see app.utils.ipaddr.
+    ip = Column(VARBINARY(16), nullable=True)
+    # Interned ids into user_agents / referrers. No FK constraints: route_hits may be
+    # range-partitioned, and partitioned InnoDB tables cannot carry foreign keys.
+    ua_id = Column(Integer, nullable=True)
+    ref_id = Column(Integer, nullable=True)
+    # Identical hits folded into this row by the dedupe window (see app.hit_dedupe).
+    dup_count = Column(Integer, nullable=False, default=0, server_default="0")
 
     route = relationship("Route", back_populates="hits")
+    user_agent = relationship("UserAgent", primaryjoin="foreign(RouteHit.ua_id) == UserAgent.id", viewonly=True)
+    referrer = relationship("Referrer", primaryjoin="foreign(RouteHit.ref_id) == Referrer.id", viewonly=True)
+
+
+class UserAgent(Base):
+    __tablename__ = "user_agents"
+    __table_args__ = (
+        UniqueConstraint("value_hash", name="uq_user_agents_value_hash"),
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    # sha256 hex of value; the unique lookup key (long strings cannot be indexed directly)
+    value_hash = Column(String(64), nullable=False)
+    value = Column(String(512), nullable=False)
+
+
+class Referrer(Base):
+    __tablename__ = "referrers"
+    __table_args__ = (
+        UniqueConstraint("value_hash", name="uq_referrers_value_hash"),
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    value_hash = Column(String(64), nullable=False)
+    value = Column(String(2048), nullable=False)
+
+
+class RouteHitHourly(Base):
+    """Hourly click aggregates kept after raw hits age out of the retention window."""
+
+    __tablename__ = "route_hits_hourly"
+
+    route_id = Column(Integer, ForeignKey("routes.id", ondelete="CASCADE"), primary_key=True)
+    bucket_ts = Column(DateTime(timezone=True), primary_key=True)
+    hits = Column(Integer, nullable=False, server_default="0")
 
 
 class ReleasesStaging(Base):
@@ -136,7 +209,7 @@ class APIKey(Base):
     )
 
     id = Column(Integer, primary_key=True, autoincrement=True)
-    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
     key_id = Column(String(64), nullable=False)
     # We store a randomly generated signing secret string here (named secret_hash per spec)
     secret_hash = Column(String(128), nullable=False)
@@ -155,7 +228,7 @@ class Webhook(Base):
     )
 
     id = Column(Integer, primary_key=True, autoincrement=True)
-    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
     url = Column(String(2048), nullable=False)
     secret = Column(String(128), nullable=False)
     event = Column(String(64), nullable=False)  # route_hit, release_published
@@ -167,3 +240,66 @@ class Webhook(Base):
     last_payload_preview = Column(String(255), nullable=True)
 
     user = relationship("User")
+
+
+class HashJob(Base):
+    """Background artifact digest for a release (see app.hashing)."""
+
+    __tablename__ = "hash_jobs"
+    __table_args__ = (
+        Index("ix_hash_jobs_release_id", "release_id"),
+        Index("ix_hash_jobs_user_id", "user_id"),
+    )
+
+    id = Column(String(32), primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    release_id = Column(Integer, ForeignKey("releases.id", ondelete="CASCADE"), nullable=False)
+    artifact_url = Column(String(2048), nullable=False)
+    status = Column(String(16), nullable=False, server_default="queued")  # queued | running | done | error
+    artifact_sha256 = Column(String(128), nullable=True)
+    error = Column(String(255), nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    started_at = Column(DateTime(timezone=True), nullable=True)
+    finished_at = Column(DateTime(timezone=True), nullable=True)
+
+
+class IpfsPin(Base):
+    """Upload state of a locally computed CID (see app.storage.pin_queue)."""
+
+    __tablename__ = "ipfs_pins"
+
+    cid = Column(String(128), primary_key=True)
+    filename = Column(String(255), nullable=False)
+    size = Column(BigInteger, nullable=False)
+    status = Column(String(16), nullable=False, server_default="queued")  # queued | pinned | error
+    attempts = Column(Integer, nullable=False, server_default="0")
+    # CID the provider reported, when it differs from the local computation.
+    provider_cid = Column(String(128), nullable=True)
+    error = Column(String(255), nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    pinned_at = Column(DateTime(timezone=True), nullable=True)
+    # When a failed pin becomes eligible for another upload round.
+    next_attempt_at = Column(DateTime(timezone=True), nullable=True)
+
+
+class ExportJob(Base):
+    __tablename__ = "export_jobs"
+    __table_args__ = (
+        Index("ix_export_jobs_user_id", "user_id"),
+    )
+
+    id = Column(String(32), primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    status = Column(String(16), nullable=False, server_default="queued")  # queued | running | done | error
+    format = Column(String(16), nullable=False, server_default="csv")
+    # Requested scope: {"project_id", "route_ids", "since", "until"}
+    params = Column(JSON, nullable=True)
+    # Produced partitions: [{"name", "route_id", "rows", "bytes", "storage", "key"}]
+    files = Column(JSON, nullable=True)
+    rows_exported = Column(Integer, nullable=False, server_default="0")
+    error = Column(String(255), nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    started_at = Column(DateTime(timezone=True), nullable=True)
+    finished_at = Column(DateTime(timezone=True), nullable=True)
+
+    user = relationship("User")
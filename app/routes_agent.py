@@ -1,25 +1,38 @@
-import json
 import logging
 import os
 import re
 import uuid
-from typing import Optional, List, Dict, Any
+from datetime import datetime, timezone
+from typing import Optional, List, Dict, Any, Tuple
 
 from fastapi import APIRouter, Depends, Request
 from fastapi.responses import JSONResponse
-from sqlalchemy import select, text
+from sqlalchemy import insert, select, text
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 
 from .db import get_db
 from . import models
-from .search import search_similar_releases
+from .search import scope_project_ids, search_similar_releases, search_similar_releases_batch
 from .errors import json_error
 from .middleware import get_request_user
 from .auth.magic import is_auth_enabled
 from .auth.accounts import ensure_demo_user
-from .agent import apply_artifact_hash
+from .agent import lookup_exact_duplicate
+from .agent.digests import artifact_digests, find_releases_by_digests
 from .hooks.dispatcher import enqueue_event
+from .evidence_cache import schedule_evidence_precompute
+from .hashing import create_hash_job, hash_mode, submit_hash_job
+from .similarity import index_release_embedding
+from .similarity.minhash import (
+    estimate_jaccard,
+    find_near_duplicates,
+    find_near_duplicates_batch,
+    index_release_minhash,
+    near_dup_threshold,
+    release_signature,
+)
+from .embeddings import embed_batch, embed_text, encode_embedding, get_provider
 
 logger = logging.getLogger("routeforge.agent")
 
@@ -54,22 +67,29 @@ def extract_version(artifact_url: str, notes: Optional[str]) -> str:
     return f"auto-{short}"
 
 
-def _log_audit(db: Session, entity_type: str, entity_id: int, action: str, meta: Optional[Dict[str, Any]] = None):
-    audit = models.Audit(entity_type=entity_type, entity_id=entity_id, action=action, meta=meta or {})
-    db.add(audit)
-    db.commit()
+class AuditBatch:
+    """Audit rows collected during a publish and written with one executemany insert."""
+
+    def __init__(self) -> None:
+        self.rows: List[Dict[str, Any]] = []
+
+    def add(self, entity_type: str, entity_id: int, action: str, meta: Optional[Dict[str, Any]] = None) -> None:
+        self.rows.append(
+            {"entity_type": entity_type, "entity_id": int(entity_id), "action": action, "meta": meta or {}}
+        )
+
+    def write(self, db: Session) -> None:
+        """Insert pending rows in the caller's transaction (the caller commits)."""
+        if self.rows:
+            db.execute(insert(models.Audit), self.rows)
+            self.rows = []
 
 
 def _compute_embedding_if_enabled(text_value: str) -> Optional[bytes]:
     if (os.getenv("EMBEDDING_ENABLED") or "0") != "1":
         return None
-    # Use same stub as search: 768 float values in [0,1]. Store as JSON bytes for simplicity.
-    # We store JSON array bytes so raw SQL vector ops may not work unless TiDB casts; acceptable for demo.
-    from .search import _hash_to_vector_768  # local import to avoid cycle exposure
-
-    vec = _hash_to_vector_768(text_value)
-    payload = json.dumps(vec).encode("utf-8")
-    return payload
+    # Same provider as search (EMBEDDING_PROVIDER), stored in the binary codec format.
+    return encode_embedding(embed_text(text_value))
 
 
 def _require_actor(request: Request, db: Session) -> Optional[Dict[str, Any]]:
@@ -83,24 +103,61 @@ def _require_actor(request: Request, db: Session) -> Optional[Dict[str, Any]]:
     return demo_user
 
 
-@router.post("/publish")
-def agent_publish(payload: Dict[str, Any], request: Request, db: Session = Depends(get_db)):
-    actor = _require_actor(request, db)
-    if is_auth_enabled() and actor is None:
-        return error("auth_required", status_code=401)
-
-    # Validate inputs
+def _parse_publish_item(payload: Any) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+    """Validated publish fields, or ``(None, error_code)``."""
+    if not isinstance(payload, dict):
+        return None, "invalid_item"
     try:
         project_id = int(payload.get("project_id"))
     except Exception:
-        return error("invalid_project_id", status_code=422)
+        return None, "invalid_project_id"
     artifact_url = payload.get("artifact_url")
     if not artifact_url or not isinstance(artifact_url, str):
-        return error("invalid_artifact_url", status_code=422)
+        return None, "invalid_artifact_url"
     notes = payload.get("notes")
     notes = notes if isinstance(notes, str) or notes is None else str(notes)
-    dry_run = bool(payload.get("dry_run") or False)
-    force = bool(payload.get("force") or False)
+    scope = payload.get("similarity_scope")
+    if scope is not None and scope not in ("project", "user"):
+        return None, "invalid_similarity_scope"
+    return {
+        "project_id": project_id,
+        "artifact_url": artifact_url,
+        "notes": notes,
+        "dry_run": bool(payload.get("dry_run") or False),
+        "force": bool(payload.get("force") or False),
+        "scope": scope,
+    }, None
+
+
+def _needs_review(similar: List[Dict[str, Any]], near_duplicates: List[Dict[str, Any]]) -> bool:
+    """Vector hits use cosine vs SIMILARITY_THRESHOLD; LSH hits use estimated Jaccard vs
+    NEAR_DUP_THRESHOLD. Text-search matches are informational only."""
+    threshold = 0.83
+    try:
+        threshold = float(os.getenv("SIMILARITY_THRESHOLD", "0.83"))
+    except Exception:
+        pass
+    return any(
+        item.get("method") == "vector" and item.get("score", 0.0) >= threshold for item in similar
+    ) or any(item["score"] >= near_dup_threshold() for item in near_duplicates)
+
+
+@router.post("/publish")
+def agent_publish(payload: Dict[str, Any], request: Request, db: Session = Depends(get_db)):
+    actor = _require_actor(request, db)
+    if is_auth_enabled() and actor is None:
+        return error("auth_required", status_code=401)
+
+    # Validate inputs
+    fields, code = _parse_publish_item(payload)
+    if fields is None:
+        return error(code or "invalid_item", status_code=422)
+    project_id = fields["project_id"]
+    artifact_url = fields["artifact_url"]
+    notes = fields["notes"]
+    dry_run = fields["dry_run"]
+    force = fields["force"]
+    scope = fields["scope"]
 
     project = db.get(models.Project, project_id)
     if project is None:
@@ -109,39 +166,73 @@ def agent_publish(payload: Dict[str, Any], request: Request, db: Session = Depen
     if actor is not None and project.user_id != int(actor.get("user_id")):
         return error("forbidden", status_code=403)
 
-    # 1) Ingest staging
+    audit = AuditBatch()
+
+    # 1) Ingest staging (flushed for its id; everything commits once at the end)
     staging = models.ReleasesStaging(artifact_url=artifact_url, notes=notes)
     db.add(staging)
-    db.commit()
-    db.refresh(staging)
-    _log_audit(db, "agent", staging.id, "ingest", {"artifact_url": artifact_url, "notes": notes})
+    db.flush()
+    audit.add("agent", staging.id, "ingest", {"artifact_url": artifact_url, "notes": notes})
+
+    # 2) Exact duplicate: same artifact bytes already released in this project. In the
+    # default async hash mode only cached digests that still revalidate are checked here.
+    background_hash = hash_mode() == "async"
+    digest_lookup = lookup_exact_duplicate(db, project_id, artifact_url, compute=not background_hash)
+    prior = digest_lookup.duplicate
+    if prior is not None and not force:
+        duplicate_of = {
+            "id": prior.id,
+            "version": prior.version,
+            "notes": prior.notes,
+            "artifact_sha256": prior.artifact_sha256,
+        }
+        audit.add("agent", staging.id, "duplicate", {"release_id": prior.id, "digest_cached": digest_lookup.cached})
+        audit.write(db)
+        db.commit()
+        return JSONResponse(
+            status_code=200,
+            content={
+                "decision": "review",
+                "duplicate_of": duplicate_of,
+                "similar_releases": [{**duplicate_of, "score": 1.0, "method": "sha256"}],
+                "message": "Artifact already published in this project; use force=true to publish",
+            },
+        )
 
-    # 2) Similarity search
+    # 3) Similarity search
     query_text = notes or artifact_url.rsplit("/", 1)[-1]
-    similar = search_similar_releases(db, query_text=query_text, top_k=3)
-    _log_audit(db, "agent", staging.id, "search", {"top": len(similar), "items": similar})
+    # Scoped to this project by default; similarity_scope=user widens to the owner's projects.
+    project_ids = scope_project_ids(db, project, scope)
+    similar = search_similar_releases(db, query_text=query_text, top_k=3, project_ids=project_ids)
+    try:
+        near_duplicates = find_near_duplicates(db, notes, artifact_url, top_k=3, project_ids=project_ids)
+    except Exception as exc:
+        logger.warning("Near-duplicate lookup failed: %s", exc)
+        near_duplicates = []
+    audit.add(
+        "agent",
+        staging.id,
+        "search",
+        {"top": len(similar), "items": similar, "near_duplicates": near_duplicates},
+    )
 
-    # 3) Decide
+    # 4) Decide
     decision = "proceed"
-    if not force and similar:
-        threshold = 0.83
-        try:
-            threshold = float(os.getenv("SIMILARITY_THRESHOLD", "0.83"))
-        except Exception:
-            pass
-        # Check if any item meets or exceeds threshold (vector semantics) or first item high textual score
-        high = any(item.get("score", 0.0) >= threshold for item in similar)
-        if high:
+    if not force and (similar or near_duplicates):
+        if _needs_review(similar, near_duplicates):
+            audit.write(db)
+            db.commit()
             return JSONResponse(
                 status_code=200,
                 content={
                     "decision": "review",
                     "similar_releases": similar,
+                    "near_duplicates": near_duplicates,
                     "message": "Similar release(s) found; use force=true to publish",
                 },
             )
 
-    # 4) Publish unless dry_run
+    # 5) Publish unless dry_run
     version = extract_version(artifact_url, notes)
     release_dict = {
         "project_id": project_id,
@@ -151,39 +242,47 @@ def agent_publish(payload: Dict[str, Any], request: Request, db: Session = Depen
     }
     release_preview = {
         **release_dict,
-        "artifact_sha256": None,
+        "artifact_sha256": digest_lookup.digest,
     }
     route_dict: Optional[Dict[str, Any]] = None
+    hash_job_dict: Optional[Dict[str, Any]] = None
+    staging_id = staging.id
+    embed: Optional[bytes] = None
 
     if dry_run:
         logger.info("agent.publish dry_run project_id=%s version=%s", project_id, version)
         decision = "dry_run"
+        audit.write(db)
+        db.commit()
     else:
-        # Create release
-        release = models.Release(user_id=int(actor["user_id"]) if actor else project.user_id, **release_dict)
-        apply_artifact_hash(release, artifact_url)
+        owner_id = int(actor["user_id"]) if actor else project.user_id
+        # Create release; created_at is set here so the response needs no refresh query.
+        release = models.Release(user_id=owner_id, created_at=datetime.now(timezone.utc), **release_dict)
+        # Hashed (or served from the revalidated hash cache) by the duplicate check above.
+        release.artifact_sha256 = digest_lookup.digest
+        hash_job: Optional[models.HashJob] = None
         embed = _compute_embedding_if_enabled(notes or artifact_url)
         if embed is not None:
             release.embedding = embed
+            release.embedding_model = get_provider().model_id
         db.add(release)
-        db.commit()
-        db.refresh(release)
-        _log_audit(db, "release", release.id, "publish", {"project_id": project_id, "version": version})
-        try:
-            enqueue_event(int(release.user_id), "release_published", {"release_id": int(release.id), "project_id": int(project_id)})
-        except Exception:
-            pass
+        db.flush()
+        index_release_minhash(db, release, replace=False)
+        if release.artifact_sha256 is None and background_hash:
+            hash_job = create_hash_job(db, release)
+        audit.add("release", release.id, "publish", {"project_id": project_id, "version": version})
 
         # Mint route
         base_slug = slugify(f"{project.name}-{version}")
         slug = base_slug or uuid.uuid4().hex[:8]
         # Ensure uniqueness; if conflict, return 409 to signal retry
-        existing = db.execute(select(models.Route).where(models.Route.slug == slug)).scalar_one_or_none()
+        existing = db.execute(select(models.Route.id).where(models.Route.slug == slug)).first()
         if existing is not None:
             # Attempt a randomized suffix once; if still conflict, 409
             alt = slugify(f"{base_slug}-{uuid.uuid4().hex[:4]}")
-            existing2 = db.execute(select(models.Route).where(models.Route.slug == alt)).scalar_one_or_none()
+            existing2 = db.execute(select(models.Route.id).where(models.Route.slug == alt)).first()
             if existing2 is not None:
+                db.rollback()
                 return error("slug_conflict", status_code=409)
             slug = alt
 
@@ -192,40 +291,362 @@ def agent_publish(payload: Dict[str, Any], request: Request, db: Session = Depen
             slug=slug,
             target_url=artifact_url,
             release_id=release.id,
-            user_id=int(actor["user_id"]) if actor else project.user_id,
+            user_id=owner_id,
         )
         db.add(route)
         try:
-            db.commit()
+            db.flush()
         except IntegrityError:
+            # Nothing from this publish is kept, so a retry starts clean.
             db.rollback()
             return error("slug_conflict", status_code=409)
-        db.refresh(route)
-        _log_audit(db, "route", route.id, "mint_route", {"slug": slug, "target_url": artifact_url})
+        audit.add("route", route.id, "mint_route", {"slug": slug, "target_url": artifact_url})
+        audit.write(db)
 
+        # Read everything the response needs before commit expires the instances.
         route_dict = {
             "id": route.id,
             "slug": route.slug,
             "target_url": route.target_url,
         }
-        release_dict["id"] = release.id
+        release_id = int(release.id)
+        release_dict["id"] = release_id
         release_dict["created_at"] = str(release.created_at)
         release_dict["artifact_sha256"] = release.artifact_sha256
         release_preview["artifact_sha256"] = release.artifact_sha256
+        hash_job_id = hash_job.id if hash_job is not None else None
+        db.commit()
+
+        # Side effects only once the release is durable.
+        if hash_job_id is not None:
+            submit_hash_job(hash_job_id)
+            hash_job_dict = {"id": hash_job_id, "status": "queued"}
+        else:
+            # With a hash job pending, the job precomputes evidence once the digest lands.
+            schedule_evidence_precompute(release_id)
+        if embed is not None:
+            try:
+                index_release_embedding(release_id, embed, project_id)
+            except Exception as exc:
+                logger.warning("Failed to index release %s for similarity: %s", release_id, exc)
+        try:
+            enqueue_event(owner_id, "release_published", {"release_id": release_id, "project_id": int(project_id)})
+        except Exception:
+            pass
 
         decision = "published"
 
-    # 5) Response
+    # 6) Response
     return JSONResponse(
         status_code=200,
         content={
             "decision": decision,
             "release": release_dict if not dry_run else release_preview,
             "route": route_dict,
+            "hash_job": hash_job_dict,
             "similar_releases": similar,
+            "near_duplicates": near_duplicates,
             "audit_sample": [
-                {"action": "ingest", "staging_id": staging.id},
+                {"action": "ingest", "staging_id": staging_id},
                 {"action": "search", "top": len(similar)},
             ],
         },
     )
+
+
+def _batch_max_items() -> int:
+    try:
+        return max(int(os.getenv("AGENT_BATCH_MAX_ITEMS", "100") or "100"), 1)
+    except ValueError:
+        return 100
+
+
+@router.post("/publish/batch")
+def agent_publish_batch(payload: Dict[str, Any], request: Request, db: Session = Depends(get_db)):
+    """Publish many artifacts in one transaction and return a decision per item.
+
+    Each stage runs once for the whole batch: artifacts are hashed concurrently (or queued
+    for background hashing, see ``app.hashing``), exact
+    duplicates come from one digest query, similarity uses one embedding call and one index
+    search per scope, and staging/release/route/audit rows are flushed in bulk with a
+    single commit. Items are judged like ``POST /agent/publish`` (including against items
+    accepted earlier in the batch); an item that fails validation, or loses its slug to a
+    concurrent publish, gets ``decision=error`` without affecting the others.
+    """
+    actor = _require_actor(request, db)
+    if is_auth_enabled() and actor is None:
+        return error("auth_required", status_code=401)
+
+    raw_items = payload.get("items")
+    if not isinstance(raw_items, list) or not raw_items:
+        return error("invalid_items", status_code=422)
+    if len(raw_items) > _batch_max_items():
+        return error("batch_too_large", status_code=413)
+
+    results: List[Dict[str, Any]] = [{"index": i} for i in range(len(raw_items))]
+    parsed: List[Tuple[int, Dict[str, Any]]] = []
+    for i, raw in enumerate(raw_items):
+        fields, code = _parse_publish_item(raw)
+        if fields is None:
+            results[i].update({"decision": "error", "error": code})
+        else:
+            parsed.append((i, fields))
+
+    projects = {
+        int(p.id): p
+        for p in db.scalars(
+            select(models.Project).where(models.Project.id.in_({f["project_id"] for _, f in parsed}))
+        ).all()
+    } if parsed else {}
+    items: List[Tuple[int, Dict[str, Any], models.Project]] = []
+    for i, fields in parsed:
+        project = projects.get(fields["project_id"])
+        if project is None:
+            results[i].update({"decision": "error", "error": "project_not_found"})
+        elif actor is not None and project.user_id != int(actor.get("user_id")):
+            results[i].update({"decision": "error", "error": "forbidden"})
+        else:
+            items.append((i, fields, project))
+
+    audit = AuditBatch()
+
+    # 1) Ingest staging rows in one flush
+    stagings = [models.ReleasesStaging(artifact_url=f["artifact_url"], notes=f["notes"]) for _, f, _ in items]
+    db.add_all(stagings)
+    db.flush()
+    staging_ids: Dict[int, int] = {}
+    for (i, fields, _), staging in zip(items, stagings):
+        staging_ids[i] = int(staging.id)
+        audit.add("agent", staging.id, "ingest", {"artifact_url": fields["artifact_url"], "notes": fields["notes"]})
+
+    # 2) Exact duplicates: concurrent hashing (revalidated cache only in async mode), one digest lookup
+    background_hash = hash_mode() == "async"
+    digests = artifact_digests([f["artifact_url"] for _, f, _ in items], compute=not background_hash)
+    digest_of = {i: digests[f["artifact_url"]][0] for i, f, _ in items}
+    priors = find_releases_by_digests(db, [(f["project_id"], digest_of[i]) for i, f, _ in items])
+    searchable: List[Tuple[int, Dict[str, Any], models.Project]] = []
+    for i, fields, project in items:
+        prior = priors.get((fields["project_id"], digest_of[i]))
+        if prior is not None and not fields["force"]:
+            duplicate_of = {
+                "id": prior.id,
+                "version": prior.version,
+                "notes": prior.notes,
+                "artifact_sha256": prior.artifact_sha256,
+            }
+            audit.add("agent", staging_ids[i], "duplicate", {"release_id": prior.id, "batch_index": i})
+            results[i].update({"decision": "review", "duplicate_of": duplicate_of, "similar_releases": []})
+        else:
+            searchable.append((i, fields, project))
+
+    # 3) Similarity: batched vector search and LSH lookup
+    scopes: Dict[Tuple[int, Optional[str]], List[int]] = {}
+    for _, fields, project in searchable:
+        key = (fields["project_id"], fields["scope"])
+        if key not in scopes:
+            scopes[key] = scope_project_ids(db, project, fields["scope"])
+    scoped = [scopes[(f["project_id"], f["scope"])] for _, f, _ in searchable]
+    similar_lists = search_similar_releases_batch(
+        db,
+        [(f["notes"] or f["artifact_url"].rsplit("/", 1)[-1], pids) for (_, f, _), pids in zip(searchable, scoped)],
+        top_k=3,
+    )
+    try:
+        near_lists = find_near_duplicates_batch(
+            db, [(f["notes"], f["artifact_url"], pids) for (_, f, _), pids in zip(searchable, scoped)], top_k=3
+        )
+    except Exception as exc:
+        logger.warning("Batched near-duplicate lookup failed: %s", exc)
+        near_lists = [[] for _ in searchable]
+
+    # 4) Decide against existing releases; matches within the batch are settled in step 5
+    candidates: List[Tuple[int, Dict[str, Any], models.Project, List[Dict[str, Any]]]] = []
+    for (i, fields, project), similar, near in zip(searchable, similar_lists, near_lists):
+        audit.add(
+            "agent",
+            staging_ids[i],
+            "search",
+            {"top": len(similar), "items": similar, "near_duplicates": near},
+        )
+        results[i].update({"similar_releases": similar, "near_duplicates": near})
+        if not fields["force"] and (similar or near) and _needs_review(similar, near):
+            results[i]["decision"] = "review"
+            continue
+        candidates.append((i, fields, project, near))
+
+    created_at = datetime.now(timezone.utc)
+    embeddings: Dict[int, bytes] = {}
+    model_id = get_provider().model_id if (os.getenv("EMBEDDING_ENABLED") or "0") == "1" else None
+    slugs: Dict[int, str] = {}
+
+    def _insert_entries(entries):
+        """Flush releases, hash jobs and routes for ``entries``; returns (release, route, job_id) each."""
+        releases: List[models.Release] = []
+        for i, fields, project, version in entries:
+            release = models.Release(
+                user_id=int(actor["user_id"]) if actor else project.user_id,
+                project_id=fields["project_id"],
+                version=version,
+                notes=fields["notes"],
+                artifact_url=fields["artifact_url"],
+                artifact_sha256=digest_of[i],
+                created_at=created_at,
+            )
+            if i in embeddings:
+                release.embedding = embeddings[i]
+                release.embedding_model = model_id
+            releases.append(release)
+        db.add_all(releases)
+        db.flush()
+        rows = []
+        for (i, fields, _, _), release in zip(entries, releases):
+            index_release_minhash(db, release, replace=False)
+            job_id = create_hash_job(db, release).id if release.artifact_sha256 is None and background_hash else None
+            route = models.Route(
+                project_id=fields["project_id"],
+                slug=slugs[i],
+                target_url=fields["artifact_url"],
+                release_id=release.id,
+                user_id=release.user_id,
+            )
+            rows.append((release, route, job_id))
+        db.add_all([route for _, route, _ in rows])
+        db.flush()
+        return rows
+
+    # 5) Publish in rounds. Items are only compared with batch items that were really inserted:
+    # if one loses its slug, the items held back because of it are judged again.
+    hash_jobs: Dict[int, str] = {}
+    published: List[Tuple[int, int, int, int]] = []
+    inserted_digests: Dict[Tuple[int, str], int] = {}
+    inserted_sigs: List[Tuple[int, int, Any]] = []
+    signatures = {i: release_signature(f["notes"], f["artifact_url"]) for i, f, _, _ in candidates}
+    pending = candidates
+    while pending:
+        to_publish: List[Tuple[int, Dict[str, Any], models.Project, str]] = []
+        held: List[Tuple[int, Dict[str, Any], models.Project, List[Dict[str, Any]]]] = []
+        round_digests = dict(inserted_digests)
+        round_sigs = list(inserted_sigs)
+        for i, fields, project, near in pending:
+            results[i].pop("duplicate_of", None)
+            results[i]["near_duplicates"] = near
+            digest_key = (fields["project_id"], digest_of[i]) if digest_of[i] else None
+            sig = signatures[i]
+            if not fields["force"]:
+                if digest_key in round_digests:
+                    results[i].update({"decision": "review", "duplicate_of": {"batch_index": round_digests[digest_key]}})
+                    held.append((i, fields, project, near))
+                    continue
+                allowed = set(scopes[(fields["project_id"], fields["scope"])])
+                batch_near = []
+                if sig is not None:
+                    for j, project_id, other in round_sigs:
+                        score = estimate_jaccard(sig, other)
+                        if project_id in allowed and score >= near_dup_threshold():
+                            batch_near.append({"batch_index": j, "score": score})
+                if batch_near:
+                    results[i].update({"decision": "review", "near_duplicates": near + batch_near})
+                    held.append((i, fields, project, near))
+                    continue
+            version = extract_version(fields["artifact_url"], fields["notes"])
+            release_preview = {
+                "project_id": fields["project_id"],
+                "version": version,
+                "notes": fields["notes"],
+                "artifact_url": fields["artifact_url"],
+                "artifact_sha256": digest_of[i],
+            }
+            if fields["dry_run"]:
+                results[i].update({"decision": "dry_run", "release": release_preview, "route": None})
+                continue
+            if digest_key is not None:
+                round_digests[digest_key] = i
+            if sig is not None:
+                round_sigs.append((i, fields["project_id"], sig))
+            results[i]["release"] = release_preview
+            to_publish.append((i, fields, project, version))
+
+        # Pick route slugs with at most two lookups
+        base_slugs = {i: slugify(f"{project.name}-{version}") or uuid.uuid4().hex[:8] for i, _, project, version in to_publish}
+        taken = set(
+            db.scalars(select(models.Route.slug).where(models.Route.slug.in_(set(base_slugs.values())))).all()
+        ) if base_slugs else set()
+        alts: Dict[int, str] = {}
+        for i, _, _, _ in to_publish:
+            if base_slugs[i] in taken or base_slugs[i] in slugs.values():
+                alts[i] = slugify(f"{base_slugs[i]}-{uuid.uuid4().hex[:4]}")
+            else:
+                slugs[i] = base_slugs[i]
+        if alts:
+            taken_alts = set(db.scalars(select(models.Route.slug).where(models.Route.slug.in_(set(alts.values())))).all())
+            for i, alt in alts.items():
+                if alt in taken_alts or alt in slugs.values():
+                    results[i].update({"decision": "error", "error": "slug_conflict", "release": None})
+                else:
+                    slugs[i] = alt
+        attempted = len(to_publish)
+        to_publish = [entry for entry in to_publish if entry[0] in slugs]
+
+        if to_publish and model_id is not None:
+            vectors = embed_batch([f["notes"] or f["artifact_url"] for _, f, _, _ in to_publish])
+            embeddings.update({entry[0]: encode_embedding(vector) for entry, vector in zip(to_publish, vectors)})
+
+        # Bulk insert inside a savepoint; if a concurrent publish took a slug, redo the items
+        # one savepoint at a time so only the conflicting ones fail.
+        inserted: List[Tuple[Any, Any]] = []
+        try:
+            with db.begin_nested():
+                inserted = list(zip(to_publish, _insert_entries(to_publish)))
+        except IntegrityError:
+            inserted = []
+            for entry in to_publish:
+                try:
+                    with db.begin_nested():
+                        inserted.append((entry, _insert_entries([entry])[0]))
+                except IntegrityError:
+                    results[entry[0]].update({"decision": "error", "error": "slug_conflict", "release": None})
+
+        for (i, fields, _, version), (release, route, job_id) in inserted:
+            if digest_of[i]:
+                inserted_digests[(fields["project_id"], digest_of[i])] = i
+            if signatures[i] is not None:
+                inserted_sigs.append((i, fields["project_id"], signatures[i]))
+            if job_id is not None:
+                hash_jobs[i] = job_id
+            audit.add("release", release.id, "publish", {"project_id": fields["project_id"], "version": version})
+            audit.add("route", route.id, "mint_route", {"slug": route.slug, "target_url": route.target_url})
+            results[i]["release"].update(
+                {"id": release.id, "created_at": str(created_at), "artifact_sha256": release.artifact_sha256}
+            )
+            results[i].update(
+                {
+                    "decision": "published",
+                    "route": {"id": route.id, "slug": route.slug, "target_url": route.target_url},
+                    "hash_job": {"id": job_id, "status": "queued"} if job_id is not None else None,
+                }
+            )
+            published.append((i, int(release.id), int(release.user_id), fields["project_id"]))
+        pending = held if len(inserted) < attempted else []
+    audit.write(db)
+    db.commit()
+
+    # 6) Side effects once everything is durable
+    for job_id in hash_jobs.values():
+        submit_hash_job(job_id)
+    for i, release_id, user_id, project_id in published:
+        if i not in hash_jobs:
+            schedule_evidence_precompute(release_id)
+        if i in embeddings:
+            try:
+                index_release_embedding(release_id, embeddings[i], project_id)
+            except Exception as exc:
+                logger.warning("Failed to index release %s for similarity: %s", release_id, exc)
+        try:
+            enqueue_event(user_id, "release_published", {"release_id": release_id, "project_id": project_id})
+        except Exception:
+            pass
+
+    summary: Dict[str, int] = {}
+    for result in results:
+        summary[result["decision"]] = summary.get(result["decision"], 0) + 1
+    return JSONResponse(status_code=200, content={"results": results, "summary": summary})
@@ -10,6 +10,8 @@ from .db import get_db, now_utc
 from .errors import json_error
 from . import models
 from .utils.enrich import decode_ref
+from .utils.interning import lookup_values
+from .utils.ipaddr import decode_ip
 from .middleware import get_request_user
 from .auth.magic import is_auth_enabled
 from .auth.accounts import ensure_demo_user
@@ -20,6 +22,10 @@ logger = logging.getLogger("routeforge.analytics")
 router = APIRouter(prefix="/api", tags=["analytics"]) 
 
 
+# Each stored hit counts once plus any duplicates the dedupe window folded into it.
+_CLICKS = func.coalesce(func.sum(1 + models.RouteHit.dup_count), 0)
+
+
 def error(code: str, status_code: int = 400):
     return json_error(code, status_code=status_code)
 
@@ -50,6 +56,42 @@ def _coerce_ref(value: Optional[Any]) -> Optional[str]:
     return text or None
 
 
+def _archived_clicks_by_day(
+    db: Session,
+    since,
+    *,
+    route_id: Optional[int] = None,
+    user_id: Optional[int] = None,
+) -> Dict[str, int]:
+    """Clicks per day from hourly aggregates of hits already pruned by retention.
+
+    Buckets only ever hold hits whose raw rows were deleted, so they are always merged,
+    whatever this process's ``HIT_RETENTION_DAYS`` (retention may run from a script).
+    """
+    day = func.date(models.RouteHitHourly.bucket_ts)
+    query = (
+        select(day.label("date"), func.sum(models.RouteHitHourly.hits).label("count"))
+        .where(models.RouteHitHourly.bucket_ts >= since)
+        .group_by(day)
+    )
+    if route_id is not None:
+        query = query.where(models.RouteHitHourly.route_id == route_id)
+    if user_id is not None:
+        query = query.join(models.Route, models.Route.id == models.RouteHitHourly.route_id).where(
+            models.Route.user_id == user_id
+        )
+    return {str(r.date): int(r.count or 0) for r in db.execute(query).all()}
+
+
+def _merge_by_day(by_day: List[Dict[str, Any]], archived: Dict[str, int]) -> List[Dict[str, Any]]:
+    if not archived:
+        return by_day
+    merged: Dict[str, int] = dict(archived)
+    for item in by_day:
+        merged[item["date"]] = merged.get(item["date"], 0) + int(item["count"])
+    return [{"date": date, "count": merged[date]} for date in sorted(merged)]
+
+
 def _require_user(request: Request, db: Session):
     user = get_request_user(request)
     if is_auth_enabled():
@@ -72,7 +114,7 @@ def get_stats_summary(request: Request, days: int = 7, db: Session = Depends(get
     user_id = int(user.get("user_id")) if user else None
 
     total_clicks = db.scalar(
-        select(func.count(models.RouteHit.id))
+        select(_CLICKS)
         .join(models.Route, models.Route.id == models.RouteHit.route_id)
         .where(models.RouteHit.ts >= since, models.Route.user_id == user_id)
     ) or 0
@@ -83,12 +125,14 @@ def get_stats_summary(request: Request, days: int = 7, db: Session = Depends(get
         .where(models.RouteHit.ts >= since, models.Route.user_id == user_id)
     ) or 0
 
+    total_clicks += sum(_archived_clicks_by_day(db, since, user_id=user_id).values())
+
     top_rows = db.execute(
         select(
             models.RouteHit.route_id.label("route_id"),
             models.Route.slug.label("slug"),
             models.Route.release_id.label("release_id"),
-            func.count(models.RouteHit.id).label("clicks"),
+            _CLICKS.label("clicks"),
         )
         .join(models.Route, models.Route.id == models.RouteHit.route_id)
         .where(models.RouteHit.ts >= since, models.Route.user_id == user_id)
@@ -134,7 +178,7 @@ def get_stats_series(request: Request, days: int = 7, db: Session = Depends(get_
     clicks_rows = db.execute(
         select(
             func.date(models.RouteHit.ts).label("date"),
-            func.count(models.RouteHit.id).label("count"),
+            _CLICKS.label("count"),
         )
         .join(models.Route, models.Route.id == models.RouteHit.route_id)
         .where(models.RouteHit.ts >= since, models.Route.user_id == user_id)
@@ -142,9 +186,10 @@ def get_stats_series(request: Request, days: int = 7, db: Session = Depends(get_
         .order_by(func.date(models.RouteHit.ts).asc())
     ).all()
 
-    by_day_clicks: List[Dict[str, Any]] = [
-        {"date": str(r.date), "count": int(r.count or 0)} for r in clicks_rows
-    ]
+    by_day_clicks: List[Dict[str, Any]] = _merge_by_day(
+        [{"date": str(r.date), "count": int(r.count or 0)} for r in clicks_rows],
+        _archived_clicks_by_day(db, since, user_id=user_id),
+    )
 
     # Distinct active routes per day
     active_rows = db.execute(
@@ -165,24 +210,24 @@ def get_stats_series(request: Request, days: int = 7, db: Session = Depends(get_
     # Aggregate UTM sources across all hits for the user in the window
     ref_rows = db.execute(
         select(
-            models.RouteHit.ref.label("ref"),
-            func.count(models.RouteHit.id).label("count"),
+            models.RouteHit.ref_id.label("ref_id"),
+            _CLICKS.label("count"),
         )
         .join(models.Route, models.Route.id == models.RouteHit.route_id)
         .where(
             models.RouteHit.ts >= since,
             models.Route.user_id == user_id,
-            models.RouteHit.ref.isnot(None),
-            models.RouteHit.ref != "",
+            models.RouteHit.ref_id.isnot(None),
         )
-        .group_by(models.RouteHit.ref)
+        .group_by(models.RouteHit.ref_id)
         .order_by(desc("count"))
         .limit(1000)
     ).all()
+    ref_values = lookup_values(db, models.Referrer, (r.ref_id for r in ref_rows))
 
     raw_utm_counts: Dict[str, int] = {}
     for r in ref_rows:
-        cleaned_ref = _coerce_ref(getattr(r, "ref", None))
+        cleaned_ref = _coerce_ref(ref_values.get(r.ref_id))
         if not cleaned_ref:
             continue
         try:
@@ -238,7 +283,7 @@ def get_route_stats(route_id: int, request: Request, days: int = 7, db: Session
     since = now_utc() - timedelta(days=window_days)
 
     clicks = db.scalar(
-        select(func.count(models.RouteHit.id)).where(
+        select(_CLICKS).where(
             models.RouteHit.route_id == route_id, models.RouteHit.ts >= since
         )
     ) or 0
@@ -246,38 +291,56 @@ def get_route_stats(route_id: int, request: Request, days: int = 7, db: Session
     by_day_rows = db.execute(
         select(
             func.date(models.RouteHit.ts).label("date"),
-            func.count(models.RouteHit.id).label("count"),
+            _CLICKS.label("count"),
         )
         .where(models.RouteHit.route_id == route_id, models.RouteHit.ts >= since)
         .group_by(func.date(models.RouteHit.ts))
         .order_by(func.date(models.RouteHit.ts).asc())
     ).all()
 
-    by_day: List[Dict[str, Any]] = [
-        {"date": str(r.date), "count": int(r.count)} for r in by_day_rows
-    ]
+    distinct_clicks = db.scalar(
+        select(func.count(models.RouteHit.id)).where(
+            models.RouteHit.route_id == route_id, models.RouteHit.ts >= since
+        )
+    ) or 0
+
+    # Distinct stored addresses; under IP_ANONYMIZE=truncate this counts prefixes.
+    unique_visitors = db.scalar(
+        select(func.count(func.distinct(models.RouteHit.ip))).where(
+            models.RouteHit.route_id == route_id,
+            models.RouteHit.ts >= since,
+            models.RouteHit.ip.isnot(None),
+        )
+    ) or 0
+
+    archived = _archived_clicks_by_day(db, since, route_id=route_id)
+    clicks += sum(archived.values())
+    by_day: List[Dict[str, Any]] = _merge_by_day(
+        [{"date": str(r.date), "count": int(r.count)} for r in by_day_rows],
+        archived,
+    )
 
     ref_rows = db.execute(
         select(
-            models.RouteHit.ref.label("ref"),
-            func.count(models.RouteHit.id).label("count"),
+            models.RouteHit.ref_id.label("ref_id"),
+            _CLICKS.label("count"),
         )
         .where(
             models.RouteHit.route_id == route_id,
             models.RouteHit.ts >= since,
-            models.RouteHit.ref.isnot(None),
-            models.RouteHit.ref != "",
+            models.RouteHit.ref_id.isnot(None),
         )
-        .group_by(models.RouteHit.ref)
+        .group_by(models.RouteHit.ref_id)
         .order_by(desc("count"))
         .limit(20)
     ).all()
+    ref_values = lookup_values(db, models.Referrer, (r.ref_id for r in ref_rows))
 
     referrers: List[Dict[str, Any]] = []
     utm_counts: Dict[str, int] = {}
 
     for r in ref_rows:
-        cleaned_ref = _coerce_ref(getattr(r, "ref", None))
+        cleaned_ref = _coerce_ref(ref_values.get(r.ref_id))
         referrers.append({"ref": cleaned_ref or "", "count": int(r.count or 0)})
         if not cleaned_ref:
             continue
@@ -300,26 +363,28 @@ def get_route_stats(route_id: int, request: Request, days: int = 7, db: Session
 
     ua_rows = db.execute(
         select(
-            models.RouteHit.ua.label("ua"),
-            func.count(models.RouteHit.id).label("count"),
+            models.RouteHit.ua_id.label("ua_id"),
+            _CLICKS.label("count"),
         )
         .where(
             models.RouteHit.route_id == route_id,
             models.RouteHit.ts >= since,
-            models.RouteHit.ua.isnot(None),
-            models.RouteHit.ua != "",
+            models.RouteHit.ua_id.isnot(None),
         )
-        .group_by(models.RouteHit.ua)
+        .group_by(models.RouteHit.ua_id)
         .order_by(desc("count"))
         .limit(20)
     ).all()
+    ua_values = lookup_values(db, models.UserAgent, (r.ua_id for r in ua_rows))
 
     user_agents: List[Dict[str, Any]] = [
-        {"ua": r.ua, "count": int(r.count)} for r in ua_rows
+        {"ua": ua_values.get(r.ua_id), "count": int(r.count)} for r in ua_rows
     ]
 
     return {
         "clicks": int(clicks),
+        "distinct_clicks": int(distinct_clicks),
+        "unique_visitors": int(unique_visitors),
         "by_day": by_day,
         "referrers": referrers,
         "utm_top_sources": utm_top_sources,
@@ -360,9 +425,12 @@ def get_route_recent_hits(route_id: int, request: Request, limit: int = 20, db:
             models.RouteHit.id.label("id"),
             models.RouteHit.ts.label("ts"),
             models.RouteHit.ip.label("ip"),
-            models.RouteHit.ua.label("ua"),
-            models.RouteHit.ref.label("ref"),
+            models.UserAgent.value.label("ua"),
+            models.Referrer.value.label("ref"),
         )
+        .select_from(models.RouteHit)
+        .outerjoin(models.UserAgent, models.UserAgent.id == models.RouteHit.ua_id)
+        .outerjoin(models.Referrer, models.Referrer.id == models.RouteHit.ref_id)
         .where(models.RouteHit.route_id == route_id)
         .order_by(models.RouteHit.ts.desc())
         .limit(n)
@@ -372,7 +440,7 @@ def get_route_recent_hits(route_id: int, request: Request, limit: int = 20, db:
         {
             "id": int(r.id),
             "ts": r.ts.isoformat() if hasattr(r.ts, "isoformat") else str(r.ts),
-            "ip": r.ip,
+            "ip": decode_ip(r.ip),
             "ua": r.ua,
             "ref": r.ref,
         }
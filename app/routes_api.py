@@ -8,7 +8,6 @@ from sqlalchemy import select, func
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 from starlette.responses import Response
-import httpx
 
 from .db import get_db
 from . import models, schemas
@@ -16,8 +15,9 @@ from .middleware import get_request_user, json_error_response
 from .utils.validators import slugify, validate_target_url
 from .security.hmac import verify_hmac
 from .redirects.sanity import domain_allowed, get_allowed_schemes, get_blocked_domains, head_ok
-from .worker.queue import queue
 from .agent.publish import apply_artifact_hash
+from .evidence_cache import schedule_evidence_precompute
+from .hashing import create_hash_job, hash_mode, serialize_hash_job, submit_hash_job
 from .auth.magic import SessionUser, is_auth_enabled
 from .auth.accounts import ensure_demo_user
 from .guards import require_owner
@@ -92,11 +92,24 @@ def publish_with_hmac(payload: dict, request: Request, db: Session = Depends(get
     # Create release and route similar to agent.publish (simplified)
     release = models.Release(user_id=int(user_id), project_id=project_id, version="auto", notes=notes, artifact_url=artifact_url)
     db.add(release)
+    db.flush()
+    job = _hash_release_artifact(db, release)
     db.commit()
     db.refresh(release)
+    if job is not None:
+        submit_hash_job(job.id)
+    else:
+        schedule_evidence_precompute(int(release.id))
 
     # No auto route mint here; return release id
-    return {"id": release.id, "project_id": project_id, "artifact_url": artifact_url, "notes": notes}
+    return {
+        "id": release.id,
+        "project_id": project_id,
+        "artifact_url": artifact_url,
+        "notes": notes,
+        "artifact_sha256": release.artifact_sha256,
+        "hash_job": {"id": job.id, "status": "queued"} if job is not None else None,
+    }
 
 
 def _require_user_id(request: Request, session_user: SessionUser) -> Tuple[Optional[int], Optional[Response]]:
@@ -164,9 +177,14 @@ def create_release(payload: schemas.ReleaseCreate, request: Request, db: Session
     release_data.pop("user_id", None)
     release = models.Release(user_id=current_user_id, **release_data)
     db.add(release)
+    db.flush()
+    job = _hash_release_artifact(db, release)
     db.commit()
     db.refresh(release)
-    _maybe_hash_release_async(release.id, release.artifact_url)
+    if job is not None:
+        submit_hash_job(job.id)
+    else:
+        schedule_evidence_precompute(int(release.id))
     return release
 
 
@@ -312,66 +330,26 @@ def get_route_by_slug(slug: Optional[str] = None, id: Optional[int] = None, requ
     }
 
 
-# Async heavy task: apply artifact hash when artifacts are large
-_HASH_SIZE_THRESHOLD = int(os.getenv("HASH_ASYNC_SIZE_BYTES", "104857600") or "104857600")  # 100 MB default
-
-
-def _should_hash_async(artifact_url: str) -> bool:
-    # If URL suggests a large artifact by extension, prefer async
-    large_exts = {".zip", ".tar", ".tar.gz", ".tgz", ".7z", ".dmg", ".iso"}
-    lowered = artifact_url.lower()
-    return any(lowered.endswith(ext) for ext in large_exts)
-
-
-def _hash_release_task(args: Tuple[int, str]):
-    release_id, artifact_url = args
-    # Local import to avoid circulars beyond what we already imported
-    from sqlalchemy.orm import Session
-    from .db import try_get_session
-    from . import models
-
-    db = try_get_session()
-    if db is None:
-        return
-    try:
-        release = db.get(models.Release, release_id)
-        if release is None:
-            return
-        # Compute and persist digest
-        apply_artifact_hash(release, artifact_url)
-        db.add(release)
-        db.commit()
-    finally:
-        db.close()  # type: ignore[attr-defined]
-
-
-def _try_head_content_length(url: str, timeout: float = 2.5) -> Optional[int]:
-    try:
-        with httpx.Client(follow_redirects=True, timeout=timeout) as client:
-            resp = client.head(url)
-            if resp.status_code >= 400:
-                return None
-            raw = resp.headers.get("content-length") or resp.headers.get("Content-Length")
-            if not raw:
-                return None
-            try:
-                return int(raw)
-            except Exception:
-                return None
-    except Exception:
+def _hash_release_artifact(db: Session, release: models.Release) -> Optional[models.HashJob]:
+    """Queue (async mode) or compute (sync mode) the digest of a flushed release."""
+    if not release.artifact_url:
         return None
+    if hash_mode() == "sync":
+        apply_artifact_hash(release, release.artifact_url)
+        return None
+    return create_hash_job(db, release)
 
 
-def _maybe_hash_release_async(release_id: int, artifact_url: str) -> None:
-    if not artifact_url:
-        return
-    # Use size threshold first if available via HEAD
-    size = _try_head_content_length(artifact_url)
-    is_large = bool(size and size > _HASH_SIZE_THRESHOLD)
-    if not is_large and not _should_hash_async(artifact_url):
-        return
-    task_id = f"hash:release:{release_id}"
-    queue.submit(task_id, "hash_release", _hash_release_task, (release_id, artifact_url))
+@router.get("/hash-jobs/{job_id}")
+def read_hash_job(job_id: str, request: Request, db: Session = Depends(get_db)):
+    session_user, failure = _require_user(request, db)
+    if failure is not None:
+        return failure
+
+    job = db.get(models.HashJob, job_id)
+    if job is None or job.user_id != int(session_user["user_id"]):
+        return error(request, "not_found", status_code=404)
+    return serialize_hash_job(job)
 
 
 @router.get("/releases/{release_id}", response_model=schemas.ReleaseDetailOut)
@@ -445,5 +423,9 @@ def get_route_hits(route_id: int, request: Request, db: Session = Depends(get_db
     if route is None:
         return error(request, "not_found", status_code=404)
 
-    count = db.scalar(select(func.count(models.RouteHit.id)).where(models.RouteHit.route_id == route_id))
+    count = db.scalar(
+        select(func.coalesce(func.sum(1 + models.RouteHit.dup_count), 0)).where(
+            models.RouteHit.route_id == route_id
+        )
+    )
     return {"count": int(count or 0)}
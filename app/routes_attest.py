@@ -16,6 +16,7 @@ from .auth.magic import is_auth_enabled
 from .demo_flags import is_demo
 from .middleware import get_request_user
 from .db import try_get_session
+from .hashing import hash_job_pending
 from . import models
 
 
@@ -106,6 +107,10 @@ def _load_release(release_id: int) -> Tuple[Dict[str, Optional[str]], Dict[str,
         if release is None:
             raise HTTPException(status_code=404, detail="release_not_found")
 
+        if not release.artifact_sha256 and hash_job_pending(session, release_id):
+            # Metadata is pinned and reused, so never attest before the digest is known.
+            raise HTTPException(status_code=409, detail="artifact_hash_pending")
+
         release_info = {
             "version": release.version,
             "artifact_url": release.artifact_url,
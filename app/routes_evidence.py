@@ -3,7 +3,6 @@ import os
 from typing import Dict, Optional, Tuple, Literal, cast
 
 from fastapi import APIRouter, Depends, Request
-from fastapi.responses import Response
 from sqlalchemy.orm import Session
 
 from . import models
@@ -11,7 +10,7 @@ from .auth.accounts import ensure_demo_user
 from .auth.magic import is_auth_enabled
 from .db import get_db
 from .errors import json_error
-from .evidence import build_evidence_zip
+from .evidence_cache import evidence_response, get_evidence_bundle
 from .middleware import get_request_user
 from pydantic import BaseModel
 
@@ -100,11 +99,9 @@ def download_release_evidence(release_id: int, request: Request, db: Session = D
         return error("not_found", status_code=404)
 
     try:
-        payload = build_evidence_zip(release_id, db)
+        bundle = get_evidence_bundle(db, release_id)
     except ValueError as exc:
         logger.warning("Failed to build evidence for release %s: %s", release_id, exc)
         return error("not_found", status_code=404)
 
-    filename = f"release-{release_id}-evidence.zip"
-    headers = {"Content-Disposition": f'attachment; filename="{filename}"'}
-    return Response(content=payload, media_type="application/zip", headers=headers)
+    return evidence_response(request, bundle, f"release-{release_id}-evidence.zip")
@@ -1,16 +1,25 @@
 import csv
 import io
 import logging
-from typing import Iterator
+from datetime import datetime
+from typing import Iterator, List, Literal, Optional
 
 from fastapi import APIRouter, Depends, Request
-from fastapi.responses import StreamingResponse
+from fastapi.responses import FileResponse, StreamingResponse
+from pydantic import BaseModel, ConfigDict
 from sqlalchemy import select
 from sqlalchemy.orm import Session
 
 from .db import get_db
 from .errors import json_error
 from . import models
+from .utils.ipaddr import decode_ip
+from .exports import (
+    create_export_job,
+    export_file_path,
+    serialize_export_job,
+    submit_export_job,
+)
 from .middleware import get_request_user
 from .auth.magic import is_auth_enabled
 from .auth.accounts import ensure_demo_user
@@ -25,6 +34,27 @@ def error(code: str, status_code: int = 400):
     return json_error(code, status_code=status_code)
 
 
+class BulkExportRequest(BaseModel):
+    project_id: Optional[int] = None
+    route_ids: Optional[List[int]] = None
+    since: Optional[datetime] = None
+    until: Optional[datetime] = None
+    format: Literal["csv", "jsonl"] = "csv"
+
+    model_config = ConfigDict(extra="forbid")
+
+
+def _resolve_user(request: Request, db: Session):
+    user = get_request_user(request)
+    if is_auth_enabled():
+        return user
+
+    demo = ensure_demo_user(db)
+    user = {"user_id": int(demo.id), "email": demo.email, "name": demo.name}
+    request.state.user = user
+    return user
+
+
 def _normalize_limit(raw_limit: int) -> int:
     try:
         limit = int(raw_limit)
@@ -39,14 +69,9 @@ def _normalize_limit(raw_limit: int) -> int:
 
 @router.get("/routes/{route_id}/export.csv")
 def export_route_hits(route_id: int, request: Request, limit: int = 1000, db: Session = Depends(get_db)):
-    user = get_request_user(request)
-    if is_auth_enabled():
-        if user is None:
-            return error("auth_required", status_code=401)
-    else:
-        demo = ensure_demo_user(db)
-        user = {"user_id": int(demo.id), "email": demo.email, "name": demo.name}
-        request.state.user = user
+    user = _resolve_user(request, db)
+    if user is None:
+        return error("auth_required", status_code=401)
 
     route = db.get(models.Route, route_id)
     if route is None:
@@ -61,16 +86,20 @@ def export_route_hits(route_id: int, request: Request, limit: int = 1000, db: Se
         select(
             models.RouteHit.ts.label("ts"),
             models.RouteHit.ip.label("ip"),
-            models.RouteHit.ua.label("ua"),
-            models.RouteHit.ref.label("ref"),
+            models.UserAgent.value.label("ua"),
+            models.Referrer.value.label("ref"),
+            models.RouteHit.dup_count.label("dup_count"),
         )
+        .select_from(models.RouteHit)
+        .outerjoin(models.UserAgent, models.UserAgent.id == models.RouteHit.ua_id)
+        .outerjoin(models.Referrer, models.Referrer.id == models.RouteHit.ref_id)
         .where(models.RouteHit.route_id == route_id)
         .order_by(models.RouteHit.ts.desc())
         .limit(normalized_limit)
     )
 
     def row_to_csv() -> Iterator[str]:
-        yield "ts,ip,ua,ref\n"
+        yield "ts,ip,ua,ref,dup_count\n"
         buffer = io.StringIO()
         writer = csv.writer(buffer)
         for row in db.execute(query):
@@ -85,9 +114,10 @@ def export_route_hits(route_id: int, request: Request, limit: int = 1000, db: Se
             writer.writerow(
                 [
                     ts_value,
-                    row.ip or "",
+                    decode_ip(row.ip) or "",
                     row.ua or "",
                     row.ref or "",
+                    int(row.dup_count or 0),
                 ]
             )
             yield buffer.getvalue()
@@ -103,3 +133,76 @@ def export_route_hits(route_id: int, request: Request, limit: int = 1000, db: Se
         media_type="text/csv",
         headers=headers,
     )
+
+
+@router.post("/exports", status_code=202)
+def submit_bulk_export(payload: BulkExportRequest, request: Request, db: Session = Depends(get_db)):
+    """Queue a project- or route-set-wide hit export and return the job for polling."""
+    user = _resolve_user(request, db)
+    if user is None:
+        return error("auth_required", status_code=401)
+    user_id = int(user.get("user_id"))
+
+    if payload.project_id is None and not payload.route_ids:
+        return error("project_or_routes_required", status_code=422)
+    if payload.since and payload.until and payload.since >= payload.until:
+        return error("invalid_date_range", status_code=422)
+
+    query = select(models.Route.id).where(models.Route.user_id == user_id)
+    if payload.project_id is not None:
+        project = db.get(models.Project, payload.project_id)
+        if project is None or project.user_id != user_id:
+            return error("not_found", status_code=404)
+        query = query.where(models.Route.project_id == payload.project_id)
+    if payload.route_ids:
+        query = query.where(models.Route.id.in_(payload.route_ids))
+    route_ids = [int(rid) for rid in db.execute(query).scalars().all()]
+    if payload.route_ids and len(route_ids) != len(set(payload.route_ids)):
+        return error("not_found", status_code=404)
+
+    job = create_export_job(
+        db,
+        user_id=user_id,
+        route_ids=route_ids,
+        fmt=payload.format,
+        project_id=payload.project_id,
+        since=payload.since,
+        until=payload.until,
+    )
+    if not submit_export_job(job.id):
+        job.status = "error"
+        job.error = "queue_full"
+        db.commit()
+        return error("queue_full", status_code=503)
+
+    return serialize_export_job(job)
+
+
+@router.get("/exports/{job_id}")
+def read_bulk_export(job_id: str, request: Request, db: Session = Depends(get_db)):
+    user = _resolve_user(request, db)
+    if user is None:
+        return error("auth_required", status_code=401)
+
+    job = db.get(models.ExportJob, job_id)
+    if job is None or job.user_id != int(user.get("user_id")):
+        return error("not_found", status_code=404)
+    return serialize_export_job(job)
+
+
+@router.get("/exports/{job_id}/files/{name}")
+def download_bulk_export_file(job_id: str, name: str, request: Request, db: Session = Depends(get_db)):
+    user = _resolve_user(request, db)
+    if user is None:
+        return error("auth_required", status_code=401)
+
+    job = db.get(models.ExportJob, job_id)
+    if job is None or job.user_id != int(user.get("user_id")) or job.status != "done":
+        return error("not_found", status_code=404)
+
+    path = export_file_path(job, name)
+    if path is None:
+        return error("not_found", status_code=404)
+
+    media_type = "text/csv" if job.format == "csv" else "application/x-ndjson"
+    return FileResponse(path, media_type=media_type, filename=name)
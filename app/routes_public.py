@@ -13,7 +13,7 @@ from . import models
 from .db import try_get_session
 from .licenses import get_license_info
 from .og.render import ReleaseOgInput, render_not_found_image, render_release_image
-from .evidence import build_evidence_zip
+from .evidence_cache import evidence_response, get_evidence_bundle
 from .middleware import json_error_response
 
 
@@ -246,18 +246,14 @@ def download_public_evidence(
         return error(request, "service_unavailable", status_code=503, detail="Database unavailable")
 
     try:
-        release = db.get(models.Release, release_id)
-        if release is None:
-            return error(request, "not_found", status_code=404)
-
         try:
-            payload = build_evidence_zip(release_id, db)
+            bundle = get_evidence_bundle(db, release_id)
         except ValueError:
             return error(request, "not_found", status_code=404)
 
-        filename = f"release-{release_id}-evidence.zip"
-        headers = {"Content-Disposition": f'attachment; filename="{filename}"'}
-        return Response(content=payload, media_type="application/zip", headers=headers)
+        return evidence_response(
+            request, bundle, f"release-{release_id}-evidence.zip", cache_control="public, max-age=60"
+        )
     finally:
         _close_session(db)
 
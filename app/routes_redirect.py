@@ -13,8 +13,11 @@ from .db import try_get_session
 from . import models
 from .middleware import json_error_response
 from .utils.enrich import parse_ref, serialize_ref
+from .utils.interning import intern_referrer, intern_user_agent
+from .utils.ipaddr import decode_ip, encode_ip
 from .utils.validators import validate_target_url
 from .hooks.dispatcher import enqueue_event
+from .hit_dedupe import get_deduper, hit_key
 
 
 logger = logging.getLogger("routeforge.redirect")
@@ -111,13 +114,31 @@ def redirect_slug(slug: str, request: Request, db: Optional[Session] = Depends(t
     enriched_ref = parse_ref(ref_header, request.url.query)
     serialized_ref = serialize_ref(enriched_ref.get("host"), enriched_ref.get("utm") or {}, fallback=ref_header)
 
-    hit = models.RouteHit(route_id=route.id, ip=ip, ua=ua, ref=serialized_ref)
-    db.add(hit)
-    db.commit()
-    try:
-        enqueue_event(int(route.user_id), "route_hit", {"route_id": int(route.id), "slug": route.slug})
-    except Exception:
-        pass
+    stored_ip = encode_ip(ip)
+    deduper = get_deduper()
+    dedupe_key = hit_key(route.id, stored_ip, ua)
+    if deduper.check(dedupe_key) is None:
+        hit = models.RouteHit(
+            route_id=route.id,
+            ip=stored_ip,
+            ua_id=intern_user_agent(db, ua),
+            ref_id=intern_referrer(db, serialized_ref),
+        )
+        db.add(hit)
+        db.flush()
+        hit_id = int(hit.id)
+        db.commit()
+        deduper.remember(dedupe_key, hit_id)
+        try:
+            enqueue_event(int(route.user_id), "route_hit", {"route_id": int(route.id), "slug": route.slug})
+        except Exception:
+            pass
+    # Checked on every request, not only for duplicates, so HIT_DEDUPE_FLUSH_SEC is honoured.
+    if deduper.should_flush():
+        try:
+            deduper.flush(db)
+        except Exception as exc:
+            logger.warning("Failed to flush duplicate hit counts: %s", exc)
 
     allowed_schemes = _get_allowed_target_schemes()
     try:
@@ -127,5 +148,5 @@ def redirect_slug(slug: str, request: Request, db: Optional[Session] = Depends(t
         detail = f"Target URL scheme must be one of: {', '.join(allowed_schemes)}"
         return error(request, "invalid_url", status_code=422, detail=detail)
 
-    logger.info("Redirect slug=%s route_id=%s ip=%s", slug, route.id, ip)
+    logger.info("Redirect slug=%s route_id=%s ip=%s", slug, route.id, decode_ip(stored_ip))
     return RedirectResponse(url=normalized, status_code=302)
@@ -10,6 +10,7 @@ from . import models, schemas
 from .auth.accounts import ensure_demo_user
 from .auth.magic import SessionUser, is_auth_enabled
 from .db import get_db
+from .evidence_cache import schedule_evidence_precompute
 from .guards import require_owner
 from .licenses import (
     CUSTOM_LICENSE_CODE,
@@ -107,6 +108,8 @@ def update_release_license(
     db.add(release)
     db.commit()
     db.refresh(release)
+    # LICENSE.md is part of the bundle, so rebuild (and re-pin) it ahead of the next download.
+    schedule_evidence_precompute(int(release.id))
 
     license_info = get_license_info(release.license_code)
 
@@ -4,12 +4,23 @@ import re
 import uuid
 from datetime import datetime
 from pathlib import Path
-from typing import Optional, Tuple
+from typing import List, Optional, Tuple
 
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel, ConfigDict, Field
 
-from .storage.s3 import S3ConfigError, presign_put
+from .storage.s3 import (
+    MULTIPART_MAX_PARTS,
+    MULTIPART_MIN_PART_SIZE,
+    S3ConfigError,
+    S3RequestError,
+    abort_multipart_upload,
+    complete_multipart_upload,
+    create_multipart_upload,
+    presign_put,
+    presign_put_batch,
+    presign_upload_parts,
+)
 
 logger = logging.getLogger("routeforge.uploads")
 
@@ -23,6 +34,51 @@ class PresignRequest(BaseModel):
     model_config = ConfigDict(populate_by_name=True, extra="forbid")
 
 
+class PresignBatchRequest(BaseModel):
+    files: List[PresignRequest] = Field(..., min_length=1, max_length=200)
+
+    model_config = ConfigDict(extra="forbid")
+
+
+class MultipartStartRequest(BaseModel):
+    filename: str = Field(..., max_length=512)
+    type: Optional[str] = Field(None, alias="type", max_length=200)
+    size: Optional[int] = Field(None, ge=1)
+    part_size: Optional[int] = Field(None, ge=MULTIPART_MIN_PART_SIZE)
+
+    model_config = ConfigDict(populate_by_name=True, extra="forbid")
+
+
+class MultipartPartsRequest(BaseModel):
+    key: str = Field(..., max_length=1024)
+    upload_id: str = Field(..., max_length=1024)
+    part_numbers: List[int] = Field(..., min_length=1, max_length=1000)
+
+    model_config = ConfigDict(extra="forbid")
+
+
+class CompletedPart(BaseModel):
+    part_number: int = Field(..., ge=1, le=MULTIPART_MAX_PARTS)
+    etag: str = Field(..., max_length=200)
+
+    model_config = ConfigDict(extra="forbid")
+
+
+class MultipartCompleteRequest(BaseModel):
+    key: str = Field(..., max_length=1024)
+    upload_id: str = Field(..., max_length=1024)
+    parts: List[CompletedPart] = Field(..., min_length=1, max_length=MULTIPART_MAX_PARTS)
+
+    model_config = ConfigDict(extra="forbid")
+
+
+class MultipartAbortRequest(BaseModel):
+    key: str = Field(..., max_length=1024)
+    upload_id: str = Field(..., max_length=1024)
+
+    model_config = ConfigDict(extra="forbid")
+
+
 _FILENAME_SAFE = re.compile(r"[^A-Za-z0-9_.-]+")
 
 
@@ -68,3 +124,111 @@ def create_presigned_upload(payload: PresignRequest):
         raise HTTPException(status_code=500, detail="upload_presign_failed") from None
 
     return presigned
+
+
+@router.post("/presign/batch")
+def create_presigned_uploads(payload: PresignBatchRequest):
+    items = []
+    for entry in payload.files:
+        filename = entry.filename.strip()
+        if not filename:
+            raise HTTPException(status_code=422, detail="filename_required")
+        content_type = (entry.type or "").strip() or "application/octet-stream"
+        items.append((_generate_key(filename), content_type))
+
+    try:
+        uploads = presign_put_batch(items)
+    except S3ConfigError as exc:
+        logger.error("S3 configuration error: %s", exc)
+        raise HTTPException(status_code=500, detail="s3_config_error") from exc
+    except Exception:
+        logger.exception("Failed to create %s presigned uploads", len(items))
+        raise HTTPException(status_code=500, detail="upload_presign_failed") from None
+
+    return {"uploads": uploads}
+
+
+def _multipart_part_size(size: Optional[int], requested: Optional[int]) -> int:
+    default = int(os.getenv("S3_MULTIPART_PART_SIZE", str(64 * 1024 * 1024)))
+    part_size = max(requested or default, MULTIPART_MIN_PART_SIZE)
+    if size:
+        # Grow the parts when the file would otherwise need more than the S3 part limit.
+        part_size = max(part_size, -(-size // MULTIPART_MAX_PARTS))
+    return part_size
+
+
+def _check_upload_key(key: str) -> str:
+    key = key.strip()
+    if not key.startswith("artifacts/") or ".." in key.split("/"):
+        raise HTTPException(status_code=422, detail="invalid_upload_key")
+    return key
+
+
+def _s3_call(action: str, key: str, func, *args):
+    try:
+        return func(*args)
+    except S3ConfigError as exc:
+        logger.error("S3 configuration error: %s", exc)
+        raise HTTPException(status_code=500, detail="s3_config_error") from exc
+    except S3RequestError as exc:
+        logger.warning("S3 %s failed for key %s: %s", action, key, exc)
+        raise HTTPException(status_code=502, detail="s3_request_failed") from None
+    except Exception:
+        logger.exception("S3 %s failed for key %s", action, key)
+        raise HTTPException(status_code=500, detail="upload_multipart_failed") from None
+
+
+@router.post("/multipart")
+def start_multipart_upload(payload: MultipartStartRequest):
+    filename = payload.filename.strip()
+    if not filename:
+        raise HTTPException(status_code=422, detail="filename_required")
+    content_type = (payload.type or "").strip() or "application/octet-stream"
+
+    part_size = _multipart_part_size(payload.size, payload.part_size)
+    part_count = -(-payload.size // part_size) if payload.size else 0
+    if part_count > MULTIPART_MAX_PARTS:
+        raise HTTPException(status_code=422, detail="too_many_parts")
+
+    key = _generate_key(filename)
+    upload_id = _s3_call("initiate", key, create_multipart_upload, key, content_type)
+    # Sign the first batch of part URLs up front so small and medium uploads need one round trip.
+    first_batch = range(1, min(part_count, 1000) + 1)
+    parts = _s3_call("presign", key, presign_upload_parts, key, upload_id, first_batch)
+    return {
+        "key": key,
+        "upload_id": upload_id,
+        "part_size": part_size,
+        "part_count": part_count or None,
+        "parts": parts,
+        "headers": {"Content-Type": content_type},
+    }
+
+
+@router.post("/multipart/parts")
+def presign_multipart_parts(payload: MultipartPartsRequest):
+    key = _check_upload_key(payload.key)
+    if any(not 1 <= number <= MULTIPART_MAX_PARTS for number in payload.part_numbers):
+        raise HTTPException(status_code=422, detail="invalid_part_number")
+    parts = _s3_call(
+        "presign", key, presign_upload_parts, key, payload.upload_id, sorted(set(payload.part_numbers))
+    )
+    return {"key": key, "upload_id": payload.upload_id, "parts": parts}
+
+
+@router.post("/multipart/complete")
+def finish_multipart_upload(payload: MultipartCompleteRequest):
+    key = _check_upload_key(payload.key)
+    numbers = [part.part_number for part in payload.parts]
+    if len(set(numbers)) != len(numbers):
+        raise HTTPException(status_code=422, detail="duplicate_part_number")
+    parts = [(part.part_number, part.etag.strip()) for part in payload.parts]
+    public_url = _s3_call("complete", key, complete_multipart_upload, key, payload.upload_id, parts)
+    return {"key": key, "public_url": public_url}
+
+
+@router.post("/multipart/abort")
+def abort_multipart(payload: MultipartAbortRequest):
+    key = _check_upload_key(payload.key)
+    _s3_call("abort", key, abort_multipart_upload, key, payload.upload_id)
+    return {"key": key, "aborted": True}
@@ -147,6 +147,15 @@ def test_webhook(webhook_id: int, request: Request, db: Session = Depends(get_db
         payload = {"route_id": 123, "slug": "demo", "ts": now.isoformat()}
     elif row.event == "release_published":
         payload = {"release_id": 456, "project_id": 42, "ts": now.isoformat()}
+    elif row.event == "artifact_hashed":
+        payload = {
+            "job_id": "0" * 32,
+            "release_id": 456,
+            "project_id": 42,
+            "status": "done",
+            "artifact_sha256": "0" * 64,
+            "ts": now.isoformat(),
+        }
     else:
         payload = {"event": row.event, "ts": now.isoformat()}
 
@@ -1,11 +1,17 @@
-import hashlib
+import json
 import logging
 import os
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Sequence, Tuple
 
-from sqlalchemy import text
+import numpy as np
+from sqlalchemy import bindparam, select, text
 from sqlalchemy.orm import Session
 
+from . import models
+from .embeddings import HashEmbeddingProvider, embed_batch, embed_text
+from .similarity import get_release_index, index_backend, search_release_index
+from .similarity.minhash import estimate_jaccard, release_signature
+
 logger = logging.getLogger("routeforge.search")
 
 
@@ -20,55 +26,172 @@ def _similarity_threshold() -> float:
         return 0.83
 
 
+SEARCH_SCOPES = ("project", "user")
+
+
+def default_search_scope() -> str:
+    """``SIMILARITY_SCOPE``: ``project`` (default) or ``user`` for all of the owner's projects."""
+    scope = (os.getenv("SIMILARITY_SCOPE") or "project").strip().lower()
+    return scope if scope in SEARCH_SCOPES else "project"
+
+
+def scope_project_ids(db: Session, project: models.Project, scope: Optional[str] = None) -> List[int]:
+    """Project ids a search for ``project`` may see. Never crosses into other users' projects."""
+    scope = scope if scope in SEARCH_SCOPES else default_search_scope()
+    if scope == "user":
+        return [
+            int(pid)
+            for pid in db.scalars(select(models.Project.id).where(models.Project.user_id == project.user_id)).all()
+        ]
+    return [int(project.id)]
+
+
+def _scoped(sql: str, project_ids: Optional[Sequence[int]]):
+    """Bind ``:pids`` for the ``{scope}`` placeholder, or drop the filter when unscoped."""
+    if project_ids is None:
+        return text(sql.replace("{scope}", ""))
+    return text(sql.replace("{scope}", "AND project_id IN :pids")).bindparams(
+        bindparam("pids", expanding=True)
+    )
+
+
 def _hash_to_vector_768(text_value: str) -> list[float]:
     # Deterministic stub: expand sha256 digest repeatedly to 768 dims in [0,1]
-    seed = text_value.encode("utf-8")
-    vec: list[float] = []
-    current = seed
-    while len(vec) < 768:
-        d = hashlib.sha256(current).digest()
-        for b in d:
-            vec.append(b / 255.0)
-            if len(vec) >= 768:
-                break
-        current = d
-    return vec
-
-
-def search_similar_releases(db: Session, query_text: str, top_k: int = 3) -> List[Dict[str, Any]]:
+    return HashEmbeddingProvider().embed(text_value).tolist()
+
+
+def _search_memory_index(
+    db: Session, q_vec: np.ndarray, top_k: int, project_ids: Optional[Sequence[int]] = None
+) -> List[Dict[str, Any]]:
+    """Cosine top-k from the in-process index shards; scores are cosine similarity."""
+    hits = search_release_index(db, q_vec, int(top_k), project_ids)
+    return _resolve_index_hits(db, [hits])[0]
+
+
+def _resolve_index_hits(db: Session, hit_lists: List[List[Tuple[int, float]]]) -> List[List[Dict[str, Any]]]:
+    """Attach version/notes to ``(id, score)`` hits with one query for all lists."""
+    ids = {release_id for hits in hit_lists for release_id, _ in hits}
+    if not ids:
+        return [[] for _ in hit_lists]
+    rows = db.execute(
+        select(models.Release.id, models.Release.version, models.Release.notes).where(models.Release.id.in_(ids))
+    ).all()
+    by_id = {int(r.id): r for r in rows}
+    results: List[List[Dict[str, Any]]] = []
+    for hits in hit_lists:
+        items: List[Dict[str, Any]] = []
+        for release_id, score in hits:
+            row = by_id.get(release_id)
+            if row is None:
+                # Release deleted since it was indexed.
+                continue
+            items.append({
+                "id": row.id,
+                "version": row.version,
+                "notes": row.notes,
+                "score": score,
+                "method": "vector",
+            })
+        results.append(items)
+    return results
+
+
+def search_similar_releases_batch(
+    db: Session,
+    queries: Sequence[Tuple[str, Optional[Sequence[int]]]],
+    top_k: int = 3,
+) -> List[List[Dict[str, Any]]]:
+    """``search_similar_releases`` for many ``(query_text, project_ids)`` pairs.
+
+    With the in-memory index, all texts are embedded in one provider call and queries
+    sharing a scope are answered by one ``search_batch``. Other backends run per query.
+    """
+    if _embedding_enabled() and index_backend() == "memory":
+        try:
+            results: List[List[Tuple[int, float]]] = [[] for _ in queries]
+            live = [
+                i
+                for i, (query_text, project_ids) in enumerate(queries)
+                if query_text and (project_ids is None or len(project_ids) > 0)
+            ]
+            if live:
+                vectors = embed_batch([queries[i][0] for i in live])
+                index = get_release_index(db)
+                by_scope: Dict[Optional[Tuple[int, ...]], List[int]] = {}
+                for row, i in enumerate(live):
+                    project_ids = queries[i][1]
+                    key = None if project_ids is None else tuple(sorted(int(pid) for pid in project_ids))
+                    by_scope.setdefault(key, []).append(row)
+                for key, rows in by_scope.items():
+                    for row, hits in zip(rows, index.search_batch(vectors[rows], int(top_k), key)):
+                        results[live[row]] = hits
+            return _resolve_index_hits(db, results)
+        except Exception as exc:
+            logger.warning("Batched in-memory similarity search failed, searching per item: %s", exc)
+    return [
+        search_similar_releases(db, query_text, top_k, project_ids=project_ids)
+        for query_text, project_ids in queries
+    ]
+
+
+def search_similar_releases(
+    db: Session,
+    query_text: str,
+    top_k: int = 3,
+    *,
+    project_ids: Optional[Sequence[int]] = None,
+) -> List[Dict[str, Any]]:
+    """Similar releases within ``project_ids`` (see ``scope_project_ids``); None searches all."""
     if not query_text:
         return []
+    if project_ids is not None:
+        project_ids = [int(pid) for pid in project_ids]
+        if not project_ids:
+            return []
+    scope_params: Dict[str, Any] = {} if project_ids is None else {"pids": project_ids}
 
     if _embedding_enabled():
+        q_vec: Optional[np.ndarray] = None
+        if index_backend() == "memory":
+            try:
+                q_vec = embed_text(query_text)
+                return _search_memory_index(db, q_vec, top_k, project_ids)
+            except Exception as exc:
+                logger.warning("In-memory similarity search failed, falling back to SQL: %s", exc)
         try:
-            q_vec = _hash_to_vector_768(query_text)
+            if q_vec is None:
+                q_vec = embed_text(query_text)
+            # TiDB parses the vector literal from its JSON-style text form.
+            q_param = json.dumps(q_vec.tolist())
             # TiDB uses operator <-> for vector distance. We pass vector as JSON array string.
             try:
                 rows = db.execute(
-                    text(
+                    _scoped(
                         """
                         SELECT id, project_id, version, notes, (embedding <-> :q) AS distance
                         FROM releases
-                        WHERE embedding IS NOT NULL
+                        WHERE embedding IS NOT NULL {scope}
                         ORDER BY embedding <-> :q
                         LIMIT :k
-                        """
+                        """,
+                        project_ids,
                     ),
-                    {"q": str(q_vec), "k": int(top_k)},
+                    {"q": q_param, "k": int(top_k), **scope_params},
                 ).mappings().all()
             except Exception:
                 # Some dialects need explicit cast or different param style; try a second form
                 rows = db.execute(
-                    text(
+                    _scoped(
                         """
                         SELECT id, project_id, version, notes, (embedding <-> :q) AS distance
                         FROM releases
-                        WHERE embedding IS NOT NULL
+                        WHERE embedding IS NOT NULL {scope}
                         ORDER BY (embedding <-> :q)
                         LIMIT :k
-                        """
+                        """,
+                        project_ids,
                     ),
-                    {"q": str(q_vec), "k": int(top_k)},
+                    {"q": q_param, "k": int(top_k), **scope_params},
                 ).mappings().all()
 
             # Convert to similarity [0..1] via cosine-like heuristic: 1 / (1 + distance)
@@ -81,6 +204,7 @@ def search_similar_releases(db: Session, query_text: str, top_k: int = 3) -> Lis
                     "version": r["version"],
                     "notes": r["notes"],
                     "score": score,
+                    "method": "vector",
                 })
             return items
         except Exception as exc:
@@ -90,41 +214,45 @@ def search_similar_releases(db: Session, query_text: str, top_k: int = 3) -> Lis
     rows = []
     try:
         rows = db.execute(
-            text(
+            _scoped(
                 """
                 SELECT id, project_id, version, notes
                 FROM releases
-                WHERE MATCH(notes, version) AGAINST(:q IN NATURAL LANGUAGE MODE)
+                WHERE MATCH(notes, version) AGAINST(:q IN NATURAL LANGUAGE MODE) {scope}
                 LIMIT :k
-                """
+                """,
+                project_ids,
             ),
-            {"q": query_text, "k": int(top_k)},
+            {"q": query_text, "k": int(top_k), **scope_params},
         ).mappings().all()
     except Exception:
         # Poor-man fallback if FULLTEXT not available: simple LIKE search
         rows = db.execute(
-            text(
+            _scoped(
                 """
                 SELECT id, project_id, version, notes
                 FROM releases
-                WHERE (notes IS NOT NULL AND notes LIKE :like)
-                   OR version LIKE :like
+                WHERE ((notes IS NOT NULL AND notes LIKE :like) OR version LIKE :like) {scope}
                 LIMIT :k
-                """
+                """,
+                project_ids,
             ),
-            {"like": f"%{query_text}%", "k": int(top_k)},
+            {"like": f"%{query_text}%", "k": int(top_k), **scope_params},
         ).mappings().all()
 
-    # Crude textual score: higher for earlier rows
+    # Score text matches by MinHash-estimated Jaccard similarity of their word sets, so the
+    # first row is not 1.0 just for being first.
+    query_sig = release_signature(query_text, None)
     items: List[Dict[str, Any]] = []
-    for idx, r in enumerate(rows):
-        score = 1.0 / float(idx + 1)
+    for r in rows:
+        row_sig = release_signature(r["notes"] or r["version"], None)
+        score = estimate_jaccard(query_sig, row_sig) if query_sig is not None and row_sig is not None else 0.0
         items.append({
             "id": r["id"],
             "version": r["version"],
             "notes": r["notes"],
             "score": score,
+            "method": "text",
         })
+    items.sort(key=lambda item: -item["score"])
     return items
-
-
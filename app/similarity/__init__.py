@@ -0,0 +1,27 @@
+"""In-process vector similarity search for releases."""
+
+from .index import VectorIndex
+from .releases import (
+    decode_embedding,
+    get_release_index,
+    index_backend,
+    index_release_embedding,
+    reset_release_index,
+    save_release_index,
+    search_release_index,
+    start_index_save_timer,
+    stop_index_save_timer,
+)
+
+__all__ = [
+    "VectorIndex",
+    "decode_embedding",
+    "get_release_index",
+    "index_backend",
+    "index_release_embedding",
+    "reset_release_index",
+    "save_release_index",
+    "search_release_index",
+    "start_index_save_timer",
+    "stop_index_save_timer",
+]
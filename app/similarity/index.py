@@ -0,0 +1,315 @@
+"""In-memory cosine similarity index over float32 vectors.
+
+Vectors are L2-normalised on insert so a search is one matrix product followed by an
+``argpartition`` top-k. For large catalogs an optional IVF mode clusters the rows
+(spherical k-means) and only scans the ``nprobe`` closest clusters per query.
+
+Rows can carry an integer group (the release's project id). Each group keeps its own
+set of row positions, so a search restricted to some groups scans only their rows.
+"""
+
+from __future__ import annotations
+
+import os
+import tempfile
+import threading
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+
+
+INDEX_MODES = ("flat", "ivf")
+NO_GROUP = -1
+
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    matrix = np.asarray(matrix, dtype=np.float32)
+    if matrix.ndim == 1:
+        matrix = matrix[None, :]
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def _top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the ``k`` largest scores, best first."""
+    if scores.size <= k:
+        return np.argsort(-scores, kind="stable")
+    part = np.argpartition(-scores, k - 1)[:k]
+    return part[np.argsort(-scores[part], kind="stable")]
+
+
+class VectorIndex:
+    """Growable float32 matrix keyed by integer ids.
+
+    Not a general ANN library: flat search is exact, IVF trades a little recall for
+    scanning roughly ``nprobe / nlist`` of the rows. Thread-safe for concurrent readers
+    and a single writer via an internal lock.
+    """
+
+    def __init__(self, dim: int, *, mode: str = "flat", nprobe: int = 8, model_id: Optional[str] = None) -> None:
+        if mode not in INDEX_MODES:
+            raise ValueError(f"unknown index mode: {mode}")
+        self.dim = int(dim)
+        # Embedding model the vectors came from; persisted so stale files can be discarded.
+        self.model_id = model_id
+        # Highest source id pulled from the database, as opposed to ``max_id`` which also
+        # counts rows added directly; persisted so a reload resumes syncing from there.
+        self.synced_id = 0
+        # Set by full rebuilds; incremental saves keep the generation they were loaded from.
+        self.generation: Optional[str] = None
+        self.mode = mode
+        self.nprobe = max(int(nprobe), 1)
+        self._lock = threading.RLock()
+        self._ids = np.empty(0, dtype=np.int64)
+        self._vectors = np.empty((0, self.dim), dtype=np.float32)
+        self._assign = np.empty(0, dtype=np.int32)
+        self._groups = np.empty(0, dtype=np.int64)
+        self._centroids: Optional[np.ndarray] = None
+        self._size = 0
+        self._positions: Dict[int, int] = {}
+        self._members: Dict[int, Set[int]] = {}
+        # False for files written before groups existed; callers rebuild those.
+        self.grouped = True
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __contains__(self, item_id: int) -> bool:
+        return int(item_id) in self._positions
+
+    @property
+    def max_id(self) -> int:
+        with self._lock:
+            return int(self._ids[: self._size].max()) if self._size else 0
+
+    @property
+    def trained(self) -> bool:
+        return self._centroids is not None
+
+    def _reserve(self, extra: int) -> None:
+        needed = self._size + extra
+        capacity = self._vectors.shape[0]
+        if needed <= capacity:
+            return
+        new_capacity = max(needed, capacity * 2, 64)
+        vectors = np.empty((new_capacity, self.dim), dtype=np.float32)
+        vectors[: self._size] = self._vectors[: self._size]
+        ids = np.empty(new_capacity, dtype=np.int64)
+        ids[: self._size] = self._ids[: self._size]
+        assign = np.full(new_capacity, -1, dtype=np.int32)
+        assign[: self._size] = self._assign[: self._size]
+        groups = np.full(new_capacity, NO_GROUP, dtype=np.int64)
+        groups[: self._size] = self._groups[: self._size]
+        self._vectors, self._ids, self._assign, self._groups = vectors, ids, assign, groups
+
+    def _set_group(self, pos: int, group: int) -> None:
+        old = int(self._groups[pos])
+        if old in self._members:
+            self._members[old].discard(pos)
+            if not self._members[old]:
+                del self._members[old]
+        self._groups[pos] = group
+        self._members.setdefault(group, set()).add(pos)
+
+    def _nearest_centroids(self, rows: np.ndarray) -> np.ndarray:
+        assert self._centroids is not None
+        return np.argmax(rows @ self._centroids.T, axis=1).astype(np.int32)
+
+    def group_size(self, group: int) -> int:
+        return len(self._members.get(int(group), ()))
+
+    def add(self, ids: Sequence[int], vectors: np.ndarray, groups: Optional[Sequence[int]] = None) -> None:
+        """Insert or replace rows for ``ids``, optionally tagging each with a group."""
+        rows = _normalize(vectors)
+        if rows.shape != (len(ids), self.dim):
+            raise ValueError(f"expected {len(ids)} vectors of dim {self.dim}, got {rows.shape}")
+        if groups is not None and len(groups) != len(ids):
+            raise ValueError(f"expected {len(ids)} groups, got {len(groups)}")
+        with self._lock:
+            self._reserve(len(ids))
+            assign = self._nearest_centroids(rows) if self._centroids is not None else None
+            for offset, item_id in enumerate(ids):
+                item_id = int(item_id)
+                pos = self._positions.get(item_id)
+                if pos is None:
+                    pos = self._size
+                    self._size += 1
+                    self._positions[item_id] = pos
+                    self._ids[pos] = item_id
+                    self._groups[pos] = NO_GROUP
+                self._vectors[pos] = rows[offset]
+                self._assign[pos] = assign[offset] if assign is not None else -1
+                self._set_group(pos, int(groups[offset]) if groups is not None else NO_GROUP)
+
+    def remove(self, ids: Iterable[int]) -> int:
+        removed = 0
+        with self._lock:
+            for item_id in ids:
+                pos = self._positions.pop(int(item_id), None)
+                if pos is None:
+                    continue
+                last = self._size - 1
+                group = int(self._groups[pos])
+                self._members[group].discard(pos)
+                if not self._members[group]:
+                    del self._members[group]
+                if pos != last:
+                    moved = int(self._ids[last])
+                    moved_group = int(self._groups[last])
+                    self._ids[pos] = moved
+                    self._vectors[pos] = self._vectors[last]
+                    self._assign[pos] = self._assign[last]
+                    self._groups[pos] = moved_group
+                    self._members[moved_group].discard(last)
+                    self._members[moved_group].add(pos)
+                    self._positions[moved] = pos
+                self._size -= 1
+                removed += 1
+        return removed
+
+    def train(self, nlist: Optional[int] = None, *, iterations: int = 10, seed: int = 0) -> None:
+        """Cluster current rows into ``nlist`` lists (default ~sqrt(n)) for IVF search."""
+        with self._lock:
+            data = self._vectors[: self._size]
+            if self._size == 0:
+                return
+            nlist = int(nlist or max(int(np.sqrt(self._size)), 1))
+            nlist = min(nlist, self._size)
+            rng = np.random.default_rng(seed)
+            sample = data
+            if self._size > nlist * 256:
+                sample = data[rng.choice(self._size, nlist * 256, replace=False)]
+            centroids = sample[rng.choice(sample.shape[0], nlist, replace=False)].copy()
+            for _ in range(max(iterations, 1)):
+                labels = np.argmax(sample @ centroids.T, axis=1)
+                for c in range(nlist):
+                    members = sample[labels == c]
+                    if members.shape[0]:
+                        centroids[c] = members.mean(axis=0)
+                centroids = _normalize(centroids)
+            self._centroids = centroids
+            self._assign[: self._size] = self._nearest_centroids(data)
+
+    def _candidates(self, query: np.ndarray) -> Optional[np.ndarray]:
+        if self.mode != "ivf" or self._centroids is None:
+            return None
+        probes = _top_k(self._centroids @ query, min(self.nprobe, self._centroids.shape[0]))
+        return np.nonzero(np.isin(self._assign[: self._size], probes))[0]
+
+    def _group_rows(self, groups: Iterable[int]) -> np.ndarray:
+        positions: List[int] = []
+        for group in set(int(g) for g in groups):
+            positions.extend(self._members.get(group, ()))
+        return np.sort(np.asarray(positions, dtype=np.int64))
+
+    def search_batch(
+        self, queries: np.ndarray, k: int, groups: Optional[Iterable[int]] = None
+    ) -> List[List[Tuple[int, float]]]:
+        """Top-``k`` ``(id, cosine)`` pairs for each query row, best first.
+
+        With ``groups`` only rows tagged with one of those groups are scanned (exactly,
+        even in IVF mode, since a single shard is small relative to the catalog).
+        """
+        q = _normalize(queries)
+        if q.shape[1] != self.dim:
+            raise ValueError(f"query dim {q.shape[1]} does not match index dim {self.dim}")
+        k = max(int(k), 1)
+        with self._lock:
+            if self._size == 0:
+                return [[] for _ in range(q.shape[0])]
+            if groups is not None:
+                rows = self._group_rows(groups)
+                if rows.size == 0:
+                    return [[] for _ in range(q.shape[0])]
+                shard_ids = self._ids[rows]
+                scores = q @ self._vectors[rows].T
+                return [[(int(shard_ids[i]), float(row[i])) for i in _top_k(row, k)] for row in scores]
+            vectors = self._vectors[: self._size]
+            ids = self._ids[: self._size]
+            if self.mode != "ivf" or self._centroids is None:
+                scores = q @ vectors.T
+                results = []
+                for row in scores:
+                    best = _top_k(row, k)
+                    results.append([(int(ids[i]), float(row[i])) for i in best])
+                return results
+            results = []
+            for row in q:
+                rows = self._candidates(row)
+                if rows is None or rows.size == 0:
+                    results.append([])
+                    continue
+                scores = vectors[rows] @ row
+                best = _top_k(scores, k)
+                results.append([(int(ids[rows[i]]), float(scores[i])) for i in best])
+            return results
+
+    def search(self, query: np.ndarray, k: int, groups: Optional[Iterable[int]] = None) -> List[Tuple[int, float]]:
+        return self.search_batch(np.asarray(query, dtype=np.float32)[None, :], k, groups)[0]
+
+    def save(self, path: str) -> None:
+        """Atomically write the index to ``path`` (npz)."""
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # Workers and the backfill script share ``path``, so each save gets its own temp file.
+        fd, tmp_path = tempfile.mkstemp(dir=directory or ".", prefix=".tmp-", suffix=".npz")
+        with self._lock:
+            arrays = {
+                "dim": np.asarray(self.dim),
+                "ids": self._ids[: self._size],
+                "vectors": self._vectors[: self._size],
+                "assign": self._assign[: self._size],
+                "groups": self._groups[: self._size],
+                "synced_id": np.asarray(self.synced_id, dtype=np.int64),
+            }
+            if self._centroids is not None:
+                arrays["centroids"] = self._centroids
+            if self.model_id is not None:
+                arrays["model_id"] = np.asarray(self.model_id)
+            if self.generation is not None:
+                arrays["generation"] = np.asarray(self.generation)
+            try:
+                with os.fdopen(fd, "wb") as fh:
+                    np.savez(fh, **arrays)
+            except BaseException:
+                os.unlink(tmp_path)
+                raise
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def read_generation(path: str) -> Optional[str]:
+        """The rebuild generation stored in ``path`` without loading the vectors."""
+        with np.load(path) as data:
+            return str(data["generation"]) if "generation" in data.files else None
+
+    @classmethod
+    def load(cls, path: str, *, mode: str = "flat", nprobe: int = 8) -> "VectorIndex":
+        with np.load(path) as data:
+            model_id = str(data["model_id"]) if "model_id" in data.files else None
+            index = cls(int(data["dim"]), mode=mode, nprobe=nprobe, model_id=model_id)
+            ids = data["ids"].astype(np.int64)
+            size = ids.shape[0]
+            index._reserve(size)
+            index._ids[:size] = ids
+            index._vectors[:size] = data["vectors"]
+            index._assign[:size] = data["assign"]
+            index._size = size
+            # Files written before the watermark was persisted resync from the start.
+            index.synced_id = int(data["synced_id"]) if "synced_id" in data.files else 0
+            index.generation = str(data["generation"]) if "generation" in data.files else None
+            index._positions = {int(v): i for i, v in enumerate(ids)}
+            if "groups" in data.files:
+                index._groups[:size] = data["groups"]
+            else:
+                index._groups[:size] = NO_GROUP
+                index.grouped = False
+            for pos, group in enumerate(index._groups[:size].tolist()):
+                index._members.setdefault(int(group), set()).add(pos)
+            if "centroids" in data.files:
+                index._centroids = data["centroids"].astype(np.float32)
+        return index
+
+
+__all__ = ["INDEX_MODES", "NO_GROUP", "VectorIndex"]
@@ -0,0 +1,246 @@
+"""MinHash LSH near-duplicate detection over release notes and artifact filenames.
+
+Each release gets a 64-permutation MinHash signature (256 bytes in ``releases.minhash``)
+over normalized note words/bigrams plus artifact filename tokens. The signature is split
+into 16 bands of 4 rows; each band hashes to a bucket stored in ``release_lsh_bands``,
+so candidates come from an indexed lookup instead of a scan. Candidate scores are the
+MinHash estimate of Jaccard similarity (standard error <= 1/16 with 64 permutations).
+"""
+
+from __future__ import annotations
+
+import hashlib
+import os
+import re
+from typing import Dict, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+from sqlalchemy import delete, select, tuple_
+from sqlalchemy.orm import Session
+
+from .. import models
+
+
+NUM_PERM = 64
+BANDS = 16
+ROWS_PER_BAND = NUM_PERM // BANDS
+SIGNATURE_BYTES = NUM_PERM * 4
+
+_PRIME = np.uint64((1 << 31) - 1)
+_rng = np.random.default_rng(0x5EED)
+# Fixed coefficients so signatures are stable across processes and restarts.
+_A = _rng.integers(1, int(_PRIME), size=NUM_PERM, dtype=np.uint64)
+_B = _rng.integers(0, int(_PRIME), size=NUM_PERM, dtype=np.uint64)
+_TOKEN_RE = re.compile(r"[a-z0-9]+(?:\.[a-z0-9]+)*")
+_VERSION_SPLIT_RE = re.compile(r"[^a-z0-9]+")
+
+
+def near_dup_threshold() -> float:
+    try:
+        return float(os.getenv("NEAR_DUP_THRESHOLD", "0.8"))
+    except ValueError:
+        return 0.8
+
+
+def features(notes: Optional[str], artifact_url: Optional[str] = None) -> Set[str]:
+    """Note unigrams and bigrams plus ``f:``-prefixed filename tokens."""
+    words = _TOKEN_RE.findall((notes or "").lower())
+    feats: Set[str] = set(words)
+    feats.update(f"{a} {b}" for a, b in zip(words, words[1:]))
+    if artifact_url:
+        filename = artifact_url.rsplit("/", 1)[-1].split("?", 1)[0].lower()
+        feats.update(f"f:{token}" for token in _VERSION_SPLIT_RE.split(filename) if token)
+    return feats
+
+
+def signature(feats: Set[str]) -> Optional[np.ndarray]:
+    """64 x uint32 MinHash signature, or None for an empty feature set."""
+    if not feats:
+        return None
+    hashed = np.fromiter(
+        (int.from_bytes(hashlib.blake2b(f.encode("utf-8"), digest_size=4).digest(), "little") for f in feats),
+        dtype=np.uint64,
+        count=len(feats),
+    ) % _PRIME
+    # (a * x + b) mod p for every permutation/feature pair; values stay below 2**63.
+    permuted = (np.outer(_A, hashed) + _B[:, None]) % _PRIME
+    return permuted.min(axis=1).astype(np.uint32)
+
+
+def encode_signature(sig: np.ndarray) -> bytes:
+    return sig.astype("<u4").tobytes()
+
+
+def decode_signature(raw: Optional[bytes]) -> Optional[np.ndarray]:
+    if raw is None or len(raw) != SIGNATURE_BYTES:
+        return None
+    return np.frombuffer(bytes(raw), dtype="<u4")
+
+
+def estimate_jaccard(a: np.ndarray, b: np.ndarray) -> float:
+    return float(np.count_nonzero(a == b)) / float(NUM_PERM)
+
+
+def band_buckets(sig: np.ndarray) -> List[Tuple[int, int]]:
+    """``(band, bucket)`` pairs; buckets are signed 64-bit hashes of each band's rows."""
+    raw = sig.astype("<u4").tobytes()
+    step = ROWS_PER_BAND * 4
+    buckets: List[Tuple[int, int]] = []
+    for band in range(BANDS):
+        digest = hashlib.blake2b(raw[band * step : (band + 1) * step], digest_size=8).digest()
+        buckets.append((band, int.from_bytes(digest, "big", signed=True)))
+    return buckets
+
+
+def release_signature(notes: Optional[str], artifact_url: Optional[str]) -> Optional[np.ndarray]:
+    return signature(features(notes, artifact_url))
+
+
+def index_release_minhash(db: Session, release: models.Release, *, replace: bool = True) -> Optional[np.ndarray]:
+    """Store the signature and LSH buckets for ``release`` (added to the session, not committed).
+
+    Pass ``replace=False`` for a release inserted in this transaction to skip deleting
+    bucket rows it cannot have yet.
+    """
+    sig = release_signature(release.notes, release.artifact_url)
+    release.minhash = encode_signature(sig) if sig is not None else None
+    if release.id is None:
+        db.flush()
+    if replace:
+        db.execute(delete(models.ReleaseLSHBand).where(models.ReleaseLSHBand.release_id == release.id))
+    if sig is not None:
+        db.add_all(
+            models.ReleaseLSHBand(release_id=int(release.id), band=band, bucket=bucket)
+            for band, bucket in band_buckets(sig)
+        )
+    return sig
+
+
+def find_near_duplicates(
+    db: Session,
+    notes: Optional[str],
+    artifact_url: Optional[str],
+    *,
+    top_k: int = 3,
+    min_score: float = 0.0,
+    exclude_ids: Sequence[int] = (),
+    project_ids: Optional[Sequence[int]] = None,
+) -> List[Dict[str, object]]:
+    """Releases sharing at least one LSH band, scored by estimated Jaccard similarity.
+
+    ``project_ids`` restricts candidates to those projects; None searches every release.
+    """
+    sig = release_signature(notes, artifact_url)
+    if sig is None:
+        return []
+    bands = models.ReleaseLSHBand
+    matches = tuple_(bands.band, bands.bucket).in_(band_buckets(sig))
+    query = (
+        select(models.Release.id, models.Release.version, models.Release.notes, models.Release.minhash)
+        .where(models.Release.id.in_(select(bands.release_id).where(matches)))
+    )
+    if exclude_ids:
+        query = query.where(models.Release.id.notin_(list(exclude_ids)))
+    if project_ids is not None:
+        query = query.where(models.Release.project_id.in_([int(pid) for pid in project_ids]))
+
+    scored: List[Dict[str, object]] = []
+    for row in db.execute(query).all():
+        other = decode_signature(row.minhash)
+        if other is None:
+            continue
+        score = estimate_jaccard(sig, other)
+        if score >= min_score:
+            scored.append({"id": row.id, "version": row.version, "notes": row.notes, "score": score})
+    scored.sort(key=lambda item: (-float(item["score"]), int(item["id"])))
+    return scored[: max(int(top_k), 0)]
+
+
+def find_near_duplicates_batch(
+    db: Session,
+    items: Sequence[Tuple[Optional[str], Optional[str], Optional[Sequence[int]]]],
+    *,
+    top_k: int = 3,
+) -> List[List[Dict[str, object]]]:
+    """``find_near_duplicates`` for many ``(notes, artifact_url, project_ids)`` items.
+
+    Uses two queries in total: one for every item's band buckets, one for the candidate
+    signatures. Each item then only scores candidates that share one of its buckets.
+    """
+    sigs = [release_signature(notes, url) for notes, url, _ in items]
+    item_buckets = [set(band_buckets(sig)) if sig is not None else set() for sig in sigs]
+    all_buckets = set().union(*item_buckets) if item_buckets else set()
+    if not all_buckets:
+        return [[] for _ in items]
+
+    bands = models.ReleaseLSHBand
+    matches = tuple_(bands.band, bands.bucket).in_(sorted(all_buckets))
+    by_bucket: Dict[Tuple[int, int], Set[int]] = {}
+    for row in db.execute(select(bands.band, bands.bucket, bands.release_id).where(matches)).all():
+        by_bucket.setdefault((int(row.band), int(row.bucket)), set()).add(int(row.release_id))
+    candidate_ids = set().union(*by_bucket.values()) if by_bucket else set()
+    releases = {}
+    if candidate_ids:
+        for row in db.execute(
+            select(
+                models.Release.id,
+                models.Release.project_id,
+                models.Release.version,
+                models.Release.notes,
+                models.Release.minhash,
+            ).where(models.Release.id.in_(candidate_ids))
+        ).all():
+            releases[int(row.id)] = row
+
+    results: List[List[Dict[str, object]]] = []
+    for (_, _, project_ids), sig, buckets in zip(items, sigs, item_buckets):
+        allowed = None if project_ids is None else {int(pid) for pid in project_ids}
+        matched: Set[int] = set()
+        for key in buckets:
+            matched |= by_bucket.get(key, set())
+        scored: List[Dict[str, object]] = []
+        for release_id in matched:
+            row = releases.get(release_id)
+            other = decode_signature(row.minhash) if row is not None else None
+            if other is None or (allowed is not None and int(row.project_id) not in allowed):
+                continue
+            scored.append({"id": row.id, "version": row.version, "notes": row.notes, "score": estimate_jaccard(sig, other)})
+        scored.sort(key=lambda item: (-float(item["score"]), int(item["id"])))
+        results.append(scored[: max(int(top_k), 0)])
+    return results
+
+
+def backfill_release_minhash(db: Session, *, batch_size: int = 500) -> int:
+    """Sign releases that have no ``minhash`` yet, committing per keyset batch."""
+    done = 0
+    last_id = 0
+    while True:
+        releases = db.scalars(
+            select(models.Release)
+            .where(models.Release.id > last_id, models.Release.minhash.is_(None))
+            .order_by(models.Release.id.asc())
+            .limit(batch_size)
+        ).all()
+        if not releases:
+            return done
+        for release in releases:
+            if index_release_minhash(db, release) is not None:
+                done += 1
+        db.commit()
+        last_id = int(releases[-1].id)
+
+
+__all__ = [
+    "NUM_PERM",
+    "BANDS",
+    "near_dup_threshold",
+    "features",
+    "signature",
+    "estimate_jaccard",
+    "band_buckets",
+    "release_signature",
+    "index_release_minhash",
+    "find_near_duplicates",
+    "find_near_duplicates_batch",
+    "backfill_release_minhash",
+]
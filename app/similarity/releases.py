@@ -0,0 +1,319 @@
+"""Process-wide similarity index over ``releases.embedding``, sharded by project id."""
+
+from __future__ import annotations
+
+import logging
+import os
+import threading
+import time
+import uuid
+from typing import Iterable, List, Optional, Tuple, Union
+
+import numpy as np
+from sqlalchemy import or_, select
+from sqlalchemy.orm import Session
+
+from .. import models
+from ..embeddings.codec import decode_embedding as _decode_stored
+from ..embeddings.providers import HashEmbeddingProvider, get_provider
+from .index import INDEX_MODES, VectorIndex
+from ..utils.env import env_float
+
+
+logger = logging.getLogger("routeforge.similarity")
+
+_SYNC_BATCH = 1000
+
+_index: Optional[VectorIndex] = None
+_lock = threading.Lock()
+_last_sync = 0.0
+_last_save = 0.0
+_dirty = False
+# Highest release id pulled from the DB. Kept apart from the index's own max id because
+# releases published by this process are added directly and may overtake other writers.
+_synced_id = 0
+# mtime of the index file this process last loaded, wrote or checked. Every worker saves
+# its own view to the shared path, so a newer file is only reloaded when it carries a new
+# rebuild generation (written by rebuild_release_index, e.g. scripts/backfill_embeddings.py).
+_file_mtime: Optional[float] = None
+_save_stop: Optional[threading.Event] = None
+
+
+def index_backend() -> str:
+    """``SIMILARITY_INDEX``: ``memory`` (default) or ``db`` to use TiDB vector SQL only."""
+    backend = (os.getenv("SIMILARITY_INDEX") or "memory").strip().lower()
+    return backend if backend in {"memory", "db"} else "memory"
+
+
+def index_path() -> str:
+    return os.getenv("SIMILARITY_INDEX_PATH", "tmp/similarity/releases.npz")
+
+
+def _index_mode() -> str:
+    mode = (os.getenv("SIMILARITY_INDEX_MODE") or "flat").strip().lower()
+    return mode if mode in INDEX_MODES else "flat"
+
+
+def decode_embedding(raw: Union[bytes, bytearray, memoryview, str, None]) -> Optional[np.ndarray]:
+    """Decode a stored embedding, rejecting vectors of the wrong dimension."""
+    vector = _decode_stored(raw)
+    if vector is None or vector.shape[0] != get_provider().dim:
+        return None
+    return vector
+
+
+def _load_or_create() -> VectorIndex:
+    mode = _index_mode()
+    nprobe = int(env_float("SIMILARITY_IVF_NPROBE", 8))
+    path = index_path()
+    provider = get_provider()
+    if os.path.exists(path):
+        try:
+            index = VectorIndex.load(path, mode=mode, nprobe=nprobe)
+            if not index.grouped:
+                logger.info("Similarity index at %s predates project shards; rebuilding from the DB", path)
+                return VectorIndex(provider.dim, mode=mode, nprobe=nprobe, model_id=provider.model_id)
+            if index.dim == provider.dim and index.model_id in (None, provider.model_id):
+                logger.info("Loaded similarity index path=%s size=%s", path, len(index))
+                index.model_id = provider.model_id
+                return index
+            logger.warning("Ignoring similarity index for model=%s dim=%s at %s", index.model_id, index.dim, path)
+        except Exception as exc:
+            logger.warning("Failed to load similarity index from %s: %s", path, exc)
+    return VectorIndex(provider.dim, mode=mode, nprobe=nprobe, model_id=provider.model_id)
+
+
+def _current_file_mtime() -> Optional[float]:
+    try:
+        return os.path.getmtime(index_path())
+    except OSError:
+        return None
+
+
+def _file_generation() -> Optional[str]:
+    try:
+        return VectorIndex.read_generation(index_path())
+    except Exception as exc:
+        logger.warning("Failed to read similarity index generation: %s", exc)
+        return None
+
+
+def _sync_from_db(db: Session, index: VectorIndex, last_id: int) -> Tuple[int, int]:
+    """Pull releases with id > ``last_id`` in keyset batches; returns (added, new watermark)."""
+    added = 0
+    model_filter = models.Release.embedding_model == index.model_id
+    if index.model_id == HashEmbeddingProvider().model_id:
+        # Rows without embedding_model predate model tracking and came from the hash stub.
+        model_filter = or_(model_filter, models.Release.embedding_model.is_(None))
+    while True:
+        rows = db.execute(
+            select(models.Release.id, models.Release.project_id, models.Release.embedding)
+            .where(models.Release.id > last_id, models.Release.embedding.isnot(None), model_filter)
+            .order_by(models.Release.id.asc())
+            .limit(_SYNC_BATCH)
+        ).all()
+        if not rows:
+            break
+        ids: List[int] = []
+        groups: List[int] = []
+        vectors: List[np.ndarray] = []
+        for row in rows:
+            vector = decode_embedding(row.embedding)
+            if vector is not None:
+                ids.append(int(row.id))
+                groups.append(int(row.project_id))
+                vectors.append(vector)
+        if ids:
+            index.add(ids, np.vstack(vectors), groups)
+            added += len(ids)
+        last_id = int(rows[-1].id)
+        if len(rows) < _SYNC_BATCH:
+            break
+    return added, last_id
+
+
+def _maybe_train(index: VectorIndex) -> None:
+    if index.mode != "ivf" or index.trained:
+        return
+    if len(index) >= int(env_float("SIMILARITY_IVF_MIN_SIZE", 20000)):
+        started = time.perf_counter()
+        index.train()
+        logger.info("Trained IVF similarity index size=%s in %.1fms", len(index), (time.perf_counter() - started) * 1000)
+
+
+def get_release_index(db: Session) -> VectorIndex:
+    """Return the shared index, loading it on first use and catching up with new releases.
+
+    The catch-up query runs at most every ``SIMILARITY_INDEX_SYNC_SEC`` seconds (default 30).
+    """
+    global _index, _last_sync, _dirty, _synced_id, _file_mtime
+    with _lock:
+        now = time.monotonic()
+        due = now - _last_sync >= env_float("SIMILARITY_INDEX_SYNC_SEC", 30.0)
+        if _index is not None and due:
+            mtime = _current_file_mtime()
+            if mtime is not None and (_file_mtime is None or mtime > _file_mtime):
+                _file_mtime = mtime
+                generation = _file_generation()
+                if generation is not None and generation != _index.generation:
+                    logger.info("Similarity index rebuilt on disk (generation=%s); reloading", generation)
+                    _index = None
+        if _index is None:
+            _file_mtime = _current_file_mtime()
+            _index = _load_or_create()
+            # The file's max id may include releases another process added directly, so
+            # resume from the DB watermark it was saved with, never from max_id.
+            _synced_id = _index.synced_id
+            due = True
+        index = _index
+        if not due:
+            return index
+        _last_sync = now
+        since_id = _synced_id
+    added, watermark = _sync_from_db(db, index, since_id)
+    with _lock:
+        _synced_id = max(_synced_id, watermark)
+    if added:
+        logger.info("Similarity index synced %s releases (size=%s)", added, len(index))
+        _maybe_train(index)
+        with _lock:
+            _dirty = True
+    return index
+
+
+def index_release_embedding(
+    release_id: int, embedding: Union[bytes, str, np.ndarray], project_id: Optional[int] = None
+) -> bool:
+    """Add a freshly published release to its project's shard. Returns False if it was skipped."""
+    global _dirty
+    index = _index
+    if index is None:
+        # Not loaded in this process yet; the first search will pick it up from the DB.
+        return False
+    vector = embedding if isinstance(embedding, np.ndarray) else decode_embedding(embedding)
+    if vector is None:
+        return False
+    index.add([int(release_id)], vector, None if project_id is None else [int(project_id)])
+    _maybe_train(index)
+    with _lock:
+        _dirty = True
+    return True
+
+
+def save_release_index(force: bool = False) -> bool:
+    """Persist the index if it changed, at most every ``SIMILARITY_INDEX_SAVE_SEC`` (default 60).
+
+    Request handlers only mark the index dirty; the save timer (``start_index_save_timer``)
+    and shutdown do the writing.
+    """
+    global _last_save, _dirty, _file_mtime
+    with _lock:
+        index = _index
+        if index is None or not _dirty:
+            return False
+        now = time.monotonic()
+        if not force and now - _last_save < env_float("SIMILARITY_INDEX_SAVE_SEC", 60.0):
+            return False
+        _last_save = now
+        _dirty = False
+        index.synced_id = _synced_id
+    generation = _file_generation() if os.path.exists(index_path()) else index.generation
+    if generation != index.generation:
+        # A rebuild landed since this index was loaded; keep it and reload on the next sync.
+        logger.info("Skipping similarity index save: file has newer generation %s", generation)
+        return False
+    try:
+        index.save(index_path())
+    except Exception as exc:
+        logger.warning("Failed to persist similarity index: %s", exc)
+        with _lock:
+            _dirty = True
+        return False
+    with _lock:
+        _file_mtime = _current_file_mtime()
+    return True
+
+
+def _save_loop(stop: threading.Event, interval: float) -> None:
+    while not stop.wait(interval):
+        try:
+            save_release_index(force=True)
+        except Exception as exc:
+            logger.warning("Periodic similarity index save failed: %s", exc)
+
+
+def start_index_save_timer() -> None:
+    """Save the index every ``SIMILARITY_INDEX_SAVE_SEC`` off the request path (call at startup)."""
+    global _save_stop
+    if index_backend() != "memory":
+        return
+    with _lock:
+        if _save_stop is not None:
+            return
+        _save_stop = threading.Event()
+        stop = _save_stop
+    interval = max(env_float("SIMILARITY_INDEX_SAVE_SEC", 60.0), 1.0)
+    threading.Thread(target=_save_loop, args=(stop, interval), name="similarity-index-save", daemon=True).start()
+
+
+def stop_index_save_timer() -> None:
+    global _save_stop
+    with _lock:
+        stop, _save_stop = _save_stop, None
+    if stop is not None:
+        stop.set()
+
+
+def rebuild_release_index(db: Session, *, path: Optional[str] = None) -> VectorIndex:
+    """Build a fresh index from every current-model embedding and write it to disk.
+
+    The file gets a new generation, so running servers replace their index with it on
+    their next sync.
+    """
+    provider = get_provider()
+    index = VectorIndex(
+        provider.dim,
+        mode=_index_mode(),
+        nprobe=int(env_float("SIMILARITY_IVF_NPROBE", 8)),
+        model_id=provider.model_id,
+    )
+    index.generation = uuid.uuid4().hex
+    added, index.synced_id = _sync_from_db(db, index, 0)
+    _maybe_train(index)
+    index.save(path or index_path())
+    logger.info("Rebuilt similarity index size=%s model=%s", added, provider.model_id)
+    return index
+
+
+def search_release_index(
+    db: Session, vector: np.ndarray, top_k: int, project_ids: Optional[Iterable[int]] = None
+) -> List[Tuple[int, float]]:
+    """Top-k over the given projects' shards, or over every release when ``project_ids`` is None."""
+    return get_release_index(db).search(vector, top_k, project_ids)
+
+
+def reset_release_index() -> None:
+    """Drop the in-memory index (tests, or after a full embedding rebuild)."""
+    global _index, _last_sync, _last_save, _dirty, _synced_id, _file_mtime
+    with _lock:
+        _index = None
+        _synced_id = 0
+        _file_mtime = None
+        _last_sync = 0.0
+        _last_save = 0.0
+        _dirty = False
+
+
+__all__ = [
+    "index_backend",
+    "index_path",
+    "decode_embedding",
+    "get_release_index",
+    "index_release_embedding",
+    "save_release_index",
+    "start_index_save_timer",
+    "stop_index_save_timer",
+    "rebuild_release_index",
+    "search_release_index",
+    "reset_release_index",
+]
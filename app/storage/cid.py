@@ -0,0 +1,106 @@
+"""Local IPFS CIDv1 computation, so a pin's CID is known before the upload.
+
+Content that fits in one chunk gets a ``raw`` CID (sha2-256 of the bytes). Larger content is
+laid out like ``ipfs add --cid-version=1`` with raw leaves, and Pinata behaves the same with
+``cidVersion=1``. The content is split into ``chunk_size`` chunks (default 256 KiB), and the
+leaves are linked through a balanced UnixFS ``dag-pb`` tree of at most ``max_links`` (174)
+children per node. The result is a base32 CIDv1 string (``bafk…`` for raw, ``bafy…`` for
+dag-pb).
+"""
+
+from __future__ import annotations
+
+import base64
+import hashlib
+from typing import List, Tuple
+
+
+RAW_CODEC = 0x55
+DAG_PB_CODEC = 0x70
+SHA2_256 = 0x12
+
+DEFAULT_CHUNK_SIZE = 256 * 1024
+DEFAULT_MAX_LINKS = 174
+
+_UNIXFS_FILE = 2
+
+
+def _varint(value: int) -> bytes:
+    out = bytearray()
+    while True:
+        byte = value & 0x7F
+        value >>= 7
+        if value:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return bytes(out)
+
+
+def _field(number: int, wire_type: int) -> bytes:
+    return _varint((number << 3) | wire_type)
+
+
+def _bytes_field(number: int, payload: bytes) -> bytes:
+    return _field(number, 2) + _varint(len(payload)) + payload
+
+
+def _multihash(data: bytes) -> bytes:
+    digest = hashlib.sha256(data).digest()
+    return _varint(SHA2_256) + _varint(len(digest)) + digest
+
+
+def cid_bytes(codec: int, data: bytes) -> bytes:
+    return _varint(1) + _varint(codec) + _multihash(data)
+
+
+def encode_cid(raw: bytes) -> str:
+    """Multibase base32 (lowercase, unpadded) text form of a binary CID."""
+    return "b" + base64.b32encode(raw).decode("ascii").lower().rstrip("=")
+
+
+def _unixfs_file(filesize: int, blocksizes: List[int]) -> bytes:
+    data = _field(1, 0) + _varint(_UNIXFS_FILE) + _field(3, 0) + _varint(filesize)
+    for size in blocksizes:
+        data += _field(4, 0) + _varint(size)
+    return data
+
+
+def _dag_pb_node(links: List[Tuple[bytes, int]], data: bytes) -> bytes:
+    # Canonical dag-pb puts Links (field 2) before Data (field 1). Names are empty but present.
+    out = b""
+    for cid, tsize in links:
+        link = _bytes_field(1, cid) + _bytes_field(2, b"") + _field(3, 0) + _varint(tsize)
+        out += _bytes_field(2, link)
+    return out + _bytes_field(1, data)
+
+
+def compute_cid(
+    content: bytes, *, chunk_size: int = DEFAULT_CHUNK_SIZE, max_links: int = DEFAULT_MAX_LINKS
+) -> str:
+    """CIDv1 of ``content`` as an IPFS file with raw leaves and a balanced layout."""
+    if len(content) <= chunk_size:
+        return encode_cid(cid_bytes(RAW_CODEC, content))
+
+    # (cid, file bytes below this node, cumulative dag size)
+    level: List[Tuple[bytes, int, int]] = []
+    view = memoryview(content)
+    for offset in range(0, len(content), chunk_size):
+        chunk = bytes(view[offset : offset + chunk_size])
+        level.append((cid_bytes(RAW_CODEC, chunk), len(chunk), len(chunk)))
+
+    while len(level) > 1:
+        parents: List[Tuple[bytes, int, int]] = []
+        for start in range(0, len(level), max_links):
+            children = level[start : start + max_links]
+            filesize = sum(child[1] for child in children)
+            node = _dag_pb_node(
+                [(child[0], child[2]) for child in children],
+                _unixfs_file(filesize, [child[1] for child in children]),
+            )
+            parents.append((cid_bytes(DAG_PB_CODEC, node), filesize, len(node) + sum(child[2] for child in children)))
+        level = parents
+    return encode_cid(level[0][0])
+
+
+__all__ = ["DEFAULT_CHUNK_SIZE", "DEFAULT_MAX_LINKS", "cid_bytes", "encode_cid", "compute_cid"]
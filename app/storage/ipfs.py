@@ -38,19 +38,37 @@ def _detect_provider() -> Tuple[Optional[str], Optional[str]]:
     return None, None
 
 
-def pin_bytes(filename: str, content: bytes) -> Optional[str]:
+def ipfs_enabled() -> bool:
+    return _detect_provider()[0] is not None
+
+
+def provider_layout_matches(size: int, chunk_size: int) -> bool:
+    """Whether the provider stores ``size`` bytes under the CID app/storage/cid.py computes.
+
+    Pinata (``cidVersion=1``) chunks like ``ipfs add``. web3.storage builds its own DAG, so
+    only content that fits in one chunk (a single ``raw`` block) is guaranteed to match.
+    """
+    provider = _detect_provider()[0]
+    if provider in {"pinata", "pinata_basic"}:
+        return True
+    return size <= chunk_size
+
+
+def pin_bytes(filename: str, content: bytes, *, client: Optional[httpx.Client] = None) -> Optional[str]:
+    """Upload synchronously and return the provider's CID (see pin_queue for the async path)."""
     provider, token = _detect_provider()
     if provider is None:
         logger.info("IPFS provider not configured; skipping pin.")
         return None
 
     try:
+        http = client or httpx
         if provider == "web3":
-            return _pin_web3(filename, content, token)
+            return _pin_web3(http, filename, content, token)
         if provider == "pinata":
-            return _pin_pinata_jwt(filename, content, token)
+            return _pin_pinata_jwt(http, filename, content, token)
         if provider == "pinata_basic":
-            return _pin_pinata_basic(filename, content, token)
+            return _pin_pinata_basic(http, filename, content, token)
     except Exception as exc:
         logger.warning("IPFS pin failed via %s: %s", provider, exc)
         return None
@@ -64,7 +82,7 @@ def pin_json(obj: Dict[str, Any], *, filename: str = "metadata.json") -> Optiona
     return pin_bytes(filename, payload)
 
 
-def _pin_web3(filename: str, content: bytes, token: Optional[str]) -> Optional[str]:
+def _pin_web3(http, filename: str, content: bytes, token: Optional[str]) -> Optional[str]:
     if not token:
         raise RuntimeError("WEB3_STORAGE_TOKEN missing")
     headers = {
@@ -72,35 +90,51 @@ def _pin_web3(filename: str, content: bytes, token: Optional[str]) -> Optional[s
         "X-NAME": filename,
         "Content-Type": "application/octet-stream",
     }
-    resp = httpx.post("https://api.web3.storage/upload", headers=headers, content=content, timeout=30.0)
+    resp = http.post("https://api.web3.storage/upload", headers=headers, content=content, timeout=30.0)
     resp.raise_for_status()
     data = resp.json()
     cid = data.get("cid") or data.get("value", {}).get("cid")
     return cid
 
 
-def _pin_pinata_jwt(filename: str, content: bytes, token: Optional[str]) -> Optional[str]:
+# CIDv1 (raw leaves) so the returned CID matches app/storage/cid.py.
+_PINATA_OPTIONS = {"pinataOptions": json.dumps({"cidVersion": 1})}
+
+
+def _pin_pinata_jwt(http, filename: str, content: bytes, token: Optional[str]) -> Optional[str]:
     if not token:
         raise RuntimeError("PINATA_JWT missing")
     headers = {"Authorization": f"Bearer {token}"}
     files = {"file": (filename, content, "application/octet-stream")}
-    resp = httpx.post("https://api.pinata.cloud/pinning/pinFileToIPFS", headers=headers, files=files, timeout=30.0)
+    resp = http.post(
+        "https://api.pinata.cloud/pinning/pinFileToIPFS",
+        headers=headers,
+        files=files,
+        data=_PINATA_OPTIONS,
+        timeout=30.0,
+    )
     resp.raise_for_status()
     data = resp.json()
     return data.get("IpfsHash")
 
 
-def _pin_pinata_basic(filename: str, content: bytes, basic_token: Optional[str]) -> Optional[str]:
+def _pin_pinata_basic(http, filename: str, content: bytes, basic_token: Optional[str]) -> Optional[str]:
     if not basic_token:
         raise RuntimeError("PINATA API key/secret missing")
     headers = {"Authorization": f"Basic {basic_token}"}
     files = {"file": (filename, content, "application/octet-stream")}
-    resp = httpx.post("https://api.pinata.cloud/pinning/pinFileToIPFS", headers=headers, files=files, timeout=30.0)
+    resp = http.post(
+        "https://api.pinata.cloud/pinning/pinFileToIPFS",
+        headers=headers,
+        files=files,
+        data=_PINATA_OPTIONS,
+        timeout=30.0,
+    )
     resp.raise_for_status()
     data = resp.json()
     return data.get("IpfsHash")
 
 
-__all__ = ["pin_json", "pin_bytes"]
+__all__ = ["ipfs_enabled", "provider_layout_matches", "pin_json", "pin_bytes"]
 
 
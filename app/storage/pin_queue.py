@@ -0,0 +1,352 @@
+"""Background IPFS pinning with locally precomputed CIDs.
+
+``enqueue_pin`` computes the CIDv1 (app/storage/cid.py), spools the bytes to
+``IPFS_SPOOL_DIR`` (default ``tmp/ipfs-spool``) and returns the CID immediately; the upload
+runs on ``IPFS_PIN_WORKERS`` threads (default 2) sharing one pooled ``httpx.Client``. Failed
+uploads are retried ``IPFS_PIN_RETRIES`` times (default 4) with exponential backoff; a pin
+that still fails is marked ``error``, keeps its spooled bytes and is resubmitted by a
+background timer every ``IPFS_PIN_RETRY_SEC`` (default 300) once its ``next_attempt_at``
+passes, backing off up to six hours between rounds. CIDs already pinned (tracked in
+``ipfs_pins``) or in flight are not uploaded again. If the provider reports a different CID,
+releases that recorded the local one are repointed. Content whose local CID the provider
+would not reproduce (web3.storage, more than one chunk) is uploaded synchronously instead,
+and the provider's CID is returned.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from datetime import timedelta
+from typing import Any, Dict, Optional, Set
+
+import httpx
+from sqlalchemy import and_, or_, select
+
+from .. import models
+from ..db import now_utc, try_get_session
+from .cid import DEFAULT_CHUNK_SIZE, DEFAULT_MAX_LINKS, compute_cid
+from .ipfs import ipfs_enabled, pin_bytes, provider_layout_matches
+from ..utils.env import env_int
+
+
+logger = logging.getLogger("routeforge.storage.pin_queue")
+
+_pool: Optional[ThreadPoolExecutor] = None
+_client: Optional[httpx.Client] = None
+_lock = threading.Lock()
+_inflight: Set[str] = set()
+_pinned: Dict[str, str] = {}  # local CID -> CID the provider reported
+_uploads: Dict[str, threading.Event] = {}  # synchronous uploads in progress (see _pin_now)
+_UPLOAD_WAIT_SEC = 60.0
+_retry_stop: Optional[threading.Event] = None
+_MAX_RETRY_DELAY_SEC = 6 * 3600
+
+
+def _workers() -> int:
+    return max(env_int("IPFS_PIN_WORKERS", 2), 1)
+
+
+def _retries() -> int:
+    return max(env_int("IPFS_PIN_RETRIES", 4), 1)
+
+
+def _retry_interval() -> int:
+    return max(env_int("IPFS_PIN_RETRY_SEC", 300), 1)
+
+
+def _spool_dir() -> Path:
+    return Path(os.getenv("IPFS_SPOOL_DIR", "tmp/ipfs-spool"))
+
+
+def _chunk_size() -> int:
+    return max(env_int("IPFS_CHUNK_SIZE", DEFAULT_CHUNK_SIZE), 1024)
+
+
+def local_cid(content: bytes) -> str:
+    return compute_cid(
+        content,
+        chunk_size=_chunk_size(),
+        max_links=max(env_int("IPFS_MAX_LINKS", DEFAULT_MAX_LINKS), 2),
+    )
+
+
+def _get_client() -> httpx.Client:
+    global _client
+    with _lock:
+        if _client is None:
+            workers = _workers()
+            _client = httpx.Client(limits=httpx.Limits(max_connections=workers, max_keepalive_connections=workers))
+        return _client
+
+
+def _submit(cid: str, filename: str) -> None:
+    global _pool
+    with _lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=_workers(), thread_name_prefix="ipfs-pin")
+        pool = _pool
+    pool.submit(run_pin, cid, filename)
+
+
+def enqueue_pin(filename: str, content: bytes) -> Optional[str]:
+    """Return the content's CID now and pin it in the background; None if IPFS is not configured."""
+    if not ipfs_enabled():
+        logger.info("IPFS provider not configured; skipping pin.")
+        return None
+    cid = local_cid(content)
+    deferred = provider_layout_matches(len(content), _chunk_size())
+    with _lock:
+        if cid in _pinned:
+            return _pinned[cid]
+        uploading = _uploads.get(cid)
+        if cid in _inflight and uploading is None:
+            return cid
+        if uploading is None:
+            _inflight.add(cid)
+            if not deferred:
+                _uploads[cid] = threading.Event()
+    if uploading is not None:
+        # Another thread is uploading this content synchronously; share its result.
+        uploading.wait(_UPLOAD_WAIT_SEC)
+        with _lock:
+            return _pinned.get(cid)
+
+    try:
+        db = try_get_session()
+        try:
+            if db is not None:
+                row = db.get(models.IpfsPin, cid)
+                if row is not None and row.status == "pinned":
+                    _finish(cid, row.provider_cid or cid)
+                    return row.provider_cid or cid
+                if deferred and row is None:
+                    db.add(models.IpfsPin(cid=cid, filename=filename[:255], size=len(content), status="queued", attempts=0))
+                elif deferred:
+                    row.status = "queued"
+                    row.next_attempt_at = None
+                db.commit()
+        finally:
+            if db is not None:
+                db.close()
+
+        if not deferred:
+            return _pin_now(cid, filename, content)
+
+        spool = _spool_dir()
+        spool.mkdir(parents=True, exist_ok=True)
+        (spool / cid).write_bytes(content)
+        _submit(cid, filename)
+    except BaseException:
+        # Never leave the CID marked in flight, or later enqueues would skip the upload.
+        _finish(cid, None)
+        raise
+    return cid
+
+
+def _finish(cid: str, provider_cid: Optional[str]) -> None:
+    """Clear the in-flight mark, remember a successful pin and wake synchronous waiters."""
+    with _lock:
+        _inflight.discard(cid)
+        if provider_cid:
+            _pinned[cid] = provider_cid
+        uploading = _uploads.pop(cid, None)
+    if uploading is not None:
+        uploading.set()
+
+
+def _pin_now(cid: str, filename: str, content: bytes) -> Optional[str]:
+    """Upload in the caller's thread and return the provider's CID (None on failure)."""
+    provider_cid: Optional[str] = None
+    try:
+        provider_cid = pin_bytes(filename, content, client=_get_client())
+    finally:
+        _finish(cid, provider_cid)
+    if not provider_cid:
+        return None
+    db = try_get_session()
+    if db is not None:
+        try:
+            db.merge(
+                models.IpfsPin(
+                    cid=cid,
+                    filename=filename[:255],
+                    size=len(content),
+                    status="pinned",
+                    attempts=1,
+                    provider_cid=provider_cid if provider_cid != cid else None,
+                    pinned_at=now_utc(),
+                )
+            )
+            db.commit()
+        except Exception as exc:
+            db.rollback()
+            logger.warning("Failed to record pin %s: %s", cid, exc)
+        finally:
+            db.close()
+    return provider_cid
+
+
+def enqueue_pin_json(obj: Dict[str, Any], *, filename: str = "metadata.json") -> Optional[str]:
+    payload = json.dumps(obj, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+    return enqueue_pin(filename, payload)
+
+
+def run_pin(cid: str, filename: str) -> Optional[str]:
+    """Worker: upload the spooled bytes with retries and record the outcome."""
+    path = _spool_dir() / cid
+    provider_cid: Optional[str] = None
+    attempts = 0
+    error = "upload_failed"
+    try:
+        content = path.read_bytes()
+        retries = _retries()
+        for attempts in range(1, retries + 1):
+            provider_cid = pin_bytes(filename, content, client=_get_client())
+            if provider_cid:
+                break
+            if attempts < retries:
+                time.sleep(min(2 ** (attempts - 1), 30))
+    except OSError as exc:
+        error = "spool_missing"
+        logger.warning("Pin %s has no spooled content: %s", cid, exc)
+    finally:
+        _finish(cid, provider_cid)
+
+    _record(cid, provider_cid, attempts, error)
+    if provider_cid:
+        try:
+            path.unlink()
+        except OSError:
+            pass
+        if provider_cid != cid:
+            logger.warning("Provider pinned %s as %s; updating releases", cid, provider_cid)
+        else:
+            logger.info("Pinned %s after %s attempt(s)", cid, attempts)
+    else:
+        logger.warning("Pin %s failed after %s attempt(s): %s", cid, attempts, error)
+    return provider_cid
+
+
+def _record(cid: str, provider_cid: Optional[str], attempts: int, error: str = "upload_failed") -> None:
+    db = try_get_session()
+    if db is None:
+        return
+    try:
+        row = db.get(models.IpfsPin, cid)
+        if row is not None:
+            row.attempts = int(row.attempts or 0) + attempts
+            if provider_cid:
+                row.status = "pinned"
+                row.pinned_at = now_utc()
+                row.error = None
+                row.next_attempt_at = None
+                row.provider_cid = provider_cid if provider_cid != cid else None
+            else:
+                row.status = "error"
+                row.error = error
+                # Without spooled bytes there is nothing to retry; otherwise back off per round.
+                rounds = max(-(-int(row.attempts) // _retries()), 1)
+                delay = min(_retry_interval() * 2 ** (rounds - 1), _MAX_RETRY_DELAY_SEC)
+                row.next_attempt_at = None if error == "spool_missing" else now_utc() + timedelta(seconds=delay)
+        if provider_cid and provider_cid != cid:
+            releases = db.scalars(
+                select(models.Release).where(
+                    or_(models.Release.evidence_ipfs_cid == cid, models.Release.metadata_ipfs_cid == cid)
+                )
+            ).all()
+            for release in releases:
+                if release.evidence_ipfs_cid == cid:
+                    release.evidence_ipfs_cid = provider_cid
+                if release.metadata_ipfs_cid == cid:
+                    release.metadata_ipfs_cid = provider_cid
+        db.commit()
+    except Exception as exc:
+        db.rollback()
+        logger.warning("Failed to record pin %s: %s", cid, exc)
+    finally:
+        db.close()
+
+
+def requeue_pending_pins(db, *, limit: int = 500) -> int:
+    """Resubmit spooled pins left queued by a previous process, and failed pins whose
+    backoff has elapsed (called at startup and by the retry timer)."""
+    due = and_(
+        models.IpfsPin.status == "error",
+        models.IpfsPin.next_attempt_at.is_not(None),
+        models.IpfsPin.next_attempt_at <= now_utc(),
+    )
+    rows = db.execute(
+        select(models.IpfsPin.cid, models.IpfsPin.filename)
+        .where(or_(models.IpfsPin.status == "queued", due))
+        .order_by(models.IpfsPin.created_at.asc())
+        .limit(limit)
+    ).all()
+    resumed = 0
+    for row in rows:
+        if (_spool_dir() / row.cid).is_file():
+            with _lock:
+                if row.cid in _inflight:
+                    continue
+                _inflight.add(row.cid)
+            _submit(row.cid, row.filename)
+            resumed += 1
+    return resumed
+
+
+def _retry_loop(stop: threading.Event, interval: float) -> None:
+    while not stop.wait(interval):
+        db = try_get_session()
+        if db is None:
+            continue
+        try:
+            resumed = requeue_pending_pins(db)
+            if resumed:
+                logger.info("Retrying %s IPFS pins", resumed)
+        except Exception as exc:
+            logger.warning("IPFS pin retry failed: %s", exc)
+        finally:
+            db.close()
+
+
+def start_pin_retry_timer() -> None:
+    """Resubmit failed pins every ``IPFS_PIN_RETRY_SEC`` (call at startup)."""
+    global _retry_stop
+    if not ipfs_enabled():
+        return
+    with _lock:
+        if _retry_stop is not None:
+            return
+        _retry_stop = threading.Event()
+        stop = _retry_stop
+    threading.Thread(target=_retry_loop, args=(stop, _retry_interval()), name="ipfs-pin-retry", daemon=True).start()
+
+
+def shutdown_pin_queue() -> None:
+    global _pool, _client, _retry_stop
+    with _lock:
+        if _retry_stop is not None:
+            _retry_stop.set()
+            _retry_stop = None
+        pool, client = _pool, _client
+        _pool, _client = None, None
+    if pool is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
+    if client is not None:
+        client.close()
+
+
+__all__ = [
+    "local_cid",
+    "enqueue_pin",
+    "enqueue_pin_json",
+    "run_pin",
+    "requeue_pending_pins",
+    "start_pin_retry_timer",
+    "shutdown_pin_queue",
+]
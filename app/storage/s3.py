@@ -5,10 +5,33 @@ import datetime as _dt
 import hashlib
 import hmac
 import os
-from typing import Dict
+import xml.etree.ElementTree as ET
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Dict, Iterable, List, Mapping, Optional, Tuple
 from urllib.parse import quote, urlparse
 
-__all__ = ["presign_put"]
+import httpx
+
+__all__ = [
+    "S3Config",
+    "get_s3_config",
+    "reset_s3_config",
+    "presign_put",
+    "presign_put_batch",
+    "presign_get",
+    "upload_file",
+    "create_multipart_upload",
+    "presign_upload_parts",
+    "complete_multipart_upload",
+    "abort_multipart_upload",
+    "MULTIPART_MIN_PART_SIZE",
+    "MULTIPART_MAX_PARTS",
+]
+
+# S3 limits: every part except the last must be at least 5 MiB, and an upload has at most 10k parts.
+MULTIPART_MIN_PART_SIZE = 5 * 1024 * 1024
+MULTIPART_MAX_PARTS = 10_000
 
 
 class S3ConfigError(RuntimeError):
@@ -22,11 +45,55 @@ def _get_env(name: str) -> str:
     return value
 
 
+@dataclass(frozen=True)
+class S3Config:
+    endpoint: str
+    scheme: str
+    host: str
+    base_path: str
+    bucket: str
+    access_key: str
+    secret_key: str
+    region: str
+    expires: int
+    public_base: str
+
+
+@lru_cache(maxsize=1)
+def get_s3_config() -> S3Config:
+    """Parse the S3 environment once; call ``reset_s3_config`` after changing it."""
+
+    endpoint = _get_env("S3_COMPAT_ENDPOINT").rstrip("/")
+    parsed = urlparse(endpoint)
+    if not parsed.scheme or not parsed.netloc:
+        raise S3ConfigError("S3_COMPAT_ENDPOINT must include a scheme, e.g. https://example.com")
+    bucket = _get_env("S3_BUCKET")
+    return S3Config(
+        endpoint=endpoint,
+        scheme=parsed.scheme,
+        host=parsed.netloc,
+        base_path=parsed.path.rstrip("/"),
+        bucket=bucket,
+        access_key=_get_env("S3_ACCESS_KEY"),
+        secret_key=_get_env("S3_SECRET_KEY"),
+        region=os.getenv("S3_REGION", "us-east-1"),
+        expires=int(os.getenv("S3_PRESIGN_EXPIRES", "900")),
+        public_base=_public_base(endpoint, bucket),
+    )
+
+
+def reset_s3_config() -> None:
+    get_s3_config.cache_clear()
+    _get_signature_key.cache_clear()
+
+
 def _sign(key: bytes, message: str) -> bytes:
     return hmac.new(key, message.encode("utf-8"), hashlib.sha256).digest()
 
 
+@lru_cache(maxsize=16)
 def _get_signature_key(secret_key: str, date_stamp: str, region: str, service: str) -> bytes:
+    # The derived key only changes with the date, so one entry serves every presign of the day.
     k_date = _sign(("AWS4" + secret_key).encode("utf-8"), date_stamp)
     k_region = _sign(k_date, region)
     k_service = _sign(k_region, service)
@@ -38,14 +105,17 @@ def _canonical_query(params: Dict[str, str]) -> str:
     return "&".join(f"{k}={v}" for k, v in items)
 
 
+def _quote_key(key: str) -> str:
+    # Keys may include slashes so preserve them when quoting.
+    return "/".join(quote(part, safe="-_.~") for part in key.split("/"))
+
+
 def _canonical_uri(bucket: str, key: str) -> str:
     # Always use path-style addressing for compatibility with R2 and custom endpoints.
-    # Keys may include slashes so preserve them when quoting.
-    key_part = "/".join(quote(part, safe="-_.~") for part in key.split("/"))
-    return f"/{bucket}/{key_part}"
+    return f"/{bucket}/{_quote_key(key)}"
 
 
-def _build_public_url(endpoint: str, bucket: str, key: str) -> str:
+def _public_base(endpoint: str, bucket: str) -> str:
     base_override = os.getenv("S3_PUBLIC_BASE_URL") or os.getenv("S3_PUBLIC_ENDPOINT")
     target = base_override or endpoint
     target = target.strip()
@@ -70,69 +140,54 @@ def _build_public_url(endpoint: str, bucket: str, key: str) -> str:
     if not prefix.startswith("/"):
         prefix = f"/{prefix}"
 
-    key_part = "/".join(quote(part, safe="-_.~") for part in key.split("/"))
-    final_path = f"{prefix.rstrip('/')}/{key_part}"
-
-    return f"{scheme}://{netloc}{final_path}"
+    return f"{scheme}://{netloc}{prefix.rstrip('/')}"
 
 
-def presign_put(key: str, content_type: str, *, expires_in: int | None = None) -> Dict[str, object]:
-    """Return a presigned PUT request payload for direct uploads.
+def _presign(
+    method: str,
+    key: str,
+    *,
+    expires_in: int | None = None,
+    query: Optional[Mapping[str, str]] = None,
+    now: Optional[_dt.datetime] = None,
+) -> Dict[str, str]:
+    """Build a SigV4 query-string presigned URL for ``method`` on ``key``.
 
-    Parameters
-    ----------
-    key:
-        Object key (path within the bucket).
-    content_type:
-        MIME type that clients should send when uploading.
-    expires_in:
-        Lifetime of the presigned URL in seconds. Defaults to ``S3_PRESIGN_EXPIRES`` env or 900.
+    ``query`` adds subresource parameters (``uploads``, ``uploadId``, ``partNumber``) to the
+    signed query string. Returns a mapping with ``url`` (signed) and ``public_url`` (unsigned
+    object URL).
     """
 
-    endpoint = _get_env("S3_COMPAT_ENDPOINT").rstrip("/")
-    bucket = _get_env("S3_BUCKET")
-    access_key = _get_env("S3_ACCESS_KEY")
-    secret_key = _get_env("S3_SECRET_KEY")
-    region = os.getenv("S3_REGION", "us-east-1")
-
-    if not content_type:
-        content_type = "application/octet-stream"
-
-    parsed = urlparse(endpoint)
-    if not parsed.scheme or not parsed.netloc:
-        raise S3ConfigError("S3_COMPAT_ENDPOINT must include a scheme, e.g. https://example.com")
-
-    host = parsed.netloc
-    base_path = parsed.path.rstrip("/")
+    config = get_s3_config()
 
-    method = "PUT"
     service = "s3"
-    now = _dt.datetime.utcnow()
+    now = now or _dt.datetime.utcnow()
     amz_date = now.strftime("%Y%m%dT%H%M%SZ")
     date_stamp = now.strftime("%Y%m%d")
-    credential_scope = f"{date_stamp}/{region}/{service}/aws4_request"
+    credential_scope = f"{date_stamp}/{config.region}/{service}/aws4_request"
 
-    expires_default = int(os.getenv("S3_PRESIGN_EXPIRES", "900"))
-    expires = expires_in or expires_default
+    expires = expires_in or config.expires
 
-    canonical_uri = _canonical_uri(bucket, key)
-    canonical_headers = f"host:{host}\n"
+    canonical_uri = _canonical_uri(config.bucket, key)
+    canonical_headers = f"host:{config.host}\n"
     signed_headers = "host"
     payload_hash = "UNSIGNED-PAYLOAD"
 
     canonical_query_params = {
         "X-Amz-Algorithm": "AWS4-HMAC-SHA256",
-        "X-Amz-Credential": f"{access_key}/{credential_scope}",
+        "X-Amz-Credential": f"{config.access_key}/{credential_scope}",
         "X-Amz-Date": amz_date,
         "X-Amz-Expires": str(expires),
         "X-Amz-SignedHeaders": signed_headers,
     }
+    if query:
+        canonical_query_params.update(query)
     canonical_querystring = _canonical_query(canonical_query_params)
 
     canonical_request = "\n".join(
         [
             method,
-            f"{base_path}{canonical_uri}" if base_path else canonical_uri,
+            f"{config.base_path}{canonical_uri}",
             canonical_querystring,
             canonical_headers,
             signed_headers,
@@ -149,18 +204,153 @@ def presign_put(key: str, content_type: str, *, expires_in: int | None = None) -
         ]
     )
 
-    signing_key = _get_signature_key(secret_key, date_stamp, region, service)
+    signing_key = _get_signature_key(config.secret_key, date_stamp, config.region, service)
     signature = hmac.new(signing_key, string_to_sign.encode("utf-8"), hashlib.sha256).hexdigest()
 
     signed_query = f"{canonical_querystring}&X-Amz-Signature={signature}"
-    url = f"{parsed.scheme}://{host}{base_path}{canonical_uri}?{signed_query}"
+    url = f"{config.scheme}://{config.host}{config.base_path}{canonical_uri}?{signed_query}"
 
-    public_url = _build_public_url(endpoint, bucket, key)
+    return {"url": url, "public_url": f"{config.public_base}/{_quote_key(key)}"}
+
+
+def presign_put(
+    key: str, content_type: str, *, expires_in: int | None = None, now: Optional[_dt.datetime] = None
+) -> Dict[str, object]:
+    """Return a presigned PUT request payload for direct uploads.
+
+    Parameters
+    ----------
+    key:
+        Object key (path within the bucket).
+    content_type:
+        MIME type that clients should send when uploading.
+    expires_in:
+        Lifetime of the presigned URL in seconds. Defaults to ``S3_PRESIGN_EXPIRES`` env or 900.
+    """
+
+    if not content_type:
+        content_type = "application/octet-stream"
+
+    method = "PUT"
+    presigned = _presign(method, key, expires_in=expires_in, now=now)
 
     return {
-        "url": url,
+        "url": presigned["url"],
         "method": method,
         "headers": {"Content-Type": content_type},
         "key": key,
-        "public_url": public_url,
+        "public_url": presigned["public_url"],
     }
+
+
+def presign_put_batch(
+    items: Iterable[Tuple[str, str]], *, expires_in: int | None = None
+) -> List[Dict[str, object]]:
+    """Presign ``(key, content_type)`` pairs with one shared timestamp and signing key."""
+
+    now = _dt.datetime.utcnow()
+    return [presign_put(key, content_type, expires_in=expires_in, now=now) for key, content_type in items]
+
+
+def presign_get(key: str, *, expires_in: int | None = None) -> str:
+    """Return a presigned GET URL so private objects can be downloaded directly."""
+
+    return _presign("GET", key, expires_in=expires_in)["url"]
+
+
+def upload_file(key: str, path: str | os.PathLike[str], content_type: str, *, timeout: float = 300.0) -> str:
+    """Stream a local file to ``key`` through a presigned PUT and return its public URL."""
+
+    presigned = presign_put(key, content_type)
+    headers = dict(presigned["headers"])  # type: ignore[arg-type]
+    headers["Content-Length"] = str(os.path.getsize(path))
+    with open(path, "rb") as handle:
+        resp = httpx.put(str(presigned["url"]), content=handle, headers=headers, timeout=timeout)
+    resp.raise_for_status()
+    return str(presigned["public_url"])
+
+
+class S3RequestError(RuntimeError):
+    """Raised when the S3 endpoint rejects a multipart request."""
+
+
+def _xml_text(root: ET.Element, name: str) -> Optional[str]:
+    # S3 namespaces its responses; compatible stores may not, so match on the local name.
+    for element in root.iter():
+        if element.tag.rsplit("}", 1)[-1] == name:
+            return element.text
+    return None
+
+
+def _check_response(resp: httpx.Response, action: str) -> Optional[ET.Element]:
+    if resp.status_code >= 300:
+        raise S3RequestError(f"{action} failed with HTTP {resp.status_code}")
+    if not resp.content:
+        return None
+    root = ET.fromstring(resp.content)
+    # CompleteMultipartUpload can fail with a 200 response carrying an <Error> document.
+    if root.tag.rsplit("}", 1)[-1] == "Error":
+        raise S3RequestError(f"{action} failed: {_xml_text(root, 'Code') or 'unknown error'}")
+    return root
+
+
+def create_multipart_upload(key: str, content_type: str, *, client: Optional[httpx.Client] = None) -> str:
+    """Start a multipart upload for ``key`` and return its ``UploadId``."""
+
+    http = client or httpx
+    url = _presign("POST", key, query={"uploads": ""})["url"]
+    resp = http.post(url, headers={"Content-Type": content_type or "application/octet-stream"}, timeout=30.0)
+    root = _check_response(resp, "CreateMultipartUpload")
+    upload_id = _xml_text(root, "UploadId") if root is not None else None
+    if not upload_id:
+        raise S3RequestError("CreateMultipartUpload response has no UploadId")
+    return upload_id
+
+
+def presign_upload_parts(
+    key: str, upload_id: str, part_numbers: Iterable[int], *, expires_in: int | None = None
+) -> List[Dict[str, object]]:
+    """Presigned ``PUT`` URLs for the given part numbers of an upload.
+
+    Clients PUT each part's bytes to its URL (in parallel if they like) and keep the ``ETag``
+    response header for :func:`complete_multipart_upload`.
+    """
+
+    parts: List[Dict[str, object]] = []
+    for number in part_numbers:
+        if not 1 <= int(number) <= MULTIPART_MAX_PARTS:
+            raise ValueError(f"part number out of range: {number}")
+        url = _presign(
+            "PUT", key, expires_in=expires_in, query={"partNumber": str(int(number)), "uploadId": upload_id}
+        )["url"]
+        parts.append({"part_number": int(number), "url": url, "method": "PUT"})
+    return parts
+
+
+def complete_multipart_upload(
+    key: str, upload_id: str, parts: Iterable[Tuple[int, str]], *, client: Optional[httpx.Client] = None
+) -> str:
+    """Assemble the uploaded ``(part_number, etag)`` parts and return the object's public URL."""
+
+    root = ET.Element("CompleteMultipartUpload")
+    for number, etag in sorted(parts):
+        part = ET.SubElement(root, "Part")
+        ET.SubElement(part, "PartNumber").text = str(int(number))
+        ET.SubElement(part, "ETag").text = etag if etag.startswith('"') else f'"{etag}"'
+    body = ET.tostring(root, encoding="utf-8")
+
+    http = client or httpx
+    presigned = _presign("POST", key, query={"uploadId": upload_id})
+    resp = http.post(presigned["url"], content=body, headers={"Content-Type": "application/xml"}, timeout=300.0)
+    _check_response(resp, "CompleteMultipartUpload")
+    return presigned["public_url"]
+
+
+def abort_multipart_upload(key: str, upload_id: str, *, client: Optional[httpx.Client] = None) -> None:
+    """Abort an upload so the store discards its parts."""
+
+    http = client or httpx
+    url = _presign("DELETE", key, query={"uploadId": upload_id})["url"]
+    resp = http.delete(url, timeout=30.0)
+    if resp.status_code != 404:
+        _check_response(resp, "AbortMultipartUpload")
@@ -0,0 +1,140 @@
+"""Interned lookup tables for repetitive hit strings (user agents, referrers)."""
+
+from __future__ import annotations
+
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, Generic, Hashable, Iterable, Optional, Type, TypeVar, Union
+
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from .. import models
+
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+DictionaryModel = Union[Type[models.UserAgent], Type[models.Referrer]]
+
+_MAX_LENGTHS = {
+    models.UserAgent: 512,
+    models.Referrer: 2048,
+}
+
+
+class LRUCache(Generic[K, V]):
+    """Small thread-safe LRU used on the redirect path."""
+
+    def __init__(self, capacity: int) -> None:
+        self.capacity = max(int(capacity), 1)
+        self._data: "OrderedDict[K, V]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: K) -> Optional[V]:
+        with self._lock:
+            value = self._data.get(key)
+            if value is not None:
+                self._data.move_to_end(key)
+            return value
+
+    def put(self, key: K, value: V) -> None:
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.capacity:
+                self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+def _cache_capacity() -> int:
+    try:
+        return int(os.getenv("INTERN_CACHE_SIZE", "4096") or "4096")
+    except ValueError:
+        return 4096
+
+
+# (model name, value hash) -> id
+_id_cache: "LRUCache[tuple[str, str], int]" = LRUCache(_cache_capacity())
+
+
+def normalize_value(model: DictionaryModel, value: Optional[str]) -> Optional[str]:
+    """Truncate to the column width; blank values are not interned."""
+    if value is None or not value.strip():
+        return None
+    return value[: _MAX_LENGTHS[model]]
+
+
+def value_hash(value: str) -> str:
+    return hashlib.sha256(value.encode("utf-8")).hexdigest()
+
+
+def intern_value(db: Session, model: DictionaryModel, value: Optional[str]) -> Optional[int]:
+    """Return the id for ``value`` in ``model``'s table, inserting it on first sight."""
+    normalized = normalize_value(model, value)
+    if normalized is None:
+        return None
+
+    digest = value_hash(normalized)
+    cache_key = (model.__tablename__, digest)
+    cached = _id_cache.get(cache_key)
+    if cached is not None:
+        return cached
+
+    existing = db.execute(select(model.id).where(model.value_hash == digest)).scalar_one_or_none()
+    if existing is None:
+        try:
+            with db.begin_nested():
+                row = model(value_hash=digest, value=normalized)
+                db.add(row)
+                db.flush()
+            # Not cached yet: the row is only durable once the caller commits.
+            return int(row.id)
+        except IntegrityError:
+            # Another worker interned the same value concurrently.
+            existing = db.execute(select(model.id).where(model.value_hash == digest)).scalar_one()
+
+    _id_cache.put(cache_key, int(existing))
+    return int(existing)
+
+
+def intern_user_agent(db: Session, value: Optional[str]) -> Optional[int]:
+    return intern_value(db, models.UserAgent, value)
+
+
+def intern_referrer(db: Session, value: Optional[str]) -> Optional[int]:
+    return intern_value(db, models.Referrer, value)
+
+
+def lookup_values(db: Session, model: DictionaryModel, ids: Iterable[Optional[int]]) -> Dict[int, str]:
+    """Resolve a batch of interned ids back to their strings with a single PK lookup."""
+    wanted = sorted({int(i) for i in ids if i is not None})
+    if not wanted:
+        return {}
+    rows = db.execute(select(model.id, model.value).where(model.id.in_(wanted))).all()
+    return {int(r.id): r.value for r in rows}
+
+
+def clear_cache() -> None:
+    _id_cache.clear()
+
+
+__all__ = [
+    "LRUCache",
+    "intern_value",
+    "intern_user_agent",
+    "intern_referrer",
+    "lookup_values",
+    "normalize_value",
+    "value_hash",
+    "clear_cache",
+]
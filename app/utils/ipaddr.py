@@ -0,0 +1,103 @@
+"""Compact binary IP storage with optional anonymization at ingest.
+
+Stored values are 4 bytes (IPv4), 16 bytes (IPv6) or, in ``hash`` mode, a
+12-byte keyed digest; the length alone tells ``decode_ip`` how to render them.
+``hash`` mode needs ``IP_HASH_KEY`` or ``SESSION_SECRET``: with a public key anyone could
+hash the whole IPv4 space and reverse the digests, so without one it truncates instead.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import hmac
+import ipaddress
+import logging
+import os
+from typing import Optional, Union
+
+
+logger = logging.getLogger("routeforge.ipaddr")
+
+ANONYMIZE_MODES = ("none", "truncate", "hash")
+_HASH_BYTES = 12
+_warned_no_key = False
+
+
+def anonymize_mode() -> str:
+    mode = (os.getenv("IP_ANONYMIZE") or "none").strip().lower()
+    return mode if mode in ANONYMIZE_MODES else "none"
+
+
+def _hash_key() -> Optional[bytes]:
+    global _warned_no_key
+    key = (os.getenv("IP_HASH_KEY") or os.getenv("SESSION_SECRET") or "").strip()
+    if key:
+        return key.encode("utf-8")
+    if not _warned_no_key:
+        _warned_no_key = True
+        logger.warning("IP_ANONYMIZE=hash without IP_HASH_KEY or SESSION_SECRET; truncating IPs instead")
+    return None
+
+
+def _prefix(name: str, default: int, maximum: int) -> int:
+    try:
+        value = int(os.getenv(name, str(default)) or default)
+    except ValueError:
+        value = default
+    return min(max(value, 0), maximum)
+
+
+def parse_ip(value: Optional[str]) -> Optional[Union[ipaddress.IPv4Address, ipaddress.IPv6Address]]:
+    """Parse a header/socket address, tolerating ports, brackets and IPv4-mapped IPv6."""
+    if not value:
+        return None
+    candidate = value.strip()
+    if candidate.startswith("[") and "]" in candidate:
+        candidate = candidate[1 : candidate.index("]")]
+    elif candidate.count(":") == 1:
+        candidate = candidate.split(":", 1)[0]
+    try:
+        addr = ipaddress.ip_address(candidate)
+    except ValueError:
+        return None
+    if isinstance(addr, ipaddress.IPv6Address) and addr.ipv4_mapped is not None:
+        return addr.ipv4_mapped
+    return addr
+
+
+def encode_ip(value: Optional[str], *, mode: Optional[str] = None) -> Optional[bytes]:
+    """Return the bytes to store for ``value``; None for missing or unparseable input."""
+    addr = parse_ip(value)
+    if addr is None:
+        return None
+    effective = mode or anonymize_mode()
+    key = _hash_key() if effective == "hash" else None
+    if effective == "hash" and key is None:
+        effective = "truncate"
+    if effective == "truncate":
+        if addr.version == 4:
+            prefix = _prefix("IP_TRUNCATE_V4_PREFIX", 24, 32)
+        else:
+            prefix = _prefix("IP_TRUNCATE_V6_PREFIX", 48, 128)
+        return ipaddress.ip_network(f"{addr}/{prefix}", strict=False).network_address.packed
+    if effective == "hash" and key is not None:
+        return hmac.new(key, addr.packed, hashlib.sha256).digest()[:_HASH_BYTES]
+    return addr.packed
+
+
+def decode_ip(value: Optional[Union[bytes, bytearray, memoryview, str]]) -> Optional[str]:
+    """Render a stored IP for API responses and exports."""
+    if value is None:
+        return None
+    if isinstance(value, str):
+        # Rows written before the binary column migration.
+        return value
+    raw = bytes(value)
+    if len(raw) in (4, 16):
+        return str(ipaddress.ip_address(raw))
+    if not raw:
+        return None
+    return f"anon-{raw.hex()}"
+
+
+__all__ = ["ANONYMIZE_MODES", "anonymize_mode", "parse_ip", "encode_ip", "decode_ip"]
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+import argparse
+import logging
+import os
+import sys
+
+from dotenv import load_dotenv
+
+# Ensure repository root is on sys.path
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.dirname(CURRENT_DIR)
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+load_dotenv()
+
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO"))
+logger = logging.getLogger("routeforge.backfill_embeddings")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Embed releases with missing or stale embeddings and rebuild the similarity index."
+    )
+    parser.add_argument("--dsn", dest="dsn", help="Database DSN (MySQL/TiDB)")
+    parser.add_argument("--batch-size", type=int, default=256, help="Releases per keyset chunk (default 256)")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="Embedding worker processes (default: CPU count)",
+    )
+    parser.add_argument(
+        "--checkpoint",
+        default="tmp/backfill_embeddings.json",
+        help="Checkpoint file used to resume an interrupted run",
+    )
+    parser.add_argument("--reset", action="store_true", help="Ignore any existing checkpoint")
+    parser.add_argument("--limit", type=int, default=None, help="Stop after this many releases")
+    parser.add_argument("--no-reindex", action="store_true", help="Skip rebuilding the similarity index")
+    args = parser.parse_args()
+
+    from sqlalchemy.orm import sessionmaker
+
+    from app.db import get_engine
+    from app.embeddings.backfill import backfill_embeddings
+
+    dsn = args.dsn or os.getenv("TIDB_DSN")
+    if not dsn:
+        raise SystemExit("TIDB_DSN not provided. Use --dsn or set env TIDB_DSN.")
+
+    if args.reset and os.path.exists(args.checkpoint):
+        os.remove(args.checkpoint)
+
+    SessionLocal = sessionmaker(bind=get_engine(dsn), autoflush=False, autocommit=False, future=True)
+    stats = backfill_embeddings(
+        SessionLocal,
+        batch_size=max(args.batch_size, 1),
+        workers=args.workers,
+        checkpoint_path=args.checkpoint,
+        limit=args.limit,
+        reindex=not args.no_reindex,
+    )
+    print(f"updated: {stats.updated}")
+    print(f"batches: {stats.batches}")
+    print(f"elapsed_sec: {stats.elapsed:.2f}")
+    print(f"releases_per_sec: {stats.rate:.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -110,6 +110,8 @@ def main() -> int:
             return 0
 
         from app.models import RouteHit
+        from app.utils.interning import intern_referrer, intern_user_agent
+        from app.utils.ipaddr import encode_ip
 
         hits = []
         for _ in range(max(args.clicks, 0)):
@@ -117,9 +119,9 @@ def main() -> int:
             hit = RouteHit(
                 route_id=route_id,
                 ts=spread_timestamp(args.days),
-                ip=random_ip(),
-                ua=random.choice(USER_AGENTS),
-                ref=choose_referrer(),
+                ip=encode_ip(random_ip()),
+                ua_id=intern_user_agent(session, random.choice(USER_AGENTS)),
+                ref_id=intern_referrer(session, choose_referrer()),
             )
             hits.append(hit)
             used_routes.append(route_id)
@@ -21,11 +21,27 @@ logger = logging.getLogger("routeforge.migrate")
 def main():
     parser = argparse.ArgumentParser(description="Idempotent migration for RouteForge.")
     parser.add_argument("--dsn", dest="dsn", help="Database DSN (MySQL/TiDB)")
+    parser.add_argument(
+        "--partition-hits",
+        action="store_true",
+        help="Convert route_hits to monthly RANGE partitions (one-time, rewrites the table)",
+    )
+    parser.add_argument(
+        "--drop-legacy-hit-columns",
+        action="store_true",
+        help="Drop route_hits.ua/ref after they have been interned into lookup tables",
+    )
     args = parser.parse_args()
 
     from app.db import get_engine
     from app.models import Base
     from app.db.migrate_accounts import migrate as migrate_accounts
+    from app.db.migrate_hit_dictionaries import migrate as migrate_hit_dictionaries
+    from app.db.migrate_hit_ip import migrate as migrate_hit_ip
+    from app.db.migrate_embeddings import migrate as migrate_embeddings
+    from app.similarity.minhash import backfill_release_minhash
+    from sqlalchemy.orm import Session
+    from app.db.retention import ensure_future_partitions, is_partitioned, partition_route_hits
 
     dsn = args.dsn or os.getenv("TIDB_DSN")
     if not dsn:
@@ -72,8 +88,8 @@ def main():
         )
         logger.info("OK: audit ready")
 
-        # embedding column
-        logger.info("Ensuring releases.embedding exists (prefer VECTOR(768))...")
+        # embedding column (binary codec, see app/embeddings/codec.py)
+        logger.info("Ensuring releases.embedding exists (LONGBLOB)...")
         col_exists = conn.exec_driver_sql(
             """
             SELECT COUNT(1) FROM INFORMATION_SCHEMA.COLUMNS
@@ -81,16 +97,73 @@ def main():
             """
         ).scalar()
         if not col_exists:
-            try:
-                conn.exec_driver_sql("ALTER TABLE releases ADD COLUMN embedding VECTOR(768) NULL")
-                logger.info("OK: releases.embedding added as VECTOR(768)")
-            except Exception as e:
-                logger.warning("VECTOR unavailable (%s). Falling back to LONGBLOB...", e)
-                conn.exec_driver_sql("ALTER TABLE releases ADD COLUMN embedding LONGBLOB NULL")
-                logger.info("OK: releases.embedding added as LONGBLOB")
+            conn.exec_driver_sql("ALTER TABLE releases ADD COLUMN embedding LONGBLOB NULL")
+            logger.info("OK: releases.embedding added as LONGBLOB")
         else:
             logger.info("OK: releases.embedding already present")
 
+        model_col_exists = conn.exec_driver_sql(
+            """
+            SELECT COUNT(1) FROM INFORMATION_SCHEMA.COLUMNS
+            WHERE TABLE_NAME = 'releases' AND COLUMN_NAME = 'embedding_model'
+            """
+        ).scalar()
+        if not model_col_exists:
+            conn.exec_driver_sql("ALTER TABLE releases ADD COLUMN embedding_model VARCHAR(128) NULL")
+            logger.info("OK: releases.embedding_model added")
+
+        # MinHash signature + LSH bands (app/similarity/minhash.py)
+        minhash_col_exists = conn.exec_driver_sql(
+            """
+            SELECT COUNT(1) FROM INFORMATION_SCHEMA.COLUMNS
+            WHERE TABLE_NAME = 'releases' AND COLUMN_NAME = 'minhash'
+            """
+        ).scalar()
+        if not minhash_col_exists:
+            conn.exec_driver_sql("ALTER TABLE releases ADD COLUMN minhash VARBINARY(256) NULL")
+            logger.info("OK: releases.minhash added")
+
+        # Optional chunked Merkle digest (app/merkle.py)
+        for column, ddl in (
+            ("artifact_merkle_root", "VARCHAR(64) NULL"),
+            ("artifact_merkle_chunk_size", "INT NULL"),
+            ("artifact_merkle_leaves", "LONGBLOB NULL"),
+        ):
+            exists = conn.exec_driver_sql(
+                f"""
+                SELECT COUNT(1) FROM INFORMATION_SCHEMA.COLUMNS
+                WHERE TABLE_NAME = 'releases' AND COLUMN_NAME = '{column}'
+                """
+            ).scalar()
+            if not exists:
+                conn.exec_driver_sql(f"ALTER TABLE releases ADD COLUMN {column} {ddl}")
+                logger.info("OK: releases.%s added", column)
+        conn.exec_driver_sql(
+            """
+            CREATE TABLE IF NOT EXISTS release_lsh_bands (
+              band SMALLINT NOT NULL,
+              bucket BIGINT NOT NULL,
+              release_id INT NOT NULL,
+              PRIMARY KEY (band, bucket, release_id),
+              INDEX ix_release_lsh_bands_release_id (release_id)
+            )
+            """
+        )
+        logger.info("OK: release_lsh_bands ready")
+
+        # Exact-duplicate lookup on publish (app/agent/digests.py)
+        sha_idx_exists = conn.exec_driver_sql(
+            """
+            SELECT COUNT(1) FROM INFORMATION_SCHEMA.STATISTICS
+            WHERE TABLE_NAME = 'releases' AND INDEX_NAME = 'ix_releases_project_artifact_sha256'
+            """
+        ).scalar()
+        if not sha_idx_exists:
+            conn.exec_driver_sql(
+                "CREATE INDEX ix_releases_project_artifact_sha256 ON releases (project_id, artifact_sha256)"
+            )
+            logger.info("OK: ix_releases_project_artifact_sha256 created")
+
         # FULLTEXT fallback
         logger.info("Ensuring FULLTEXT index ft_releases_notes_version exists...")
         idx_exists = conn.exec_driver_sql(
@@ -207,6 +280,181 @@ def main():
         else:
             logger.info("OK: releases.metadata_ipfs_cid already present")
 
+        # export_jobs table
+        logger.info("Ensuring export_jobs table exists...")
+        conn.exec_driver_sql(
+            """
+            CREATE TABLE IF NOT EXISTS export_jobs (
+              id VARCHAR(32) PRIMARY KEY,
+              user_id BIGINT NOT NULL,
+              status VARCHAR(16) NOT NULL DEFAULT 'queued',
+              format VARCHAR(16) NOT NULL DEFAULT 'csv',
+              params JSON,
+              files JSON,
+              rows_exported BIGINT NOT NULL DEFAULT 0,
+              error VARCHAR(255) NULL,
+              created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+              started_at TIMESTAMP NULL,
+              finished_at TIMESTAMP NULL,
+              INDEX ix_export_jobs_user_id (user_id)
+            )
+            """
+        )
+        logger.info("OK: export_jobs ready")
+
+        # hash_jobs table (background artifact hashing, app/hashing.py)
+        logger.info("Ensuring hash_jobs table exists...")
+        conn.exec_driver_sql(
+            """
+            CREATE TABLE IF NOT EXISTS hash_jobs (
+              id VARCHAR(32) PRIMARY KEY,
+              user_id BIGINT NOT NULL,
+              release_id BIGINT NOT NULL,
+              artifact_url VARCHAR(2048) NOT NULL,
+              status VARCHAR(16) NOT NULL DEFAULT 'queued',
+              artifact_sha256 VARCHAR(128) NULL,
+              error VARCHAR(255) NULL,
+              created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+              started_at TIMESTAMP NULL,
+              finished_at TIMESTAMP NULL,
+              INDEX ix_hash_jobs_release_id (release_id),
+              INDEX ix_hash_jobs_user_id (user_id)
+            )
+            """
+        )
+        logger.info("OK: hash_jobs ready")
+        # Earlier versions marked hashing releases with a "pending" sentinel digest.
+        cleared = conn.exec_driver_sql(
+            "UPDATE releases SET artifact_sha256 = NULL WHERE artifact_sha256 = 'pending'"
+        ).rowcount
+        if cleared:
+            logger.info("Cleared pending digest sentinel on %s releases", cleared)
+
+        # ipfs_pins table (background IPFS uploads, app/storage/pin_queue.py)
+        logger.info("Ensuring ipfs_pins table exists...")
+        conn.exec_driver_sql(
+            """
+            CREATE TABLE IF NOT EXISTS ipfs_pins (
+              cid VARCHAR(128) PRIMARY KEY,
+              filename VARCHAR(255) NOT NULL,
+              size BIGINT NOT NULL,
+              status VARCHAR(16) NOT NULL DEFAULT 'queued',
+              attempts INT NOT NULL DEFAULT 0,
+              provider_cid VARCHAR(128) NULL,
+              error VARCHAR(255) NULL,
+              created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+              pinned_at TIMESTAMP NULL,
+              next_attempt_at TIMESTAMP NULL
+            )
+            """
+        )
+        pin_retry_col_exists = conn.exec_driver_sql(
+            """
+            SELECT COUNT(1) FROM INFORMATION_SCHEMA.COLUMNS
+            WHERE TABLE_NAME = 'ipfs_pins' AND COLUMN_NAME = 'next_attempt_at'
+            """
+        ).scalar()
+        if not pin_retry_col_exists:
+            conn.exec_driver_sql("ALTER TABLE ipfs_pins ADD COLUMN next_attempt_at TIMESTAMP NULL")
+        logger.info("OK: ipfs_pins ready")
+
+        # route_hits_hourly (downsampled hits kept after raw retention)
+        logger.info("Ensuring table route_hits_hourly exists...")
+        conn.exec_driver_sql(
+            """
+            CREATE TABLE IF NOT EXISTS route_hits_hourly (
+              route_id BIGINT NOT NULL,
+              bucket_ts TIMESTAMP NOT NULL,
+              hits BIGINT NOT NULL DEFAULT 0,
+              PRIMARY KEY (route_id, bucket_ts)
+            )
+            """
+        )
+        logger.info("OK: route_hits_hourly ready")
+
+        logger.info("Ensuring index ix_route_hits_route_ts exists...")
+        hits_idx_exists = conn.exec_driver_sql(
+            """
+            SELECT COUNT(1) FROM INFORMATION_SCHEMA.STATISTICS
+            WHERE TABLE_NAME = 'route_hits' AND INDEX_NAME = 'ix_route_hits_route_ts'
+            """
+        ).scalar()
+        if not hits_idx_exists:
+            conn.exec_driver_sql("ALTER TABLE route_hits ADD INDEX ix_route_hits_route_ts (route_id, ts)")
+            logger.info("OK: ix_route_hits_route_ts created")
+        else:
+            logger.info("OK: ix_route_hits_route_ts already present")
+
+        logger.info("Ensuring column route_hits.dup_count exists...")
+        dup_col_exists = conn.exec_driver_sql(
+            """
+            SELECT COUNT(1) FROM INFORMATION_SCHEMA.COLUMNS
+            WHERE TABLE_NAME = 'route_hits' AND COLUMN_NAME = 'dup_count'
+            """
+        ).scalar()
+        if not dup_col_exists:
+            conn.exec_driver_sql("ALTER TABLE route_hits ADD COLUMN dup_count INT NOT NULL DEFAULT 0")
+            logger.info("OK: route_hits.dup_count added")
+        else:
+            logger.info("OK: route_hits.dup_count already present")
+
+        route_dup_exists = conn.exec_driver_sql(
+            """
+            SELECT COUNT(1) FROM INFORMATION_SCHEMA.COLUMNS
+            WHERE TABLE_NAME = 'routes' AND COLUMN_NAME = 'dup_hits'
+            """
+        ).scalar()
+        if not route_dup_exists:
+            conn.exec_driver_sql("ALTER TABLE routes ADD COLUMN dup_hits BIGINT NOT NULL DEFAULT 0")
+            logger.info("OK: routes.dup_hits added")
+
+    logger.info("Interning route_hits user agents and referrers...")
+    try:
+        summary = migrate_hit_dictionaries(engine, drop_legacy=args.drop_legacy_hit_columns)
+        logger.info("OK: hit dictionaries ready %s", summary)
+    except Exception as e:
+        logger.warning("Skipping hit dictionary migration due to error: %s", e)
+
+    logger.info("Converting route_hits.ip to binary...")
+    try:
+        summary = migrate_hit_ip(engine)
+        logger.info("OK: route_hits.ip binary %s", summary)
+    except Exception as e:
+        logger.warning("Skipping hit IP migration due to error: %s", e)
+
+    logger.info("Rewriting release embeddings to the binary format...")
+    try:
+        summary = migrate_embeddings(engine)
+        logger.info("OK: release embeddings binary %s", summary)
+    except Exception as e:
+        logger.warning("Skipping embedding migration due to error: %s", e)
+
+    logger.info("Signing releases for near-duplicate detection...")
+    try:
+        with Session(engine) as session:
+            signed = backfill_release_minhash(session)
+        logger.info("OK: release MinHash signatures (%s signed)", signed)
+    except Exception as e:
+        logger.warning("Skipping MinHash backfill due to error: %s", e)
+
+    # Partition DDL commits implicitly, so run it outside the transaction above.
+    with engine.connect() as conn:
+        if args.partition_hits:
+            logger.info("Partitioning route_hits by month...")
+            try:
+                if partition_route_hits(conn):
+                    logger.info("OK: route_hits partitioned")
+                else:
+                    logger.info("OK: route_hits already partitioned")
+            except Exception as e:
+                logger.warning("Partitioning route_hits failed (%s). Table left unpartitioned.", e)
+        try:
+            if is_partitioned(conn):
+                added = ensure_future_partitions(conn)
+                logger.info("OK: route_hits future partitions ensured (%s added)", added)
+        except Exception as e:
+            logger.warning("Skipping route_hits partition maintenance due to error: %s", e)
+
     logger.info("Migration complete.")
 
 
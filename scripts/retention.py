@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+import argparse
+import logging
+import os
+import sys
+
+from dotenv import load_dotenv
+
+# Ensure repository root is on sys.path
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.dirname(CURRENT_DIR)
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+load_dotenv()
+
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO"))
+logger = logging.getLogger("routeforge.retention")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Downsample expired route_hits into hourly aggregates and drop old raw rows/partitions."
+    )
+    parser.add_argument("--dsn", dest="dsn", help="Database DSN (MySQL/TiDB)")
+    parser.add_argument(
+        "--days",
+        type=int,
+        default=None,
+        help="Raw retention window in days (defaults to HIT_RETENTION_DAYS; 0 disables)",
+    )
+    args = parser.parse_args()
+
+    from app.db import get_engine
+    from app.db.retention import apply_retention
+
+    dsn = args.dsn or os.getenv("TIDB_DSN")
+    if not dsn:
+        raise SystemExit("TIDB_DSN not provided. Use --dsn or set env TIDB_DSN.")
+
+    summary = apply_retention(get_engine(dsn), retention_days=args.days)
+    for key, value in summary.items():
+        print(f"{key}: {value}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,23 @@
 import sys
 from pathlib import Path
 
+import pytest
+
 ROOT = Path(__file__).resolve().parents[1]
 root_str = str(ROOT)
 if root_str not in sys.path:
     sys.path.insert(0, root_str)
+
+
+@pytest.fixture(autouse=True)
+def _isolated_caches(tmp_path, monkeypatch):
+    from app.hash_cache import close_hash_cache
+    from app.storage.s3 import reset_s3_config
+
+    monkeypatch.setenv("HASH_CACHE_PATH", str(tmp_path / "hash_cache.sqlite3"))
+    monkeypatch.setenv("EVIDENCE_CACHE_DIR", str(tmp_path / "evidence"))
+    monkeypatch.setenv("IPFS_SPOOL_DIR", str(tmp_path / "ipfs-spool"))
+    reset_s3_config()
+    yield
+    close_hash_cache()
+    reset_s3_config()
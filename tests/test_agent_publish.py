@@ -0,0 +1,287 @@
+import pytest
+
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, event, insert, select
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app import models
+from app.app import app
+from app.hashing import hash_job_pending, run_hash_job
+from app.auth.accounts import ensure_demo_user
+from app.db import get_db
+
+
+def _client(monkeypatch):
+    monkeypatch.setenv("AUTH_ENABLED", "0")
+    monkeypatch.delenv("EMBEDDING_ENABLED", raising=False)
+    # Keep tests offline: remote artifacts are treated as unhashable.
+    monkeypatch.setattr("app.evidence._hash_remote", lambda url, **kwargs: None)
+    engine = create_engine(
+        "sqlite://", future=True, connect_args={"check_same_thread": False}, poolclass=StaticPool
+    )
+    models.Base.metadata.create_all(engine)
+    SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False, future=True)
+    session = SessionLocal()
+    demo = ensure_demo_user(session)
+    project = models.Project(user_id=demo.id, name="Demo", owner="demo", description="")
+    session.add(project)
+    session.commit()
+    project_id = project.id
+
+    commits = []
+    event.listen(engine, "commit", lambda conn: commits.append(1))
+
+    def _override():
+        yield session
+
+    app.dependency_overrides[get_db] = _override
+    return TestClient(app), session, project_id, commits
+
+
+def test_publish_commits_once_with_full_audit_trail(monkeypatch):
+    client, session, project_id, commits = _client(monkeypatch)
+    monkeypatch.setenv("ARTIFACT_HASH_MODE", "sync")
+    precomputed = []
+    monkeypatch.setattr("app.routes_agent.schedule_evidence_precompute", precomputed.append)
+    try:
+        resp = client.post(
+            "/agent/publish",
+            json={"project_id": project_id, "artifact_url": "https://example.com/app-v1.2.3.zip", "notes": "first"},
+        )
+        assert resp.status_code == 200
+        body = resp.json()
+        assert body["decision"] == "published"
+        assert body["release"]["version"] == "1.2.3" and body["route"]["slug"] == "demo-1-2-3"
+        assert len(commits) == 1
+
+        actions = session.scalars(select(models.Audit.action).order_by(models.Audit.id)).all()
+        assert actions == ["ingest", "search", "publish", "mint_route"]
+        release = session.get(models.Release, body["release"]["id"])
+        assert release.minhash is not None
+        assert precomputed == [release.id]
+    finally:
+        app.dependency_overrides.clear()
+
+
+def test_near_duplicate_review_keeps_audit_and_skips_release(monkeypatch):
+    client, session, project_id, commits = _client(monkeypatch)
+    notes = "Adds offline sync and fixes the login crash on startup"
+    try:
+        first = client.post(
+            "/agent/publish",
+            json={"project_id": project_id, "artifact_url": "https://example.com/app-v2.0.0.zip", "notes": notes},
+        )
+        assert first.json()["decision"] == "published"
+        commits.clear()
+
+        again = client.post(
+            "/agent/publish",
+            json={"project_id": project_id, "artifact_url": "https://example.com/app-v2.0.0.zip", "notes": notes},
+        )
+        body = again.json()
+        assert body["decision"] == "review"
+        assert body["near_duplicates"][0]["score"] == 1.0
+        assert len(commits) == 1
+        assert session.scalar(select(models.Audit.action).order_by(models.Audit.id.desc())) == "search"
+        assert len(session.scalars(select(models.Release.id)).all()) == 1
+    finally:
+        app.dependency_overrides.clear()
+
+
+def test_publish_batch_returns_per_item_decisions(monkeypatch, tmp_path):
+    client, session, project_id, commits = _client(monkeypatch)
+    monkeypatch.setenv("ARTIFACT_HASH_MODE", "sync")
+    artifact = tmp_path / "tool-v3.0.0.zip"
+    artifact.write_bytes(b"build output")
+    items = [
+        {"project_id": project_id, "artifact_url": "https://example.com/app-v1.0.0.zip", "notes": "one"},
+        {"project_id": project_id, "artifact_url": f"file://{artifact}", "notes": "tool build"},
+        {"project_id": project_id, "artifact_url": f"file://{artifact}", "notes": "tool build again"},
+        {"project_id": project_id, "artifact_url": "https://example.com/app-v1.0.1.zip", "dry_run": True},
+        {"project_id": 9999, "artifact_url": "https://example.com/x.zip"},
+        {"project_id": project_id},
+    ]
+    try:
+        resp = client.post("/agent/publish/batch", json={"items": items})
+        assert resp.status_code == 200
+        body = resp.json()
+        decisions = [r["decision"] for r in body["results"]]
+        assert decisions == ["published", "published", "review", "dry_run", "error", "error"]
+        assert body["results"][2]["duplicate_of"] == {"batch_index": 1}
+        assert body["results"][4]["error"] == "project_not_found"
+        assert body["results"][5]["error"] == "invalid_artifact_url"
+        assert body["summary"] == {"published": 2, "review": 1, "dry_run": 1, "error": 2}
+        assert len(commits) == 1
+
+        slugs = session.scalars(select(models.Route.slug).order_by(models.Route.id)).all()
+        assert slugs == ["demo-1-0-0", "demo-3-0-0"]
+        assert body["results"][1]["release"]["artifact_sha256"]
+
+        again = client.post("/agent/publish/batch", json={"items": items[1:2]}).json()
+        assert again["results"][0]["decision"] == "review"
+        assert again["results"][0]["duplicate_of"]["version"] == "3.0.0"
+    finally:
+        app.dependency_overrides.clear()
+
+
+def test_publish_batch_isolates_slug_race_and_in_batch_near_duplicates(monkeypatch):
+    client, session, project_id, commits = _client(monkeypatch)
+    notes = "Adds offline sync and fixes the login crash on startup"
+    five = "Rewrites the sync engine and drops the legacy export format"
+    items = [
+        {"project_id": project_id, "artifact_url": "https://example.com/app-v5.0.0.zip", "notes": five},
+        {"project_id": project_id, "artifact_url": "https://example.com/app-v6.0.0.zip", "notes": notes},
+        {"project_id": project_id, "artifact_url": "https://example.com/app-v6.0.0.zip", "notes": notes + "!"},
+        # Near-duplicate of item 0, which never gets created, so it is judged again and published.
+        {"project_id": project_id, "artifact_url": "https://example.com/app-v5.0.0.zip", "notes": five + "!"},
+    ]
+    raced = []
+
+    # A concurrent publish takes "demo-5-0-0" right after the batch checked which slugs are free.
+    @event.listens_for(session, "do_orm_execute")
+    def _race(state):
+        if raced or not state.is_select or "routes.slug" not in str(state.statement):
+            return None
+        raced.append(1)
+        frozen = state.invoke_statement().freeze()
+        session.connection().execute(
+            insert(models.Route.__table__).values(
+                user_id=1, project_id=project_id, slug="demo-5-0-0", target_url="https://example.com/other"
+            )
+        )
+        return frozen()
+
+    try:
+        body = client.post("/agent/publish/batch", json={"items": items}).json()
+        decisions = [r["decision"] for r in body["results"]]
+        assert decisions == ["error", "published", "review", "published"]
+        assert body["results"][0]["error"] == "slug_conflict"
+        assert body["results"][2]["near_duplicates"][-1]["batch_index"] == 1
+        assert all("batch_index" not in item for item in body["results"][3]["near_duplicates"])
+        assert len(commits) == 1
+        slugs = session.scalars(select(models.Route.slug).order_by(models.Route.id)).all()
+        assert slugs[:2] == ["demo-5-0-0", "demo-6-0-0"] and slugs[2].startswith("demo-5-0-0-")
+        assert len(session.scalars(select(models.Release.id)).all()) == 2
+    finally:
+        app.dependency_overrides.clear()
+
+
+def test_publish_batch_rejects_oversized_batches(monkeypatch):
+    client, _, project_id, _ = _client(monkeypatch)
+    monkeypatch.setenv("AGENT_BATCH_MAX_ITEMS", "2")
+    try:
+        item = {"project_id": project_id, "artifact_url": "https://example.com/a.zip"}
+        assert client.post("/agent/publish/batch", json={"items": [item] * 3}).status_code == 413
+        assert client.post("/agent/publish/batch", json={"items": []}).status_code == 422
+    finally:
+        app.dependency_overrides.clear()
+
+
+def test_publish_hashes_artifact_in_background_job(monkeypatch, tmp_path):
+    client, session, project_id, _ = _client(monkeypatch)
+    submitted, events = [], []
+    monkeypatch.setattr("app.routes_agent.submit_hash_job", submitted.append)
+    monkeypatch.setattr("app.hashing.enqueue_event", lambda user_id, event, payload: events.append((event, payload)))
+    precomputed = []
+    monkeypatch.setattr("app.routes_agent.schedule_evidence_precompute", precomputed.append)
+    monkeypatch.setattr("app.hashing.schedule_evidence_precompute", precomputed.append)
+    artifact = tmp_path / "svc-v4.0.0.zip"
+    artifact.write_bytes(b"svc build")
+    try:
+        body = client.post(
+            "/agent/publish",
+            json={"project_id": project_id, "artifact_url": f"file://{artifact}", "notes": "svc"},
+        ).json()
+        assert body["decision"] == "published"
+        # Pending state lives on the job only; the digest column stays NULL until it lands.
+        assert body["release"]["artifact_sha256"] is None
+        assert hash_job_pending(session, body["release"]["id"])
+        job_id = body["hash_job"]["id"]
+        assert submitted == [job_id]
+
+        # Evidence waits for the digest rather than bundling an empty one.
+        assert precomputed == []
+        digest = run_hash_job(job_id, db=session)
+        assert precomputed == [body["release"]["id"]]
+        assert digest and len(digest) == 64
+        assert session.get(models.Release, body["release"]["id"]).artifact_sha256 == digest
+        assert not hash_job_pending(session, body["release"]["id"])
+        assert events == [
+            (
+                "artifact_hashed",
+                {
+                    "job_id": job_id,
+                    "release_id": body["release"]["id"],
+                    "project_id": project_id,
+                    "status": "done",
+                    "artifact_sha256": digest,
+                },
+            )
+        ]
+
+        job = client.get(f"/api/hash-jobs/{job_id}").json()
+        assert job["status"] == "done" and job["artifact_sha256"] == digest
+        assert client.get("/api/hash-jobs/missing").status_code == 404
+    finally:
+        app.dependency_overrides.clear()
+
+
+def test_failed_hash_job_clears_legacy_pending_sentinel(monkeypatch):
+    _, session, project_id, _ = _client(monkeypatch)
+    monkeypatch.setattr("app.hashing.enqueue_event", lambda *args: None)
+    monkeypatch.setattr("app.hashing.schedule_evidence_precompute", lambda release_id: None)
+    try:
+        release = models.Release(
+            user_id=1, project_id=project_id, version="0.1.0", artifact_url="https://x.test/gone.zip",
+            artifact_sha256="pending",
+        )
+        session.add(release)
+        session.flush()
+        job = models.HashJob(
+            id="legacy", user_id=1, release_id=release.id, artifact_url=release.artifact_url, status="queued"
+        )
+        session.add(job)
+        session.commit()
+
+        assert run_hash_job("legacy", db=session) is None
+        assert session.get(models.Release, release.id).artifact_sha256 is None
+        assert session.get(models.HashJob, "legacy").status == "error"
+    finally:
+        app.dependency_overrides.clear()
+
+
+def test_requeue_skips_live_running_jobs_and_claims_once(monkeypatch):
+    from datetime import datetime, timedelta, timezone
+
+    from app.hashing import requeue_pending_jobs
+
+    _, session, project_id, _ = _client(monkeypatch)
+    submitted = []
+    monkeypatch.setattr("app.hashing.submit_hash_job", submitted.append)
+    try:
+        release = models.Release(user_id=1, project_id=project_id, version="0.2.0", artifact_url="https://x.test/a.zip")
+        session.add(release)
+        session.flush()
+        now = datetime.now(timezone.utc)
+        session.add_all(
+            [
+                models.HashJob(id="queued", user_id=1, release_id=release.id, artifact_url="u", status="queued"),
+                models.HashJob(
+                    id="live", user_id=1, release_id=release.id, artifact_url="u", status="running", started_at=now
+                ),
+                models.HashJob(
+                    id="stale", user_id=1, release_id=release.id, artifact_url="u", status="running",
+                    started_at=now - timedelta(hours=2),
+                ),
+            ]
+        )
+        session.commit()
+
+        assert requeue_pending_jobs(session) == 2
+        assert sorted(submitted) == ["queued", "stale"]
+        # A peer already runs "live": this worker's claim fails and nothing is hashed.
+        monkeypatch.setattr("app.hashing.compute_artifact_sha256", lambda *a, **k: pytest.fail("hashed twice"))
+        assert run_hash_job("live", db=session) is None
+    finally:
+        app.dependency_overrides.clear()
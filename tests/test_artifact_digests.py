@@ -0,0 +1,88 @@
+from pathlib import Path
+
+import httpx
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app import models
+from app.agent import lookup_exact_duplicate
+from app.agent.digests import artifact_digest
+from app.evidence import cached_artifact_sha256
+from app.hash_cache import store_remote
+
+
+def test_artifact_digest_rehashes_changed_local_file(tmp_path: Path):
+    artifact = tmp_path / "latest.zip"
+    artifact.write_bytes(b"v1")
+    url = f"file://{artifact}"
+
+    first, cached = artifact_digest(url)
+    assert first and cached is False
+    assert artifact_digest(url) == (first, True)
+
+    # Re-uploaded under the same URL: the stat no longer matches, so it is hashed again.
+    artifact.write_bytes(b"v2 bytes")
+    second, cached = artifact_digest(url)
+    assert second != first and cached is False
+    assert artifact_digest(url, compute=False) == (second, True)
+
+
+def test_remote_digest_is_reused_only_while_validators_match():
+    url = "https://x.test/latest.zip"
+    store_remote(url, "ab" * 32, etag='"v1"', last_modified=None, content_length=None)
+    current = {"etag": '"v1"'}
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        assert request.method == "HEAD"
+        if request.headers.get("if-none-match") == current["etag"]:
+            return httpx.Response(304)
+        return httpx.Response(200, headers={"ETag": current["etag"]})
+
+    client = httpx.Client(transport=httpx.MockTransport(handler))
+    assert cached_artifact_sha256(url, client=client) == "ab" * 32
+    current["etag"] = '"v2"'
+    assert cached_artifact_sha256(url, client=client) is None
+
+
+def test_remote_revalidation_uses_a_short_capped_timeout(monkeypatch):
+    url = "https://x.test/slow.zip"
+    store_remote(url, "cd" * 32, etag='"v1"', last_modified=None, content_length=None)
+    monkeypatch.setenv("ARTIFACT_REVALIDATE_TIMEOUT_SEC", "0.25")
+    seen = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        seen.append(request.extensions["timeout"])
+        raise httpx.ReadTimeout("slow origin", request=request)
+
+    client = httpx.Client(transport=httpx.MockTransport(handler))
+    assert cached_artifact_sha256(url, client=client) is None
+    assert seen == [{"connect": 0.25, "read": 0.25, "write": 0.25, "pool": 0.25}]
+
+
+def test_unreachable_artifacts_are_not_cached():
+    calls = []
+    for _ in range(2):
+        assert artifact_digest("https://x.test/missing.zip", hasher=lambda url: calls.append(url))[0] is None
+    assert len(calls) == 2
+
+
+def test_lookup_exact_duplicate_is_project_scoped(tmp_path: Path):
+    artifact = tmp_path / "build.zip"
+    artifact.write_bytes(b"same bytes")
+    url = f"file://{artifact}"
+
+    engine = create_engine("sqlite:///:memory:", future=True)
+    models.Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine, future=True)()
+
+    first = lookup_exact_duplicate(session, 1, url)
+    assert first.digest and first.duplicate is None
+    release = models.Release(
+        user_id=1, project_id=1, version="1.0.0", artifact_url=url, artifact_sha256=first.digest
+    )
+    session.add(release)
+    session.commit()
+
+    again = lookup_exact_duplicate(session, 1, url)
+    assert again.cached and again.duplicate is not None and again.duplicate.id == release.id
+    assert lookup_exact_duplicate(session, 2, url).duplicate is None
@@ -0,0 +1,71 @@
+import json
+from pathlib import Path
+
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app import models
+from app.embeddings import decode_embedding, encode_embedding, get_provider
+from app.embeddings.backfill import backfill_embeddings, load_checkpoint
+from app.similarity import VectorIndex, reset_release_index
+
+
+def _seed(SessionLocal):
+    model_id = get_provider().model_id
+    with SessionLocal() as session:
+        rows = [
+            ("missing", None, None),
+            ("legacy", json.dumps([0.0] * 768).encode(), None),
+            ("current", encode_embedding(get_provider().embed("current")), model_id),
+            ("other-model", encode_embedding([0.5] * 768), "local:some-model"),
+        ]
+        for idx, (notes, embedding, model) in enumerate(rows, start=1):
+            session.add(
+                models.Release(
+                    user_id=1,
+                    project_id=1,
+                    version=f"1.0.{idx}",
+                    notes=notes,
+                    artifact_url="https://example.com/a.zip",
+                    embedding=embedding,
+                    embedding_model=model,
+                )
+            )
+        session.commit()
+
+
+def test_backfill_embeds_stale_rows_and_rebuilds_index(tmp_path: Path, monkeypatch):
+    index_file = tmp_path / "releases.npz"
+    monkeypatch.setenv("SIMILARITY_INDEX_PATH", str(index_file))
+    reset_release_index()
+    engine = create_engine(
+        "sqlite://", future=True, connect_args={"check_same_thread": False}, poolclass=StaticPool
+    )
+    models.Base.metadata.create_all(engine)
+    SessionLocal = sessionmaker(bind=engine, future=True)
+    _seed(SessionLocal)
+    checkpoint = tmp_path / "checkpoint.json"
+
+    stats = backfill_embeddings(SessionLocal, batch_size=2, workers=2, checkpoint_path=str(checkpoint))
+
+    assert stats.updated == 3
+    assert stats.batches == 2
+    assert not checkpoint.exists()
+    model_id = get_provider().model_id
+    with SessionLocal() as session:
+        rows = session.execute(select(models.Release.notes, models.Release.embedding, models.Release.embedding_model)).all()
+    for notes, embedding, model in rows:
+        assert model == model_id
+        assert (decode_embedding(embedding) == get_provider().embed(notes)).all()
+
+    index = VectorIndex.load(str(index_file))
+    assert len(index) == 4 and index.model_id == model_id
+    reset_release_index()
+
+
+def test_checkpoint_is_ignored_for_another_model(tmp_path: Path):
+    path = tmp_path / "checkpoint.json"
+    path.write_text(json.dumps({"model_id": "hash-768", "last_id": 41}))
+    assert load_checkpoint(str(path), "hash-768") == 41
+    assert load_checkpoint(str(path), "local:other") == 0
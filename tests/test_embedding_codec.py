@@ -0,0 +1,57 @@
+import json
+
+import numpy as np
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import sessionmaker
+
+from app import models
+from app.db.migrate_embeddings import migrate
+from app.embeddings import decode_embedding, encode_embedding, is_encoded
+
+
+def test_float32_round_trip_is_compact():
+    vector = np.linspace(0, 1, 768, dtype=np.float32)
+    payload = encode_embedding(vector, "float32")
+    assert len(payload) == 4 + 768 * 4
+    assert payload[:2] == b"RF"
+    decoded = decode_embedding(payload)
+    assert decoded.dtype == np.float32
+    assert np.array_equal(decoded, vector)
+
+
+def test_float16_halves_size():
+    vector = np.linspace(0, 1, 768, dtype=np.float32)
+    payload = encode_embedding(vector, "float16")
+    assert len(payload) == 4 + 768 * 2
+    assert np.allclose(decode_embedding(payload), vector, atol=1e-3)
+
+
+def test_legacy_json_still_decodes():
+    assert decode_embedding(json.dumps([0.5, 0.25]).encode()).tolist() == [0.5, 0.25]
+    assert decode_embedding("[1, 2]").tolist() == [1.0, 2.0]
+    assert decode_embedding(b"\xff\xfe") is None
+    assert decode_embedding(None) is None
+
+
+def test_migration_rewrites_json_rows():
+    engine = create_engine("sqlite:///:memory:", future=True)
+    models.Base.metadata.create_all(engine)
+    Session = sessionmaker(bind=engine, future=True)
+    with Session() as session:
+        for idx, embedding in enumerate([json.dumps([0.1] * 4).encode(), encode_embedding([0.2] * 4), None]):
+            session.add(
+                models.Release(
+                    user_id=1,
+                    project_id=1,
+                    version=f"1.0.{idx}",
+                    artifact_url="https://example.com/a.zip",
+                    embedding=embedding,
+                )
+            )
+        session.commit()
+
+    assert migrate(engine) == {"rewritten": 1, "skipped": 1}
+    with Session() as session:
+        stored = session.scalars(select(models.Release.embedding).where(models.Release.embedding.isnot(None))).all()
+        assert all(is_encoded(raw) for raw in stored)
+    assert migrate(engine) == {"rewritten": 0, "skipped": 2}
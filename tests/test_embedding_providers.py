@@ -0,0 +1,52 @@
+import hashlib
+
+import numpy as np
+import pytest
+
+from app.embeddings import EmbeddingProvider, HashEmbeddingProvider, get_provider
+
+
+def _reference_hash_vector(text_value: str) -> list:
+    # The original per-byte implementation the stub must stay compatible with.
+    vec = []
+    current = text_value.encode("utf-8")
+    while len(vec) < 768:
+        current = hashlib.sha256(current).digest()
+        for b in current:
+            vec.append(b / 255.0)
+            if len(vec) >= 768:
+                break
+    return vec
+
+
+def test_hash_provider_matches_reference_and_batches():
+    provider = HashEmbeddingProvider()
+    texts = ["release notes v1.2.3", "", "ünïcode"]
+    matrix = provider.embed_batch(texts)
+    assert matrix.shape == (3, 768)
+    assert matrix.dtype == np.float32
+    for row, text_value in zip(matrix, texts):
+        assert np.allclose(row, _reference_hash_vector(text_value), atol=1e-6)
+    assert provider.embed_batch([]).shape == (0, 768)
+
+
+def test_unavailable_local_provider_falls_back_to_hash(monkeypatch):
+    monkeypatch.setenv("EMBEDDING_PROVIDER", "local")
+    monkeypatch.setattr("importlib.util.find_spec", lambda name: None)
+    provider = get_provider()
+    assert isinstance(provider, HashEmbeddingProvider)
+    assert provider.model_id == "hash-768"
+    monkeypatch.delenv("EMBEDDING_PROVIDER")
+    get_provider()
+
+
+def test_incomplete_provider_fails_at_instantiation():
+    class Partial(EmbeddingProvider):
+        name = "partial"
+
+        @property
+        def dim(self) -> int:
+            return 4
+
+    with pytest.raises(TypeError):
+        Partial()
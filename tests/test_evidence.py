@@ -1,14 +1,20 @@
 import io
 import json
+import os
 import zipfile
 from datetime import datetime, timedelta, timezone
 from pathlib import Path
 
+import httpx
+import pytest
 from sqlalchemy import create_engine
 from sqlalchemy.orm import Session, sessionmaker
 
 from app import models
-from app.evidence import build_evidence_zip, compute_artifact_sha256
+from app.evidence import build_evidence_zip, compute_artifact_sha256, stream_evidence_zip
+from app.hash_cache import lookup_remote
+from app.utils.interning import intern_referrer, intern_user_agent
+from app.utils.ipaddr import encode_ip
 
 
 def _make_session() -> Session:
@@ -26,6 +32,54 @@ def test_compute_artifact_sha256_local_file(tmp_path: Path):
     assert digest == "0dfc85ef1f8df522f0ad67f012956324b6dc34d00ba3ede7d483c10af37966d5"
 
 
+def test_local_hash_falls_back_to_readinto_without_mmap(tmp_path: Path, monkeypatch):
+    def no_mmap(*args, **kwargs):
+        raise OSError("mmap unsupported")
+
+    monkeypatch.setattr("app.evidence.mmap.mmap", no_mmap)
+    monkeypatch.setattr("app.evidence._STREAM_CHUNK_SIZE", 4)
+    target = tmp_path / "artifact.bin"
+    target.write_bytes(b"routeforge")
+    assert compute_artifact_sha256(str(target)) == "0dfc85ef1f8df522f0ad67f012956324b6dc34d00ba3ede7d483c10af37966d5"
+
+    empty = tmp_path / "empty.bin"
+    empty.write_bytes(b"")
+    assert compute_artifact_sha256(str(empty)) == "e3b0c44298fc1c149afbf4c8996fb92427ae41e4649b934ca495991b7852b855"
+
+
+def test_local_digest_is_reused_while_file_stat_is_unchanged(tmp_path: Path):
+    target = tmp_path / "artifact.bin"
+    target.write_bytes(b"routeforge")
+    first = compute_artifact_sha256(str(target))
+    stat = target.stat()
+
+    # Same size and mtime: the cached digest is trusted without reading the file.
+    target.write_bytes(b"ROUTEFORGE")
+    os.utime(target, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    assert compute_artifact_sha256(str(target)) == first
+
+    os.utime(target, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+    assert compute_artifact_sha256(str(target)) != first
+
+
+def test_remote_digest_is_revalidated_with_conditional_get():
+    requests = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        if request.headers.get("if-none-match") == '"v1"':
+            return httpx.Response(304, headers={"ETag": '"v1"'})
+        return httpx.Response(200, content=b"routeforge", headers={"ETag": '"v1"'})
+
+    client = httpx.Client(transport=httpx.MockTransport(handler))
+    url = "https://artifacts.test/build.bin"
+    expected = "0dfc85ef1f8df522f0ad67f012956324b6dc34d00ba3ede7d483c10af37966d5"
+    assert compute_artifact_sha256(url, client=client) == expected
+    assert lookup_remote(url).etag == '"v1"'
+    assert compute_artifact_sha256(url, client=client) == expected
+    assert [r.headers.get("if-none-match") for r in requests] == [None, '"v1"']
+
+
 def test_build_evidence_zip_contains_expected_files(tmp_path: Path):
     session = _make_session()
     now = datetime.now(timezone.utc)
@@ -40,6 +94,9 @@ def test_build_evidence_zip_contains_expected_files(tmp_path: Path):
         notes="First release",
         artifact_url="https://example.com/demo.tar.gz",
         artifact_sha256="abc123",
+        artifact_merkle_root="ff" * 32,
+        artifact_merkle_chunk_size=4096,
+        artifact_merkle_leaves=b"\x01" * 32 + b"\x02" * 32,
         created_at=now,
     )
     session.add(release)
@@ -59,9 +116,9 @@ def test_build_evidence_zip_contains_expected_files(tmp_path: Path):
     hit = models.RouteHit(
         route_id=route.id,
         ts=now - timedelta(days=1),
-        ip="127.0.0.1",
-        ua="pytest",
-        ref="https://example.com",
+        ip=encode_ip("127.0.0.1"),
+        ua_id=intern_user_agent(session, "pytest"),
+        ref_id=intern_referrer(session, "https://example.com"),
     )
     session.add(hit)
 
@@ -85,10 +142,19 @@ def test_build_evidence_zip_contains_expected_files(tmp_path: Path):
         release_doc = json.loads(archive.read("release.json"))
         assert release_doc["artifact_sha256"] == "abc123"
         assert release_doc["project"]["name"] == "Demo"
+        assert release_doc["artifact_merkle_root"] == "ff" * 32
+
+        merkle_doc = json.loads(archive.read("merkle.json"))
+        assert merkle_doc["chunk_size"] == 4096
+        assert merkle_doc["leaves"] == ["01" * 32, "02" * 32]
 
         hits_doc = archive.read("hits.csv").decode()
         lines = hits_doc.splitlines()
-        assert lines[0] == "ts,route_id,route_slug,ip,ua,ref"
+        assert lines[0] == "ts,route_id,route_slug,ip,ua,ref,dup_count"
+        assert {info.date_time for info in archive.infolist()} == {(1980, 1, 1, 0, 0, 0)}
+
+    # Canonical archives: rebuilding unchanged evidence yields identical bytes.
+    assert build_evidence_zip(release.id, session) == payload
 
 
 def test_build_evidence_zip_includes_license_content():
@@ -129,3 +195,40 @@ def test_build_evidence_zip_includes_license_content():
         license_text_custom = archive.read("LICENSE.md").decode()
         assert "Custom License" in license_text_custom
         assert "Redistribution restricted" in license_text_custom
+
+
+def test_stream_evidence_zip_emits_hits_incrementally(monkeypatch):
+    session = _make_session()
+    now = datetime.now(timezone.utc)
+    project = models.Project(user_id=1, name="Demo", owner="demo", description="", created_at=now)
+    session.add(project)
+    session.flush()
+    release = models.Release(
+        user_id=1, project_id=project.id, version="2.0.0", artifact_url="https://example.com/a.zip", created_at=now
+    )
+    session.add(release)
+    session.flush()
+    route = models.Route(
+        user_id=1, project_id=project.id, slug="busy", target_url="https://example.com", release_id=release.id
+    )
+    session.add(route)
+    session.flush()
+    session.add_all(
+        models.RouteHit(route_id=route.id, ts=now - timedelta(seconds=i), ip=encode_ip(f"10.0.{i // 256}.{i % 256}"))
+        for i in range(10000)
+    )
+    session.commit()
+
+    monkeypatch.setattr("app.evidence._ZIP_FLUSH_SIZE", 4096)
+    chunks = list(stream_evidence_zip(release.id, session))
+    # Three JSON members, at least one mid-stream piece of hits.csv, then the tail.
+    assert len(chunks) > 4
+    assert max(len(chunk) for chunk in chunks) < 64 * 1024
+
+    with zipfile.ZipFile(io.BytesIO(b"".join(chunks))) as archive:
+        lines = archive.read("hits.csv").decode().splitlines()
+        assert len(lines) == 10001
+        assert lines[1].split(",")[2:4] == ["busy", "10.0.0.0"]
+
+    with pytest.raises(ValueError):
+        stream_evidence_zip(9999, session)
@@ -0,0 +1,145 @@
+import io
+import zipfile
+from datetime import datetime, timezone
+
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app import models
+from app.app import app
+from app.db import try_get_session
+from app.evidence_cache import (
+    build_evidence_bundle,
+    evidence_watermark,
+    get_evidence_bundle,
+    precompute_evidence_bundle,
+)
+from app.hit_dedupe import HitDeduper
+
+
+def _session():
+    engine = create_engine(
+        "sqlite://", future=True, connect_args={"check_same_thread": False}, poolclass=StaticPool
+    )
+    models.Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine, autoflush=False, autocommit=False, future=True)()
+    now = datetime.now(timezone.utc)
+    project = models.Project(user_id=1, name="Demo", owner="demo", description="", created_at=now)
+    session.add(project)
+    session.flush()
+    release = models.Release(
+        user_id=1, project_id=project.id, version="1.0.0", artifact_url="https://example.com/a.zip", created_at=now
+    )
+    session.add(release)
+    session.commit()
+    return session, release.id
+
+
+def test_bundle_is_reused_until_watermark_moves(monkeypatch):
+    session, release_id = _session()
+    scheduled = []
+    monkeypatch.setattr("app.evidence_cache.schedule_evidence_rebuild", scheduled.append)
+    monkeypatch.setenv("EVIDENCE_CACHE_REFRESH_SEC", "0")
+
+    first = get_evidence_bundle(session, release_id)
+    assert first.fresh and first.path.is_file()
+    again = get_evidence_bundle(session, release_id)
+    assert again.fresh and again.sha256 == first.sha256
+    assert scheduled == []
+
+    session.add(models.Audit(entity_type="release", entity_id=release_id, action="attest", meta={}))
+    session.commit()
+    stale = get_evidence_bundle(session, release_id)
+    assert not stale.fresh and stale.sha256 == first.sha256
+    assert scheduled == [release_id]
+
+    rebuilt = build_evidence_bundle(session, release_id)
+    assert rebuilt.sha256 != first.sha256
+    assert not first.path.exists()
+    assert get_evidence_bundle(session, release_id).fresh
+
+    # Deterministic archives: an unchanged rebuild maps to the same blob.
+    assert build_evidence_bundle(session, release_id).sha256 == rebuilt.sha256
+    assert rebuilt.path.is_file()
+
+
+def test_public_evidence_supports_etag_and_range(monkeypatch):
+    session, release_id = _session()
+    app.dependency_overrides[try_get_session] = lambda: session
+    try:
+        client = TestClient(app)
+        url = f"/public/releases/{release_id}/evidence.zip"
+        full = client.get(url)
+        assert full.status_code == 200
+        etag = full.headers["etag"]
+        assert full.headers["accept-ranges"] == "bytes"
+        assert full.content[:2] == b"PK"
+
+        assert client.get(url, headers={"If-None-Match": etag}).status_code == 304
+
+        part = client.get(url, headers={"Range": "bytes=10-19"})
+        assert part.status_code == 206
+        assert part.content == full.content[10:20]
+        assert part.headers["content-range"] == f"bytes 10-19/{len(full.content)}"
+
+        tail = client.get(url, headers={"Range": "bytes=-5"})
+        assert tail.content == full.content[-5:]
+        assert client.get(url, headers={"Range": f"bytes={len(full.content)}-"}).status_code == 416
+        assert client.get("/public/releases/999/evidence.zip").status_code == 404
+    finally:
+        app.dependency_overrides.clear()
+
+
+def test_precompute_pins_each_distinct_bundle_once(monkeypatch):
+    session, release_id = _session()
+    pinned = []
+
+    def fake_pin(filename, content):
+        pinned.append(content)
+        return f"bafy{len(pinned)}"
+
+    monkeypatch.setattr("app.evidence_cache.enqueue_pin", fake_pin)
+    first = precompute_evidence_bundle(session, release_id, pin=True)
+    release = session.get(models.Release, release_id)
+    assert release.evidence_ipfs_cid == "bafy1"
+    assert pinned == [first.path.read_bytes()]
+
+    # Unchanged evidence: served from disk, not re-pinned.
+    assert precompute_evidence_bundle(session, release_id, pin=True).sha256 == first.sha256
+    assert len(pinned) == 1
+
+    release.license_code = "MIT"
+    session.commit()
+    second = precompute_evidence_bundle(session, release_id, pin=True)
+    assert second.sha256 != first.sha256
+    assert session.get(models.Release, release_id).evidence_ipfs_cid == "bafy2"
+    assert get_evidence_bundle(session, release_id).fresh
+
+
+def test_watermark_moves_when_duplicate_clicks_are_folded():
+    session, release_id = _session()
+    release = session.get(models.Release, release_id)
+    route = models.Route(
+        user_id=1, project_id=release.project_id, release_id=release_id, slug="dup", target_url="https://example.com"
+    )
+    session.add(route)
+    session.flush()
+    hit = models.RouteHit(route_id=route.id, ts=datetime.now(timezone.utc))
+    session.add(hit)
+    session.commit()
+
+    before = evidence_watermark(session, release)
+    deduper = HitDeduper(60.0)
+    deduper.remember(b"key", hit.id)
+    for _ in range(3):
+        assert deduper.check(b"key") == hit.id
+    assert deduper.flush(session) == 1
+    session.refresh(hit)
+    assert session.get(models.Route, route.id).dup_hits == 3
+    assert evidence_watermark(session, release) != before
+
+    with zipfile.ZipFile(io.BytesIO(build_evidence_bundle(session, release_id).path.read_bytes())) as archive:
+        rows = archive.read("hits.csv").decode().splitlines()
+    assert rows[0].endswith(",dup_count") and rows[1].endswith(",3")
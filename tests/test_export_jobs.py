@@ -0,0 +1,127 @@
+import csv
+import io
+import os
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session, sessionmaker
+
+from app import models
+from app.exports import (
+    create_export_job,
+    expire_local_exports,
+    export_file_path,
+    run_export_job,
+    serialize_export_job,
+)
+from app.utils.interning import intern_user_agent
+from app.utils.ipaddr import encode_ip
+
+
+def _make_session() -> Session:
+    engine = create_engine("sqlite:///:memory:", future=True)
+    models.Base.metadata.create_all(engine)
+    SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False, future=True)
+    return SessionLocal()
+
+
+def _seed(session: Session):
+    now = datetime.now(timezone.utc)
+    user = models.User(email="export@example.com", name="Export")
+    session.add(user)
+    session.flush()
+    project = models.Project(user_id=user.id, name="Demo", owner="demo", description="")
+    session.add(project)
+    session.flush()
+    routes = []
+    for slug in ("alpha", "beta"):
+        route = models.Route(user_id=user.id, project_id=project.id, slug=slug, target_url="https://example.com")
+        session.add(route)
+        session.flush()
+        routes.append(route)
+    ua_id = intern_user_agent(session, "pytest")
+    for idx in range(5):
+        session.add(models.RouteHit(route_id=routes[0].id, ts=now - timedelta(hours=idx), ip=encode_ip("10.0.0.1"), ua_id=ua_id))
+    session.add(
+        models.RouteHit(
+            route_id=routes[1].id, ts=now - timedelta(days=30), ip=encode_ip("10.0.0.2"), ua_id=intern_user_agent(session, "old")
+        )
+    )
+    session.commit()
+    return user, project, routes, now
+
+
+def test_run_export_job_writes_partitioned_files(tmp_path: Path, monkeypatch):
+    monkeypatch.setenv("EXPORT_ROOT", str(tmp_path))
+    monkeypatch.setenv("EXPORT_PARTITION_ROWS", "2")
+    session = _make_session()
+    user, project, routes, now = _seed(session)
+
+    job = create_export_job(
+        session,
+        user_id=user.id,
+        route_ids=[r.id for r in routes],
+        fmt="csv",
+        project_id=project.id,
+        since=now - timedelta(days=1),
+    )
+    run_export_job(job.id, db=session)
+
+    session.refresh(job)
+    assert job.status == "done"
+    assert job.rows_exported == 5
+    names = [entry["name"] for entry in job.files]
+    assert names == ["route-alpha-part-0001.csv", "route-alpha-part-0002.csv", "route-alpha-part-0003.csv"]
+
+    path = export_file_path(job, names[0])
+    assert path is not None
+    rows = list(csv.reader(io.StringIO(path.read_text())))
+    assert rows[0] == ["ts", "route_id", "route_slug", "ip", "ua", "ref", "dup_count"]
+    assert len(rows) == 3
+    assert rows[1][3] == "10.0.0.1"
+
+    payload = serialize_export_job(job)
+    assert payload["files"][0]["url"].endswith(f"/api/exports/{job.id}/files/{names[0]}")
+
+
+def test_run_export_job_marks_unknown_routes_as_empty(tmp_path: Path, monkeypatch):
+    monkeypatch.setenv("EXPORT_ROOT", str(tmp_path))
+    session = _make_session()
+    user, project, routes, now = _seed(session)
+
+    job = create_export_job(session, user_id=user.id, route_ids=[9999], fmt="jsonl")
+    run_export_job(job.id, db=session)
+
+    session.refresh(job)
+    assert job.status == "done"
+    assert job.rows_exported == 0
+    assert job.files == []
+
+
+def test_create_export_job_expires_old_local_exports(tmp_path: Path, monkeypatch):
+    monkeypatch.setenv("EXPORT_ROOT", str(tmp_path))
+    monkeypatch.setenv("EXPORT_RETENTION_DAYS", "7")
+    old = tmp_path / ("a" * 32)
+    fresh = tmp_path / ("b" * 32)
+    unrelated = tmp_path / "keep-me"
+    for directory in (old, fresh, unrelated):
+        directory.mkdir()
+        (directory / "route-alpha-part-0001.csv").write_text("ts\n")
+    stale = time.time() - 8 * 86400
+    os.utime(old, (stale, stale))
+    os.utime(unrelated, (stale, stale))
+
+    session = _make_session()
+    user, project, routes, now = _seed(session)
+    create_export_job(session, user_id=user.id, route_ids=[routes[0].id], fmt="csv")
+
+    assert not old.exists()
+    assert fresh.is_dir()
+    assert unrelated.is_dir()
+
+    monkeypatch.setenv("EXPORT_RETENTION_DAYS", "0")
+    os.utime(fresh, (stale, stale))
+    assert expire_local_exports() == 0
+    assert fresh.is_dir()
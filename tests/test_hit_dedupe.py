@@ -0,0 +1,107 @@
+import threading
+from datetime import datetime
+
+from sqlalchemy import create_engine, func, select
+from sqlalchemy.orm import sessionmaker
+
+from app import models
+from app.db.retention import apply_retention
+from app import hit_dedupe
+from app.hit_dedupe import HitDeduper, hit_key
+
+
+class _Clock:
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def _make_sessionmaker():
+    engine = create_engine("sqlite:///:memory:", future=True)
+    models.Base.metadata.create_all(engine)
+    return engine, sessionmaker(bind=engine, autoflush=False, autocommit=False, future=True)
+
+
+def test_duplicates_inside_window_fold_into_first_hit():
+    clock = _Clock()
+    deduper = HitDeduper(10, clock=clock)
+    key = hit_key(1, b"\x0a\x00\x00\x01", "bot/1.0")
+
+    assert deduper.check(key) is None
+    deduper.remember(key, 42)
+    clock.now += 3
+    assert deduper.check(key) == 42
+    assert deduper.check(hit_key(1, b"\x0a\x00\x00\x02", "bot/1.0")) is None
+    clock.now += 9
+    assert deduper.check(key) is None
+    assert deduper.pending_total() == 1
+
+
+def test_disabled_window_never_dedupes():
+    deduper = HitDeduper(0)
+    key = hit_key(1, None, None)
+    deduper.remember(key, 1)
+    assert deduper.check(key) is None
+
+
+def test_flush_updates_dup_count_and_retention_keeps_totals():
+    engine, SessionLocal = _make_sessionmaker()
+    clock = _Clock()
+    deduper = HitDeduper(10, clock=clock)
+    old = datetime(2024, 1, 10, 8, 5)
+
+    with SessionLocal() as session:
+        route = models.Route(user_id=1, project_id=1, slug="demo", target_url="https://example.com")
+        session.add(route)
+        session.flush()
+        hit = models.RouteHit(route_id=route.id, ts=old)
+        session.add(hit)
+        session.commit()
+        key = hit_key(route.id, None, "bot")
+        deduper.remember(key, hit.id)
+        for _ in range(4):
+            deduper.check(key)
+        assert deduper.flush(session) == 1
+        assert session.scalar(select(models.RouteHit.dup_count)) == 4
+        route_id = route.id
+
+    apply_retention(engine, retention_days=30, now=datetime(2024, 6, 1))
+    with SessionLocal() as session:
+        hourly = session.scalar(
+            select(func.sum(models.RouteHitHourly.hits)).where(models.RouteHitHourly.route_id == route_id)
+        )
+        assert hourly == 5
+
+
+def test_flush_timer_flushes_without_new_duplicates(monkeypatch):
+    _, SessionLocal = _make_sessionmaker()
+    clock = _Clock()
+    deduper = HitDeduper(10, clock=clock)
+    with SessionLocal() as session:
+        hit = models.RouteHit(route_id=1)
+        session.add(hit)
+        session.commit()
+        hit_id = hit.id
+    key = hit_key(1, None, "bot")
+    deduper.remember(key, hit_id)
+    deduper.check(key)
+    clock.now += 60  # no further duplicates arrive, but the flush age has passed
+
+    stop = threading.Event()
+    flushed = []
+    monkeypatch.setattr(hit_dedupe, "get_deduper", lambda: deduper)
+    monkeypatch.setattr(hit_dedupe, "try_get_session", SessionLocal)
+    real_flush = hit_dedupe.flush_pending_hits
+
+    def flush_once(db=None):
+        flushed.append(real_flush(db))
+        stop.set()
+
+    monkeypatch.setattr(hit_dedupe, "flush_pending_hits", flush_once)
+    hit_dedupe._flush_loop(stop, 0.01)
+
+    assert flushed == [1]
+    with SessionLocal() as session:
+        assert session.scalar(select(models.RouteHit.dup_count)) == 1
@@ -0,0 +1,55 @@
+from sqlalchemy import create_engine, func, select
+from sqlalchemy.orm import Session, sessionmaker
+
+from app import models
+from app.utils.interning import LRUCache, clear_cache, intern_referrer, intern_user_agent, lookup_values
+
+
+def _make_session() -> Session:
+    engine = create_engine("sqlite:///:memory:", future=True)
+    models.Base.metadata.create_all(engine)
+    SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False, future=True)
+    return SessionLocal()
+
+
+def test_intern_reuses_ids_and_skips_blank_values():
+    clear_cache()
+    session = _make_session()
+
+    first = intern_user_agent(session, "Mozilla/5.0")
+    session.commit()
+    assert intern_user_agent(session, "Mozilla/5.0") == first
+    assert intern_user_agent(session, "curl/8.0") != first
+    assert intern_user_agent(session, "   ") is None
+    assert intern_referrer(session, None) is None
+    session.commit()
+
+    assert session.scalar(select(func.count(models.UserAgent.id))) == 2
+    assert lookup_values(session, models.UserAgent, [first, None]) == {first: "Mozilla/5.0"}
+
+
+def test_hits_resolve_interned_strings():
+    clear_cache()
+    session = _make_session()
+    route = models.Route(user_id=1, project_id=1, slug="demo", target_url="https://example.com")
+    session.add(route)
+    session.flush()
+    ref_id = intern_referrer(session, "https://news.example.com")
+    for _ in range(3):
+        session.add(models.RouteHit(route_id=route.id, ref_id=ref_id, ua_id=intern_user_agent(session, "bot")))
+    session.commit()
+
+    assert session.scalar(select(func.count(models.Referrer.id))) == 1
+    hit = session.scalars(select(models.RouteHit)).first()
+    assert hit.referrer.value == "https://news.example.com"
+    assert hit.user_agent.value == "bot"
+
+
+def test_lru_cache_evicts_oldest():
+    cache = LRUCache(2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+    cache.put("c", 3)
+    assert cache.get("b") is None
+    assert len(cache) == 2
@@ -0,0 +1,34 @@
+from app.utils.ipaddr import decode_ip, encode_ip
+
+
+def test_encode_round_trips_v4_and_v6():
+    assert encode_ip("203.0.113.9") == bytes([203, 0, 113, 9])
+    assert decode_ip(encode_ip("203.0.113.9:443")) == "203.0.113.9"
+    assert decode_ip(encode_ip("::ffff:10.1.2.3")) == "10.1.2.3"
+    assert decode_ip(encode_ip("[2001:db8::1]:8080")) == "2001:db8::1"
+    assert encode_ip("not-an-ip") is None
+    assert encode_ip(None) is None
+
+
+def test_truncate_mode_masks_host_bits(monkeypatch):
+    monkeypatch.setenv("IP_ANONYMIZE", "truncate")
+    assert decode_ip(encode_ip("203.0.113.9")) == "203.0.113.0"
+    assert decode_ip(encode_ip("2001:db8:1234:5678::1")) == "2001:db8:1234::"
+
+
+def test_hash_mode_is_keyed_and_stable(monkeypatch):
+    monkeypatch.setenv("IP_ANONYMIZE", "hash")
+    monkeypatch.setenv("IP_HASH_KEY", "k1")
+    first = encode_ip("203.0.113.9")
+    assert len(first) == 12
+    assert encode_ip("203.0.113.9") == first
+    assert decode_ip(first).startswith("anon-")
+    monkeypatch.setenv("IP_HASH_KEY", "k2")
+    assert encode_ip("203.0.113.9") != first
+
+
+def test_hash_mode_without_key_truncates(monkeypatch):
+    monkeypatch.setenv("IP_ANONYMIZE", "hash")
+    monkeypatch.delenv("IP_HASH_KEY", raising=False)
+    monkeypatch.delenv("SESSION_SECRET", raising=False)
+    assert decode_ip(encode_ip("203.0.113.9")) == "203.0.113.0"
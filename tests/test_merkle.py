@@ -0,0 +1,84 @@
+import hashlib
+from pathlib import Path
+
+import httpx
+
+from app.merkle import (
+    MerkleBuilder,
+    compute_artifact_merkle,
+    hash_artifact_with_merkle,
+    merkle_file,
+    merkle_proof,
+    merkle_remote,
+    merkle_root,
+    verify_chunk,
+)
+
+
+def _leaf(data: bytes) -> bytes:
+    return hashlib.sha256(b"\x00" + data).digest()
+
+
+def _node(left: bytes, right: bytes) -> bytes:
+    return hashlib.sha256(b"\x01" + left + right).digest()
+
+
+def test_merkle_file_matches_reference_tree(tmp_path: Path):
+    data = bytes(range(256)) * 5  # 1280 bytes -> 3 chunks of 512
+    target = tmp_path / "artifact.bin"
+    target.write_bytes(data)
+
+    tree = merkle_file(target, chunk_size=512, workers=3)
+    leaves = [_leaf(data[0:512]), _leaf(data[512:1024]), _leaf(data[1024:])]
+    assert tree.leaves == leaves
+    assert tree.root == _node(_node(leaves[0], leaves[1]), leaves[2]).hex()
+    assert tree.size == len(data)
+    # Worker count does not change the result.
+    assert merkle_file(target, chunk_size=512, workers=1).root == tree.root
+    assert compute_artifact_merkle(f"file://{target}", chunk_size=512).root == tree.root
+
+
+def test_single_chunk_can_be_reverified_against_root():
+    chunks = [bytes([i]) * 100 for i in range(5)]
+    leaves = [_leaf(chunk) for chunk in chunks]
+    root = merkle_root(leaves).hex()
+    for index, chunk in enumerate(chunks):
+        proof = merkle_proof(leaves, index)
+        assert verify_chunk(chunk, proof, root)
+        assert not verify_chunk(chunk + b"x", proof, root)
+
+
+def test_merkle_remote_uses_range_requests():
+    data = b"routeforge" * 100
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        if request.method == "HEAD":
+            return httpx.Response(200, headers={"Content-Length": str(len(data)), "Accept-Ranges": "bytes"})
+        start, end = (int(x) for x in request.headers["range"].removeprefix("bytes=").split("-"))
+        return httpx.Response(206, content=data[start : end + 1])
+
+    client = httpx.Client(transport=httpx.MockTransport(handler))
+    tree = merkle_remote("https://artifacts.test/a.bin", chunk_size=300, workers=4, client=client)
+    assert len(tree.leaves) == 4
+    assert tree.leaves[3] == _leaf(data[900:])
+    assert tree.root == merkle_root([_leaf(data[i : i + 300]) for i in range(0, len(data), 300)]).hex()
+
+    no_ranges = httpx.Client(transport=httpx.MockTransport(lambda request: httpx.Response(200, content=data)))
+    assert merkle_remote("https://artifacts.test/a.bin", chunk_size=300, client=no_ranges) is None
+
+
+def test_hash_artifact_with_merkle_downloads_once():
+    data = b"routeforge" * 100
+    requests = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append((request.method, request.headers.get("range")))
+        return httpx.Response(200, content=data)
+
+    client = httpx.Client(transport=httpx.MockTransport(handler))
+    digest, tree = hash_artifact_with_merkle("https://artifacts.test/b.bin", chunk_size=300, client=client)
+    assert requests == [("GET", None)]
+    assert digest == hashlib.sha256(data).hexdigest()
+    assert tree.size == len(data)
+    assert tree.root == merkle_root([_leaf(data[i : i + 300]) for i in range(0, len(data), 300)]).hex()
+    assert MerkleBuilder(300).finish().leaves == [_leaf(b"")]
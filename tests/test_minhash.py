@@ -0,0 +1,73 @@
+from sqlalchemy import create_engine, func, select
+from sqlalchemy.orm import sessionmaker
+
+from app import models
+from app.similarity.minhash import (
+    BANDS,
+    backfill_release_minhash,
+    estimate_jaccard,
+    features,
+    find_near_duplicates,
+    index_release_minhash,
+    release_signature,
+)
+
+
+def _session():
+    engine = create_engine("sqlite:///:memory:", future=True)
+    models.Base.metadata.create_all(engine)
+    return sessionmaker(bind=engine, future=True)()
+
+
+def _release(session, notes, url="https://example.com/dl/app-v1.2.3.zip"):
+    release = models.Release(user_id=1, project_id=1, version="1.2.3", notes=notes, artifact_url=url)
+    session.add(release)
+    session.flush()
+    return release
+
+
+def test_features_include_bigrams_and_filename_tokens():
+    feats = features("Fix Login bug", "https://x.test/builds/app-v2.zip?sig=1")
+    assert {"fix", "login bug", "f:app", "f:v2", "f:zip"} <= feats
+    assert "f:sig" not in feats
+
+
+def test_estimate_tracks_true_jaccard():
+    base = " ".join(f"word{i}" for i in range(40))
+    same = release_signature(base, None)
+    assert estimate_jaccard(same, release_signature(base, None)) == 1.0
+
+    shifted = " ".join(f"word{i}" for i in range(20, 60))
+    a, b = features(base, None), features(shifted, None)
+    true_jaccard = len(a & b) / len(a | b)
+    estimate = estimate_jaccard(release_signature(base, None), release_signature(shifted, None))
+    assert abs(estimate - true_jaccard) < 0.2
+
+
+def test_near_duplicates_found_via_bands():
+    session = _session()
+    dup = _release(session, "Release 1.2.3 fixes crash on startup and improves sync speed")
+    other = _release(session, "Totally different changelog about billing exports", "https://example.com/billing.tar.gz")
+    index_release_minhash(session, dup)
+    index_release_minhash(session, other)
+    session.commit()
+    assert session.scalar(select(func.count()).select_from(models.ReleaseLSHBand)) == 2 * BANDS
+
+    found = find_near_duplicates(
+        session,
+        "Release 1.2.3 fixes crash on startup and improves sync speed",
+        "https://cdn.example.com/app-v1.2.3.zip",
+    )
+    assert [item["id"] for item in found] == [dup.id]
+    assert found[0]["score"] == 1.0
+    assert find_near_duplicates(session, "unrelated words entirely", None) == []
+
+
+def test_backfill_signs_unsigned_releases():
+    session = _session()
+    _release(session, "first notes")
+    _release(session, None)
+    session.commit()
+    assert backfill_release_minhash(session, batch_size=1) == 2
+    assert backfill_release_minhash(session) == 0
+    assert session.scalar(select(func.count()).select_from(models.Release).where(models.Release.minhash.is_(None))) == 0
@@ -0,0 +1,178 @@
+import threading
+from datetime import datetime, timezone
+
+import pytest
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app import models
+from app.storage import pin_queue
+from app.storage.cid import compute_cid
+
+
+def _factory():
+    engine = create_engine(
+        "sqlite://", future=True, connect_args={"check_same_thread": False}, poolclass=StaticPool
+    )
+    models.Base.metadata.create_all(engine)
+    return sessionmaker(bind=engine, autoflush=False, autocommit=False, future=True)
+
+
+def _setup(monkeypatch):
+    factory = _factory()
+    submitted = []
+    monkeypatch.setenv("PINATA_JWT", "test")
+    monkeypatch.setattr(pin_queue, "try_get_session", factory)
+    monkeypatch.setattr(pin_queue, "_submit", lambda cid, filename: submitted.append((cid, filename)))
+    monkeypatch.setattr(pin_queue, "_inflight", set())
+    monkeypatch.setattr(pin_queue, "_pinned", {})
+    monkeypatch.setattr(pin_queue, "_uploads", {})
+    monkeypatch.setattr(pin_queue.time, "sleep", lambda _s: None)
+    return factory, submitted
+
+
+def test_compute_cid_matches_ipfs():
+    assert compute_cid(b"") == "bafkreihdwdcefgh4dqkjv67uzcmw7ojee6xedzdetojuzjevtenxquvyku"
+    assert compute_cid(b"hello world") == "bafkreifzjut3te2nhyekklss27nh3k72ysco7y32koao5eei66wof36n5e"
+    chunked = compute_cid(b"x" * 3000, chunk_size=1024, max_links=2)
+    assert chunked.startswith("bafy") and chunked != compute_cid(b"x" * 3000)
+
+
+def test_enqueue_returns_cid_immediately_and_dedupes(monkeypatch):
+    factory, submitted = _setup(monkeypatch)
+
+    cid = pin_queue.enqueue_pin("a.json", b"hello world")
+    assert cid == compute_cid(b"hello world")
+    assert pin_queue.enqueue_pin("b.json", b"hello world") == cid
+    assert submitted == [(cid, "a.json")]
+    with factory() as db:
+        assert db.get(models.IpfsPin, cid).status == "queued"
+
+
+def test_run_pin_retries_and_repoints_releases(monkeypatch):
+    factory, submitted = _setup(monkeypatch)
+    cid = pin_queue.enqueue_pin("evidence.zip", b"bundle")
+    with factory() as db:
+        now = datetime.now(timezone.utc)
+        project = models.Project(user_id=1, name="Demo", owner="demo", description="", created_at=now)
+        db.add(project)
+        db.flush()
+        db.add(models.Release(user_id=1, project_id=project.id, version="1", artifact_url="x", evidence_ipfs_cid=cid, created_at=now))
+        db.commit()
+
+    calls = []
+
+    def flaky(filename, content, *, client=None):
+        calls.append(content)
+        return None if len(calls) < 3 else "bafyprovider"
+
+    monkeypatch.setattr(pin_queue, "pin_bytes", flaky)
+    assert pin_queue.run_pin(cid, "evidence.zip") == "bafyprovider"
+    assert calls == [b"bundle"] * 3
+
+    with factory() as db:
+        row = db.get(models.IpfsPin, cid)
+        assert (row.status, row.attempts, row.provider_cid) == ("pinned", 3, "bafyprovider")
+        assert db.query(models.Release).one().evidence_ipfs_cid == "bafyprovider"
+    assert pin_queue.enqueue_pin("again.zip", b"bundle") == "bafyprovider"
+    assert len(submitted) == 1
+    pin_queue.shutdown_pin_queue()
+
+
+def test_failed_pin_is_retried_after_backoff(monkeypatch):
+    factory, submitted = _setup(monkeypatch)
+    monkeypatch.setenv("IPFS_PIN_RETRIES", "2")
+    cid = pin_queue.enqueue_pin("metadata.json", b"{}")
+    monkeypatch.setattr(pin_queue, "pin_bytes", lambda filename, content, *, client=None: None)
+    assert pin_queue.run_pin(cid, "metadata.json") is None
+
+    with factory() as db:
+        row = db.get(models.IpfsPin, cid)
+        assert (row.status, row.error, row.attempts) == ("error", "upload_failed", 2)
+        assert row.next_attempt_at is not None
+        # Not due yet: the spooled bytes are kept but nothing is resubmitted.
+        assert pin_queue.requeue_pending_pins(db) == 0
+        row.next_attempt_at = datetime(2000, 1, 1, tzinfo=timezone.utc)
+        db.commit()
+        assert pin_queue.requeue_pending_pins(db) == 1
+    assert submitted[-1] == (cid, "metadata.json")
+
+    monkeypatch.setattr(pin_queue, "pin_bytes", lambda filename, content, *, client=None: cid)
+    assert pin_queue.run_pin(cid, "metadata.json") == cid
+    with factory() as db:
+        row = db.get(models.IpfsPin, cid)
+        assert (row.status, row.error, row.next_attempt_at) == ("pinned", None, None)
+    pin_queue.shutdown_pin_queue()
+
+
+def test_web3_multi_chunk_content_pins_synchronously(monkeypatch):
+    factory, submitted = _setup(monkeypatch)
+    monkeypatch.delenv("PINATA_JWT")
+    monkeypatch.setenv("WEB3_STORAGE_TOKEN", "test")
+    monkeypatch.setenv("IPFS_CHUNK_SIZE", "1024")
+    uploads = []
+
+    def pin(filename, content, *, client=None):
+        uploads.append(filename)
+        return "bafyweb3"
+
+    monkeypatch.setattr(pin_queue, "pin_bytes", pin)
+    # One chunk is a single raw block, so the local CID matches web3.storage and the upload is deferred.
+    small = pin_queue.enqueue_pin("small.json", b"{}")
+    assert small == compute_cid(b"{}") and submitted == [(small, "small.json")]
+
+    # Larger content is chunked differently by web3.storage: upload now and return its CID.
+    assert pin_queue.enqueue_pin("big.zip", b"x" * 3000) == "bafyweb3"
+    assert uploads == ["big.zip"] and len(submitted) == 1
+    with factory() as db:
+        row = db.get(models.IpfsPin, pin_queue.local_cid(b"x" * 3000))
+        assert (row.status, row.provider_cid) == ("pinned", "bafyweb3")
+    assert pin_queue.enqueue_pin("big.zip", b"x" * 3000) == "bafyweb3"
+    assert uploads == ["big.zip"]
+    pin_queue.shutdown_pin_queue()
+
+
+def test_failed_enqueue_does_not_leave_cid_in_flight(monkeypatch):
+    factory, submitted = _setup(monkeypatch)
+
+    def broken():
+        raise RuntimeError("db down")
+
+    monkeypatch.setattr(pin_queue, "try_get_session", broken)
+    with pytest.raises(RuntimeError):
+        pin_queue.enqueue_pin("a.json", b"retry me")
+    assert pin_queue._inflight == set()
+
+    monkeypatch.setattr(pin_queue, "try_get_session", factory)
+    cid = pin_queue.enqueue_pin("a.json", b"retry me")
+    assert submitted == [(cid, "a.json")]
+
+
+def test_concurrent_synchronous_pins_upload_once(monkeypatch):
+    _setup(monkeypatch)
+    monkeypatch.delenv("PINATA_JWT")
+    monkeypatch.setenv("WEB3_STORAGE_TOKEN", "test")
+    monkeypatch.setenv("IPFS_CHUNK_SIZE", "1024")
+    started, release = threading.Event(), threading.Event()
+    uploads = []
+
+    def pin(filename, content, *, client=None):
+        uploads.append(filename)
+        started.set()
+        release.wait(5)
+        return "bafyweb3"
+
+    monkeypatch.setattr(pin_queue, "pin_bytes", pin)
+    results = []
+    first = threading.Thread(target=lambda: results.append(pin_queue.enqueue_pin("big.zip", b"y" * 3000)))
+    first.start()
+    assert started.wait(5)
+    second = threading.Thread(target=lambda: results.append(pin_queue.enqueue_pin("big.zip", b"y" * 3000)))
+    second.start()
+    release.set()
+    first.join(5)
+    second.join(5)
+    assert results == ["bafyweb3", "bafyweb3"] and uploads == ["big.zip"]
+    pin_queue.shutdown_pin_queue()
@@ -0,0 +1,80 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, func, select
+from sqlalchemy.orm import sessionmaker
+
+from app import models
+from app.db.retention import apply_retention, partition_name
+
+
+def _make_engine():
+    engine = create_engine("sqlite:///:memory:", future=True)
+    models.Base.metadata.create_all(engine)
+    return engine
+
+
+def test_apply_retention_downsamples_and_prunes_expired_hits():
+    engine = _make_engine()
+    SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False, future=True)
+    now = datetime(2024, 6, 15, 12, 30)
+    old_hour = datetime(2024, 1, 10, 8, 0)
+
+    with SessionLocal() as session:
+        project = models.Project(user_id=1, name="Demo", owner="demo", description="")
+        session.add(project)
+        session.flush()
+        route = models.Route(user_id=1, project_id=project.id, slug="demo", target_url="https://example.com")
+        session.add(route)
+        session.flush()
+        for minute in (1, 15, 59):
+            session.add(models.RouteHit(route_id=route.id, ts=old_hour + timedelta(minutes=minute)))
+        session.add(models.RouteHit(route_id=route.id, ts=old_hour + timedelta(hours=1, minutes=5)))
+        session.add(models.RouteHit(route_id=route.id, ts=now - timedelta(days=1)))
+        session.commit()
+        route_id = route.id
+
+    summary = apply_retention(engine, retention_days=30, now=now)
+    assert summary["rows_downsampled"] == 4
+
+    # Running again is a no-op: nothing left to fold in and buckets are not double counted.
+    apply_retention(engine, retention_days=30, now=now)
+
+    with SessionLocal() as session:
+        remaining = session.scalar(select(func.count(models.RouteHit.id)))
+        assert remaining == 1
+
+        buckets = session.execute(
+            select(models.RouteHitHourly.bucket_ts, models.RouteHitHourly.hits)
+            .where(models.RouteHitHourly.route_id == route_id)
+            .order_by(models.RouteHitHourly.bucket_ts)
+        ).all()
+        assert [(b.bucket_ts, b.hits) for b in buckets] == [
+            (old_hour, 3),
+            (old_hour + timedelta(hours=1), 1),
+        ]
+
+
+def test_archived_clicks_count_without_retention_env(monkeypatch):
+    from app.routes_analytics import _archived_clicks_by_day
+
+    # Retention ran from scripts/retention.py --days N; the web process has no HIT_RETENTION_DAYS.
+    monkeypatch.delenv("HIT_RETENTION_DAYS", raising=False)
+    engine = _make_engine()
+    SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False, future=True)
+    with SessionLocal() as session:
+        session.add(models.RouteHit(route_id=7, ts=datetime(2024, 1, 10, 8, 5)))
+        session.commit()
+    apply_retention(engine, retention_days=30, now=datetime(2024, 6, 15))
+
+    with SessionLocal() as session:
+        assert _archived_clicks_by_day(session, datetime(2024, 1, 1), route_id=7) == {"2024-01-10": 1}
+
+
+def test_apply_retention_disabled_by_default(monkeypatch):
+    monkeypatch.delenv("HIT_RETENTION_DAYS", raising=False)
+    engine = _make_engine()
+    assert apply_retention(engine) == {"partitions_dropped": 0, "rows_downsampled": 0}
+
+
+def test_partition_name_is_monthly():
+    assert partition_name(datetime(2024, 3, 1)) == "p202403"
@@ -0,0 +1,144 @@
+import hashlib
+import hmac
+import xml.etree.ElementTree as ET
+from urllib.parse import parse_qsl, quote
+
+import httpx
+from fastapi.testclient import TestClient
+
+from app.app import app
+from app.storage import s3
+
+SECRET = "test-secret"
+
+
+class FakeS3:
+    """In-memory S3-compatible stand-in that checks SigV4 query signatures."""
+
+    def __init__(self):
+        self.uploads = {}
+        self.objects = {}
+
+    def _verify(self, request: httpx.Request) -> dict:
+        params = dict(parse_qsl(request.url.query.decode(), keep_blank_values=True))
+        signature = params.pop("X-Amz-Signature")
+        query = "&".join(
+            f"{quote(k, safe='-_.~')}={quote(v, safe='-_.~')}" for k, v in sorted(params.items())
+        )
+        canonical = "\n".join(
+            [request.method, request.url.raw_path.split(b"?")[0].decode(), query, f"host:{request.url.netloc.decode()}\n", "host", "UNSIGNED-PAYLOAD"]
+        )
+        date_stamp, region, service, _ = params["X-Amz-Credential"].split("/", 1)[1].split("/")
+        key = ("AWS4" + SECRET).encode()
+        for part in (date_stamp, region, service, "aws4_request"):
+            key = hmac.new(key, part.encode(), hashlib.sha256).digest()
+        to_sign = "\n".join(
+            ["AWS4-HMAC-SHA256", params["X-Amz-Date"], f"{date_stamp}/{region}/{service}/aws4_request", hashlib.sha256(canonical.encode()).hexdigest()]
+        )
+        assert hmac.compare_digest(hmac.new(key, to_sign.encode(), hashlib.sha256).hexdigest(), signature)
+        return params
+
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        params = self._verify(request)
+        key = request.url.path.split("/", 2)[2]
+        if request.method == "POST" and "uploads" in params:
+            upload_id = f"up-{len(self.uploads) + 1}"
+            self.uploads[upload_id] = {}
+            body = f'<InitiateMultipartUploadResult xmlns="http://s3.amazonaws.com/doc/2006-03-01/"><UploadId>{upload_id}</UploadId></InitiateMultipartUploadResult>'
+            return httpx.Response(200, content=body.encode())
+        parts = self.uploads.get(params.get("uploadId"))
+        if parts is None:
+            return httpx.Response(404, content=b"<Error><Code>NoSuchUpload</Code></Error>")
+        if request.method == "PUT":
+            data = request.read()
+            parts[int(params["partNumber"])] = data
+            return httpx.Response(200, headers={"ETag": f'"{hashlib.md5(data).hexdigest()}"'})
+        if request.method == "POST":
+            listed = [
+                (int(part.findtext("PartNumber")), part.findtext("ETag").strip('"'))
+                for part in ET.fromstring(request.read()).iter("Part")
+            ]
+            for number, etag in listed:
+                if number not in parts or hashlib.md5(parts[number]).hexdigest() != etag:
+                    return httpx.Response(200, content=b"<Error><Code>InvalidPart</Code></Error>")
+            self.objects[key] = b"".join(parts[number] for number, _ in listed)
+            del self.uploads[params["uploadId"]]
+            return httpx.Response(200, content=b"<CompleteMultipartUploadResult/>")
+        del self.uploads[params["uploadId"]]
+        return httpx.Response(204)
+
+
+def _configure(monkeypatch):
+    monkeypatch.setenv("S3_COMPAT_ENDPOINT", "http://s3.local:9000")
+    monkeypatch.setenv("S3_BUCKET", "artifacts")
+    monkeypatch.setenv("S3_ACCESS_KEY", "test-access")
+    monkeypatch.setenv("S3_SECRET_KEY", SECRET)
+    store = FakeS3()
+    http = httpx.Client(transport=httpx.MockTransport(store))
+    monkeypatch.setattr(s3, "httpx", http)
+    return store, http
+
+
+def test_multipart_upload_round_trip(monkeypatch):
+    store, http = _configure(monkeypatch)
+    client = TestClient(app)
+    size = 11 * 1024 * 1024
+    data = bytes(range(256)) * (size // 256)
+
+    start = client.post("/api/uploads/multipart", json={"filename": "big build.tar", "size": size, "part_size": 5 * 1024 * 1024})
+    assert start.status_code == 200
+    body = start.json()
+    assert body["part_count"] == 3 and [p["part_number"] for p in body["parts"]] == [1, 2, 3]
+
+    again = client.post(
+        "/api/uploads/multipart/parts", json={"key": body["key"], "upload_id": body["upload_id"], "part_numbers": [3, 1, 3]}
+    )
+    assert [p["part_number"] for p in again.json()["parts"]] == [1, 3]
+
+    completed = []
+    for part in reversed(body["parts"]):
+        offset = (part["part_number"] - 1) * body["part_size"]
+        resp = http.put(part["url"], content=data[offset : offset + body["part_size"]])
+        completed.append({"part_number": part["part_number"], "etag": resp.headers["ETag"]})
+
+    done = client.post(
+        "/api/uploads/multipart/complete", json={"key": body["key"], "upload_id": body["upload_id"], "parts": completed}
+    )
+    assert done.status_code == 200
+    assert done.json()["public_url"].startswith("http://s3.local:9000/artifacts/artifacts/")
+    assert store.objects[body["key"]] == data
+
+
+def test_multipart_complete_rejects_bad_parts_and_abort(monkeypatch):
+    store, _ = _configure(monkeypatch)
+    client = TestClient(app)
+    start = client.post("/api/uploads/multipart", json={"filename": "a.bin"}).json()
+    assert start["parts"] == [] and start["part_count"] is None
+    ref = {"key": start["key"], "upload_id": start["upload_id"]}
+
+    missing = client.post("/api/uploads/multipart/complete", json={**ref, "parts": [{"part_number": 1, "etag": "x"}]})
+    assert missing.status_code == 502
+    assert client.post("/api/uploads/multipart/abort", json=ref).json()["aborted"] is True
+    assert store.uploads == {}
+    outside = client.post("/api/uploads/multipart/abort", json={"key": "exports/x", "upload_id": "u"})
+    assert outside.status_code == 422
+
+
+def test_batch_presign_signs_every_file_with_one_derived_key(monkeypatch):
+    store, _ = _configure(monkeypatch)
+    client = TestClient(app)
+    files = [{"filename": f"build-{i}.zip", "type": "application/zip"} for i in range(5)]
+
+    resp = client.post("/api/uploads/presign/batch", json={"files": files + [{"filename": "notes"}]})
+    assert resp.status_code == 200
+    uploads = resp.json()["uploads"]
+    assert len(uploads) == 6 and len({u["key"] for u in uploads}) == 6
+    assert uploads[0]["headers"] == {"Content-Type": "application/zip"}
+    assert uploads[-1]["headers"] == {"Content-Type": "application/octet-stream"}
+    for upload in uploads:
+        store._verify(httpx.Request("PUT", upload["url"]))
+        assert upload["public_url"] == "http://s3.local:9000/artifacts/" + upload["key"]
+    assert s3._get_signature_key.cache_info().misses == 1
+
+    empty = client.post("/api/uploads/presign/batch", json={"files": []})
+    assert empty.status_code == 422
@@ -0,0 +1,273 @@
+from pathlib import Path
+
+import numpy as np
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app import models
+from app.embeddings import encode_embedding
+from app.search import _hash_to_vector_768, search_similar_releases
+from app.similarity import VectorIndex, reset_release_index
+
+
+def _random_vectors(n: int, dim: int = 32, seed: int = 1) -> np.ndarray:
+    return np.random.default_rng(seed).standard_normal((n, dim)).astype(np.float32)
+
+
+def test_flat_search_returns_exact_top_k():
+    vectors = _random_vectors(200)
+    index = VectorIndex(32)
+    index.add(list(range(1, 201)), vectors)
+
+    results = index.search(vectors[41], 3)
+    assert results[0][0] == 42
+    assert abs(results[0][1] - 1.0) < 1e-5
+    assert len(results) == 3
+
+    batch = index.search_batch(vectors[[0, 9]], 1)
+    assert [r[0][0] for r in batch] == [1, 10]
+
+
+def test_add_replaces_and_remove_compacts():
+    vectors = _random_vectors(3)
+    index = VectorIndex(32)
+    index.add([1, 2, 3], vectors)
+    index.add([2], vectors[0])
+    assert len(index) == 3
+    assert {r[0] for r in index.search(vectors[0], 2)} == {1, 2}
+    assert index.remove([1, 99]) == 1
+    assert len(index) == 2 and 1 not in index
+
+
+def test_ivf_finds_self_and_round_trips(tmp_path: Path):
+    vectors = _random_vectors(500)
+    index = VectorIndex(32, mode="ivf", nprobe=4)
+    index.add(list(range(500)), vectors)
+    index.train(nlist=10)
+    assert index.search(vectors[123], 1)[0][0] == 123
+
+    path = str(tmp_path / "index.npz")
+    index.save(path)
+    loaded = VectorIndex.load(path, mode="ivf", nprobe=4)
+    assert len(loaded) == 500 and loaded.trained
+    assert loaded.search(vectors[7], 1)[0][0] == 7
+
+
+def test_search_similar_releases_uses_memory_index(tmp_path: Path, monkeypatch):
+    monkeypatch.setenv("EMBEDDING_ENABLED", "1")
+    monkeypatch.setenv("SIMILARITY_INDEX_PATH", str(tmp_path / "releases.npz"))
+    reset_release_index()
+    engine = create_engine("sqlite:///:memory:", future=True)
+    models.Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine, future=True)()
+    for idx, notes in enumerate(["alpha release", "beta release", "gamma release"], start=1):
+        session.add(
+            models.Release(
+                user_id=1,
+                project_id=1,
+                version=f"1.0.{idx}",
+                notes=notes,
+                artifact_url="https://example.com/a.zip",
+                embedding=encode_embedding(_hash_to_vector_768(notes)),
+            )
+        )
+    session.commit()
+
+    results = search_similar_releases(session, "beta release", top_k=2)
+    assert results[0]["notes"] == "beta release"
+    assert results[0]["score"] > 0.99
+    assert len(results) == 2
+    reset_release_index()
+
+
+def test_group_search_only_scans_that_shard(tmp_path: Path):
+    vectors = _random_vectors(6)
+    index = VectorIndex(32)
+    index.add([1, 2, 3, 4, 5, 6], vectors, groups=[10, 10, 20, 20, 20, 30])
+    assert index.group_size(20) == 3
+    assert {r[0] for r in index.search(vectors[0], 5, groups=[20])} == {3, 4, 5}
+    assert index.search(vectors[0], 5, groups=[99]) == []
+
+    index.remove([3])
+    assert {r[0] for r in index.search(vectors[0], 5, groups=[20])} == {4, 5}
+    assert {r[0] for r in index.search(vectors[0], 5, groups=[30])} == {6}
+
+    path = str(tmp_path / "grouped.npz")
+    index.save(path)
+    loaded = VectorIndex.load(path)
+    assert loaded.grouped and loaded.group_size(10) == 2
+
+
+def test_search_similar_releases_is_project_scoped(tmp_path: Path, monkeypatch):
+    engine = create_engine("sqlite:///:memory:", future=True)
+    models.Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine, future=True)()
+    for project_id in (1, 2):
+        session.add(
+            models.Release(
+                user_id=project_id,
+                project_id=project_id,
+                version="1.0.0",
+                notes="shared release notes",
+                artifact_url="https://example.com/a.zip",
+                embedding=encode_embedding(_hash_to_vector_768("shared release notes")),
+            )
+        )
+    session.commit()
+
+    # Text fallback (LIKE on sqlite)
+    monkeypatch.delenv("EMBEDDING_ENABLED", raising=False)
+    results = search_similar_releases(session, "shared release", project_ids=[2])
+    assert [r["id"] for r in results] == [2]
+    assert search_similar_releases(session, "shared release", project_ids=[]) == []
+
+    # In-memory index shards
+    monkeypatch.setenv("EMBEDDING_ENABLED", "1")
+    monkeypatch.setenv("SIMILARITY_INDEX_PATH", str(tmp_path / "releases.npz"))
+    reset_release_index()
+    results = search_similar_releases(session, "shared release notes", project_ids=[1])
+    assert [r["id"] for r in results] == [1]
+    assert len(search_similar_releases(session, "shared release notes")) == 2
+    reset_release_index()
+
+
+def test_reload_resumes_from_saved_db_watermark(tmp_path: Path, monkeypatch):
+    from app.similarity import releases as similarity_releases
+
+    path = tmp_path / "releases.npz"
+    monkeypatch.setenv("SIMILARITY_INDEX_PATH", str(path))
+    engine = create_engine("sqlite:///:memory:", future=True)
+    models.Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine, future=True)()
+
+    def _release(release_id: int, notes: str) -> None:
+        session.add(
+            models.Release(
+                id=release_id,
+                user_id=1,
+                project_id=1,
+                version=f"1.0.{release_id}",
+                notes=notes,
+                artifact_url="https://example.com/a.zip",
+                embedding=encode_embedding(_hash_to_vector_768(notes)),
+            )
+        )
+        session.commit()
+
+    _release(1, "first")
+    # Another process synced id 1, then published id 9 directly and saved the file.
+    peer = VectorIndex(768)
+    peer.add([1, 9], np.vstack([_hash_to_vector_768("first"), _hash_to_vector_768("ninth")]), [1, 1])
+    peer.synced_id = 1
+    peer.save(str(path))
+    # A third worker commits id 5 after that save.
+    _release(5, "fifth")
+    _release(9, "ninth")
+
+    reset_release_index()
+    index = similarity_releases.get_release_index(session)
+    assert 5 in index
+    assert similarity_releases.save_release_index(force=True)
+    assert VectorIndex.load(str(path)).synced_id == 9
+    reset_release_index()
+
+
+def test_peer_saves_do_not_replace_index_but_rebuilds_do(tmp_path: Path, monkeypatch):
+    import os
+
+    from app.similarity import releases as similarity_releases
+
+    path = tmp_path / "releases.npz"
+    monkeypatch.setenv("SIMILARITY_INDEX_PATH", str(path))
+    monkeypatch.setenv("SIMILARITY_INDEX_SYNC_SEC", "0")
+    engine = create_engine("sqlite:///:memory:", future=True)
+    models.Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine, future=True)()
+    session.add(
+        models.Release(
+            id=1, user_id=1, project_id=1, version="1", notes="one", artifact_url="x",
+            embedding=encode_embedding(_hash_to_vector_768("one")),
+        )
+    )
+    session.commit()
+
+    reset_release_index()
+    index = similarity_releases.get_release_index(session)
+    assert similarity_releases.index_release_embedding(7, np.asarray(_hash_to_vector_768("seven"), dtype=np.float32), 1)
+
+    # A peer writes its own (smaller) view of the same generation.
+    peer = VectorIndex(768, model_id=index.model_id)
+    peer.save(str(path))
+    os.utime(path, (path.stat().st_mtime + 5,) * 2)
+    assert similarity_releases.get_release_index(session) is index and 7 in index
+
+    similarity_releases.rebuild_release_index(session)
+    os.utime(path, (path.stat().st_mtime + 10,) * 2)
+    reloaded = similarity_releases.get_release_index(session)
+    assert reloaded is not index and 1 in reloaded and 7 not in reloaded
+    reset_release_index()
+
+
+def test_sync_skips_untagged_hash_vectors_for_other_models():
+    from app.similarity import releases as similarity_releases
+
+    engine = create_engine("sqlite:///:memory:", future=True)
+    models.Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine, future=True)()
+    for release_id, model in ((1, None), (2, "local-768")):
+        session.add(
+            models.Release(
+                id=release_id, user_id=1, project_id=1, version=str(release_id), notes="n", artifact_url="x",
+                embedding=encode_embedding(_hash_to_vector_768(str(release_id))), embedding_model=model,
+            )
+        )
+    session.commit()
+
+    model_index = VectorIndex(768, model_id="local-768")
+    assert similarity_releases._sync_from_db(session, model_index, 0) == (1, 2)
+    assert 1 not in model_index and 2 in model_index
+
+    hash_index = VectorIndex(768, model_id="hash-768")
+    similarity_releases._sync_from_db(session, hash_index, 0)
+    assert 1 in hash_index and 2 not in hash_index
+
+
+def test_stale_worker_does_not_overwrite_a_rebuild(tmp_path: Path, monkeypatch):
+    from app.similarity import releases as similarity_releases
+
+    path = tmp_path / "releases.npz"
+    monkeypatch.setenv("SIMILARITY_INDEX_PATH", str(path))
+    engine = create_engine("sqlite:///:memory:", future=True)
+    models.Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine, future=True)()
+
+    reset_release_index()
+    similarity_releases.get_release_index(session)
+    assert similarity_releases.index_release_embedding(3, np.asarray(_hash_to_vector_768("three"), dtype=np.float32), 1)
+    assert similarity_releases.save_release_index(force=True)
+
+    rebuilt = similarity_releases.rebuild_release_index(session)
+    assert similarity_releases.index_release_embedding(4, np.asarray(_hash_to_vector_768("four"), dtype=np.float32), 1)
+    assert not similarity_releases.save_release_index(force=True)
+    assert VectorIndex.read_generation(str(path)) == rebuilt.generation
+    assert [p.name for p in tmp_path.iterdir()] == ["releases.npz"]
+    reset_release_index()
+
+
+def test_publish_marks_index_dirty_without_saving(tmp_path: Path, monkeypatch):
+    from app.similarity import releases as similarity_releases
+
+    path = tmp_path / "releases.npz"
+    monkeypatch.setenv("SIMILARITY_INDEX_PATH", str(path))
+    monkeypatch.setenv("SIMILARITY_INDEX_SAVE_SEC", "0")
+    engine = create_engine("sqlite:///:memory:", future=True)
+    models.Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine, future=True)()
+
+    reset_release_index()
+    similarity_releases.get_release_index(session)
+    assert similarity_releases.index_release_embedding(2, np.asarray(_hash_to_vector_768("two"), dtype=np.float32), 1)
+    assert not path.exists()
+    assert similarity_releases.save_release_index()
+    assert 2 in VectorIndex.load(str(path))
+    reset_release_index()